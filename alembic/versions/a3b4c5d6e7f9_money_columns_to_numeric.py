@@ -0,0 +1,74 @@
+"""money columns to numeric
+
+Revision ID: a3b4c5d6e7f9
+Revises: f2a3b4c5d6e8
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3b4c5d6e7f9'
+down_revision: Union[str, None] = 'f2a3b4c5d6e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONEY_COLUMNS = [
+    ('users', 'balance'),
+    ('users', 'hold_balance'),
+    ('users', 'referral_earnings'),
+    ('reviews', 'amount'),
+    ('reviews', 'stake_amount'),
+    ('links', 'reward_amount'),
+    ('withdrawal_requests', 'amount'),
+    ('promo_codes', 'reward'),
+    ('reward_settings', 'reward_amount'),
+    ('operation_history', 'amount'),
+    ('internship_tasks', 'estimated_salary'),
+    ('internship_mistakes', 'penalty_amount'),
+    ('user_deposits', 'initial_amount'),
+    ('user_deposits', 'current_balance'),
+    ('donations', 'amount'),
+]
+NEW_OPERATION_TYPES = ('STAKE_HOLD', 'STAKE_RETURN', 'COINFLIP', 'BALANCE_OPENING')
+
+
+def upgrade() -> None:
+    # Новые значения enum нельзя использовать в той же транзакции, где они добавлены
+    with op.get_context().autocommit_block():
+        for value in NEW_OPERATION_TYPES:
+            op.execute(f"ALTER TYPE operation_type_enum ADD VALUE IF NOT EXISTS '{value}'")
+
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.Numeric(18, 2),
+            postgresql_using=f"round({column}::numeric, 2)"
+        )
+
+    # Входящий остаток: часть старых начислений не попадала в историю операций.
+    # Разница фиксируется одной операцией, чтобы дальше баланс сходился с историей.
+    op.execute(
+        "INSERT INTO operation_history (user_id, operation_type, amount, description, created_at, is_anonymous) "
+        "SELECT u.id, 'BALANCE_OPENING', COALESCE(u.balance, 0) - COALESCE(h.total, 0), "
+        "'Входящий остаток при переходе на точные суммы', now() AT TIME ZONE 'utc', false "
+        "FROM users u LEFT JOIN ("
+        "    SELECT user_id, SUM(amount) AS total FROM operation_history GROUP BY user_id"
+        ") h ON h.user_id = u.id "
+        "WHERE COALESCE(u.balance, 0) <> COALESCE(h.total, 0)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DELETE FROM operation_history WHERE operation_type = 'BALANCE_OPENING'")
+    for table, column in MONEY_COLUMNS:
+        op.alter_column(
+            table, column,
+            type_=sa.Float(),
+            postgresql_using=f"{column}::double precision"
+        )
+    # Значения enum в PostgreSQL не удаляются без пересоздания типа, оставляем их
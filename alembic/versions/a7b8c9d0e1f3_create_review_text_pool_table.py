@@ -0,0 +1,41 @@
+"""create review_text_pool table
+
+Revision ID: a7b8c9d0e1f3
+Revises: z1a2b3c4d5e6
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f3'
+down_revision: Union[str, None] = 'z1a2b3c4d5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('review_text_pool',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('scenario_id', sa.Integer(), nullable=True),
+    sa.Column('scenario_text', sa.Text(), nullable=True),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('status', sa.Enum('ready', 'used', name='review_text_pool_status_enum'), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('used_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['scenario_id'], ['ai_scenarios.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_review_text_pool_link_id'), 'review_text_pool', ['link_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_review_text_pool_link_id'), table_name='review_text_pool')
+    op.drop_table('review_text_pool')
+    sa.Enum(name='review_text_pool_status_enum').drop(op.get_bind(), checkfirst=True)
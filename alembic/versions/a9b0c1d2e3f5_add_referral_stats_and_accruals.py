@@ -0,0 +1,78 @@
+"""add referral stats and accruals
+
+Revision ID: a9b0c1d2e3f5
+Revises: f8a9b0c1d2e4
+Create Date: 2026-10-20 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9b0c1d2e3f5'
+down_revision: Union[str, None] = 'f8a9b0c1d2e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('referral_active_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_users_referrer_id_id', 'users', ['referrer_id', 'id'], unique=False)
+    op.create_index('ix_users_referrer_id_referral_active_at', 'users', ['referrer_id', 'referral_active_at'], unique=False)
+
+    op.create_table('referral_stats',
+    sa.Column('referrer_id', sa.BigInteger(), nullable=False),
+    sa.Column('referrals_count', sa.Integer(), nullable=False),
+    sa.Column('total_earned', sa.Numeric(18, 2), nullable=False),
+    sa.ForeignKeyConstraint(['referrer_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('referrer_id')
+    )
+    op.create_table('referral_accruals',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('referrer_id', sa.BigInteger(), nullable=False),
+    sa.Column('referral_id', sa.BigInteger(), nullable=False),
+    sa.Column('amount', sa.Numeric(18, 2), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_referral_accruals_referrer_id', 'referral_accruals', ['referrer_id'], unique=False)
+
+    # Всего заработано: все начисления на счет referral:<id> в книге проводок (включая входящий остаток)
+    op.execute(
+        "INSERT INTO referral_stats (referrer_id, referrals_count, total_earned) "
+        "SELECT r.referrer_id, r.referrals_count, COALESCE(e.total_earned, 0) "
+        "FROM (SELECT referrer_id, COUNT(*) AS referrals_count FROM users "
+        "      WHERE referrer_id IS NOT NULL GROUP BY referrer_id) r "
+        "LEFT JOIN (SELECT debit_account, SUM(amount) AS total_earned FROM ledger_entries "
+        "           WHERE debit_account LIKE 'referral:%' GROUP BY debit_account) e "
+        "ON e.debit_account = 'referral:' || r.referrer_id"
+    )
+
+
+def downgrade() -> None:
+    # Незачисленные награды переносятся в копилки (с проводками), чтобы не потеряться
+    pending = "(SELECT referrer_id, SUM(amount) AS amount FROM referral_accruals GROUP BY referrer_id)"
+    op.execute(
+        f"UPDATE users u SET referral_earnings = u.referral_earnings + a.amount FROM {pending} a "
+        "WHERE u.id = a.referrer_id"
+    )
+    op.execute(
+        "INSERT INTO ledger_entries (debit_account, credit_account, amount, created_at) "
+        f"SELECT 'referral:' || referrer_id, 'house', amount, now() AT TIME ZONE 'utc' FROM {pending} a "
+        "WHERE amount > 0 ORDER BY referrer_id"
+    )
+    op.execute(
+        "INSERT INTO ledger_accounts (account, balance, entry_count) "
+        f"SELECT 'referral:' || referrer_id, amount, 1 FROM {pending} a WHERE amount > 0 "
+        "ON CONFLICT (account) DO UPDATE SET balance = ledger_accounts.balance + excluded.balance, "
+        "entry_count = ledger_accounts.entry_count + 1"
+    )
+    op.drop_index('ix_referral_accruals_referrer_id', table_name='referral_accruals')
+    op.drop_table('referral_accruals')
+    op.drop_table('referral_stats')
+    op.drop_index('ix_users_referrer_id_referral_active_at', table_name='users')
+    op.drop_index('ix_users_referrer_id_id', table_name='users')
+    op.drop_column('users', 'referral_active_at')
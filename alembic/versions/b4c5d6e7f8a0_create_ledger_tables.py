@@ -0,0 +1,101 @@
+"""create ledger tables
+
+Revision ID: b4c5d6e7f8a0
+Revises: a3b4c5d6e7f9
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4c5d6e7f8a0'
+down_revision: Union[str, None] = 'a3b4c5d6e7f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ledger_entries',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('debit_account', sa.String(length=64), nullable=False),
+    sa.Column('credit_account', sa.String(length=64), nullable=False),
+    sa.Column('amount', sa.Numeric(18, 2), nullable=False),
+    sa.Column('operation_id', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.CheckConstraint('amount > 0', name='ck_ledger_entries_amount_positive'),
+    sa.CheckConstraint('debit_account <> credit_account', name='ck_ledger_entries_distinct_accounts'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ledger_entries_debit_account_id', 'ledger_entries', ['debit_account', 'id'], unique=False)
+    op.create_index('ix_ledger_entries_credit_account_id', 'ledger_entries', ['credit_account', 'id'], unique=False)
+
+    op.create_table('ledger_accounts',
+    sa.Column('account', sa.String(length=64), nullable=False),
+    sa.Column('balance', sa.Numeric(18, 2), nullable=False),
+    sa.Column('entry_count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('account')
+    )
+
+    op.create_table('ledger_snapshots',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('account', sa.String(length=64), nullable=False),
+    sa.Column('entry_id', sa.BigInteger(), nullable=False),
+    sa.Column('balance', sa.Numeric(18, 2), nullable=False),
+    sa.Column('entry_count', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('account', 'entry_id', name='uq_ledger_snapshots_account_entry')
+    )
+    op.create_index('ix_ledger_snapshots_account_created_at', 'ledger_snapshots', ['account', 'created_at'], unique=False)
+
+    # Проводки только добавляются: исправление - это новая обратная проводка
+    op.execute(
+        "CREATE FUNCTION ledger_entries_immutable() RETURNS trigger AS $$ "
+        "BEGIN RAISE EXCEPTION 'ledger_entries is append-only'; END; "
+        "$$ LANGUAGE plpgsql"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_ledger_entries_immutable BEFORE UPDATE OR DELETE ON ledger_entries "
+        "FOR EACH ROW EXECUTE PROCEDURE ledger_entries_immutable()"
+    )
+
+    # Входящие остатки: текущие балансы переносятся в книгу проводками со счета house
+    op.execute(
+        "INSERT INTO ledger_entries (debit_account, credit_account, amount, created_at) "
+        "SELECT CASE WHEN v.amount > 0 THEN v.account ELSE 'house' END, "
+        "       CASE WHEN v.amount > 0 THEN 'house' ELSE v.account END, "
+        "       abs(v.amount), now() AT TIME ZONE 'utc' "
+        "FROM ("
+        "    SELECT id, 1 AS kind, 'user:' || id AS account, balance AS amount FROM users "
+        "    UNION ALL SELECT id, 2, 'hold:' || id, hold_balance FROM users "
+        "    UNION ALL SELECT id, 3, 'referral:' || id, referral_earnings FROM users "
+        "    UNION ALL SELECT 0, 4, 'fund', value::numeric FROM system_settings "
+        "        WHERE key = 'donation_fund_balance' AND value ~ '^-?[0-9]+(\\.[0-9]+)?$'"
+        ") v "
+        "WHERE COALESCE(v.amount, 0) <> 0 "
+        "ORDER BY v.id, v.kind"
+    )
+    op.execute(
+        "INSERT INTO ledger_accounts (account, balance, entry_count) "
+        "SELECT account, SUM(amount), COUNT(*) FROM ("
+        "    SELECT id, debit_account AS account, amount FROM ledger_entries "
+        "    UNION ALL SELECT id, credit_account, -amount FROM ledger_entries"
+        ") e "
+        "WHERE account NOT IN ('house', 'fund') "
+        "GROUP BY account"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER trg_ledger_entries_immutable ON ledger_entries")
+    op.execute("DROP FUNCTION ledger_entries_immutable()")
+    op.drop_index('ix_ledger_snapshots_account_created_at', table_name='ledger_snapshots')
+    op.drop_table('ledger_snapshots')
+    op.drop_table('ledger_accounts')
+    op.drop_index('ix_ledger_entries_credit_account_id', table_name='ledger_entries')
+    op.drop_index('ix_ledger_entries_debit_account_id', table_name='ledger_entries')
+    op.drop_table('ledger_entries')
@@ -0,0 +1,38 @@
+"""create review_text_signatures table
+
+Revision ID: b8c9d0e1f2a4
+Revises: a7b8c9d0e1f3
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a4'
+down_revision: Union[str, None] = 'a7b8c9d0e1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('review_text_signatures',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('link_id', sa.Integer(), nullable=True),
+    sa.Column('review_id', sa.Integer(), nullable=True),
+    sa.Column('source', sa.Enum('issued', 'submitted', name='review_text_source_enum'), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('review_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('review_text_signatures')
+    sa.Enum(name='review_text_source_enum').drop(op.get_bind(), checkfirst=True)
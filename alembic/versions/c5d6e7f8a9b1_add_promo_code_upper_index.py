@@ -0,0 +1,26 @@
+"""add promo code upper index
+
+Revision ID: c5d6e7f8a9b1
+Revises: b4c5d6e7f8a0
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d6e7f8a9b1'
+down_revision: Union[str, None] = 'b4c5d6e7f8a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_promo_codes_upper_code', 'promo_codes', [sa.text('upper(code)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_promo_codes_upper_code', table_name='promo_codes')
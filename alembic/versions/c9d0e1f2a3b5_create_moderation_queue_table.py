@@ -0,0 +1,42 @@
+"""create moderation_queue table
+
+Revision ID: c9d0e1f2a3b5
+Revises: b8c9d0e1f2a4
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b5'
+down_revision: Union[str, None] = 'b8c9d0e1f2a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('moderation_queue',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('review_id', sa.Integer(), nullable=False),
+    sa.Column('task_type', sa.String(), nullable=False),
+    sa.Column('status', sa.Enum('queued', 'claimed', 'done', name='moderation_queue_status_enum'), nullable=False),
+    sa.Column('claimed_by', sa.BigInteger(), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('review_id')
+    )
+    op.create_index('ix_moderation_queue_status_task_type_created_at', 'moderation_queue', ['status', 'task_type', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_moderation_queue_status_task_type_created_at', table_name='moderation_queue')
+    op.drop_table('moderation_queue')
+    sa.Enum(name='moderation_queue_status_enum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,32 @@
+"""add url_hash to links
+
+Revision ID: d0e1f2a3b4c6
+Revises: c9d0e1f2a3b5
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c6'
+down_revision: Union[str, None] = 'c9d0e1f2a3b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Хэши существующих ссылок досчитывает фоновый бэкфилл (нормализация URL делается в Python)
+    op.add_column('links', sa.Column('url_hash', sa.String(length=40), nullable=True))
+    op.create_index(
+        'uq_links_platform_url_hash', 'links', ['platform', 'url_hash'], unique=True,
+        postgresql_where=sa.text('url_hash IS NOT NULL')
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_links_platform_url_hash', table_name='links')
+    op.drop_column('links', 'url_hash')
@@ -0,0 +1,28 @@
+"""add promo code batch tag
+
+Revision ID: d6e7f8a9b0c2
+Revises: c5d6e7f8a9b1
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6e7f8a9b0c2'
+down_revision: Union[str, None] = 'c5d6e7f8a9b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('promo_codes', sa.Column('batch_tag', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_promo_codes_batch_tag'), 'promo_codes', ['batch_tag'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_promo_codes_batch_tag'), table_name='promo_codes')
+    op.drop_column('promo_codes', 'batch_tag')
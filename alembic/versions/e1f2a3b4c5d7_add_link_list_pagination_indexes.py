@@ -0,0 +1,28 @@
+"""add link list pagination indexes
+
+Revision ID: e1f2a3b4c5d7
+Revises: d0e1f2a3b4c6
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f2a3b4c5d7'
+down_revision: Union[str, None] = 'd0e1f2a3b4c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_links_platform_id', 'links', ['platform', 'id'], unique=False)
+    op.create_index('ix_links_platform_has_tag_id', 'links', ['platform', sa.text('(campaign_tag IS NOT NULL)'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_links_platform_has_tag_id', table_name='links')
+    op.drop_index('ix_links_platform_id', table_name='links')
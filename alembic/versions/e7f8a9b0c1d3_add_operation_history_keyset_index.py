@@ -0,0 +1,28 @@
+"""add operation history keyset index
+
+Revision ID: e7f8a9b0c1d3
+Revises: d6e7f8a9b0c2
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7f8a9b0c1d3'
+down_revision: Union[str, None] = 'd6e7f8a9b0c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_operation_history_user_created_id', 'operation_history', ['user_id', 'created_at', 'id'], unique=False)
+    # Составной индекс начинается с user_id и заменяет одиночный
+    op.drop_index('ix_operation_history_user_id', table_name='operation_history')
+
+
+def downgrade() -> None:
+    op.create_index('ix_operation_history_user_id', 'operation_history', ['user_id'], unique=False)
+    op.drop_index('ix_operation_history_user_created_id', table_name='operation_history')
@@ -0,0 +1,38 @@
+"""create link_counters table
+
+Revision ID: f2a3b4c5d6e8
+Revises: e1f2a3b4c5d7
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a3b4c5d6e8'
+down_revision: Union[str, None] = 'e1f2a3b4c5d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('link_counters',
+    sa.Column('platform', sa.String(), nullable=False),
+    sa.Column('gender_requirement', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('campaign_tag', sa.String(length=255), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('platform', 'gender_requirement', 'status', 'campaign_tag')
+    )
+    op.execute(
+        "INSERT INTO link_counters (platform, gender_requirement, status, campaign_tag, count) "
+        "SELECT COALESCE(platform, ''), gender_requirement::text, status::text, COALESCE(campaign_tag, ''), COUNT(*) "
+        "FROM links WHERE status IS NOT NULL GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('link_counters')
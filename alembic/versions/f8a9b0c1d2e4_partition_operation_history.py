@@ -0,0 +1,111 @@
+"""partition operation history by month
+
+Revision ID: f8a9b0c1d2e4
+Revises: e7f8a9b0c1d3
+Create Date: 2026-10-20 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8a9b0c1d2e4'
+down_revision: Union[str, None] = 'e7f8a9b0c1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Сколько месяцев вперед создается при миграции; дальше секции досоздает задача обслуживания
+PREMAKE_MONTHS = 2
+
+
+def upgrade() -> None:
+    # Ключ секционирования должен входить в PK, поэтому внешний ключ жалоб на id операции убирается
+    op.drop_constraint('transfer_complaints_transfer_id_fkey', 'transfer_complaints', type_='foreignkey')
+    op.alter_column('transfer_complaints', 'transfer_id', type_=sa.BigInteger())
+
+    op.execute("ALTER TABLE operation_history RENAME TO operation_history_legacy")
+    op.execute("ALTER TABLE operation_history_legacy RENAME CONSTRAINT operation_history_pkey TO operation_history_legacy_pkey")
+    op.execute("ALTER INDEX ix_operation_history_user_created_id RENAME TO ix_operation_history_legacy_user_created_id")
+
+    op.execute(
+        "CREATE TABLE operation_history (LIKE operation_history_legacy INCLUDING DEFAULTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE operation_history ALTER COLUMN id TYPE BIGINT")
+    op.execute("ALTER SEQUENCE operation_history_id_seq AS BIGINT OWNED BY operation_history.id")
+    op.create_primary_key('operation_history_pkey', 'operation_history', ['id', 'created_at'])
+    op.create_foreign_key('operation_history_user_id_fkey', 'operation_history', 'users', ['user_id'], ['id'])
+    op.create_foreign_key('operation_history_sender_id_fkey', 'operation_history', 'users', ['sender_id'], ['id'])
+    op.create_index('ix_operation_history_user_created_id', 'operation_history', ['user_id', 'created_at', 'id'], unique=False)
+
+    # Секции по месяцам от самой старой операции; DEFAULT-секция страхует вставку,
+    # если задача обслуживания не успела создать секцию на новый месяц
+    op.execute(f"""
+        DO $$
+        DECLARE
+            month_start date := date_trunc('month', COALESCE(
+                (SELECT min(created_at) FROM operation_history_legacy), now() AT TIME ZONE 'utc'
+            ))::date;
+            last_month date := (date_trunc('month', now() AT TIME ZONE 'utc') + interval '{PREMAKE_MONTHS} months')::date;
+        BEGIN
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF operation_history FOR VALUES FROM (%L) TO (%L)',
+                    'operation_history_p' || to_char(month_start, 'YYYYMM'),
+                    month_start, (month_start + interval '1 month')::date
+                );
+                month_start := (month_start + interval '1 month')::date;
+            END LOOP;
+        END $$
+    """)
+    op.execute("CREATE TABLE operation_history_default PARTITION OF operation_history DEFAULT")
+
+    op.execute("INSERT INTO operation_history SELECT * FROM operation_history_legacy")
+    op.execute("DROP TABLE operation_history_legacy")
+
+    op.create_table('operation_history_archives',
+    sa.Column('partition_name', sa.String(length=63), nullable=False),
+    sa.Column('range_start', sa.DateTime(), nullable=False),
+    sa.Column('range_end', sa.DateTime(), nullable=False),
+    sa.Column('row_count', sa.BigInteger(), nullable=False),
+    sa.Column('file_path', sa.String(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('partition_name')
+    )
+    op.create_table('archived_operation_totals',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('amount', sa.Numeric(18, 2), nullable=False),
+    sa.Column('operations', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    # Строки из уже архивированных секций сюда не возвращаются: отсоединенные таблицы
+    # и выгруженные файлы нужно подключить вручную до отката
+    op.drop_table('archived_operation_totals')
+    op.drop_table('operation_history_archives')
+
+    op.execute("ALTER TABLE operation_history RENAME TO operation_history_partitioned")
+    op.execute("ALTER TABLE operation_history_partitioned RENAME CONSTRAINT operation_history_pkey TO operation_history_partitioned_pkey")
+    op.execute("ALTER INDEX ix_operation_history_user_created_id RENAME TO ix_operation_history_partitioned_user_created_id")
+
+    op.execute("CREATE TABLE operation_history (LIKE operation_history_partitioned INCLUDING DEFAULTS)")
+    op.execute("ALTER SEQUENCE operation_history_id_seq OWNED BY operation_history.id")
+    op.create_primary_key('operation_history_pkey', 'operation_history', ['id'])
+    op.create_foreign_key('operation_history_user_id_fkey', 'operation_history', 'users', ['user_id'], ['id'])
+    op.create_foreign_key('operation_history_sender_id_fkey', 'operation_history', 'users', ['sender_id'], ['id'])
+    op.create_index('ix_operation_history_user_created_id', 'operation_history', ['user_id', 'created_at', 'id'], unique=False)
+
+    op.execute("INSERT INTO operation_history SELECT * FROM operation_history_partitioned")
+    op.execute("DROP TABLE operation_history_partitioned")
+
+    op.alter_column('transfer_complaints', 'transfer_id', type_=sa.Integer())
+    # NOT VALID: жалобы на переводы из архивированных секций остаются, проверяются только новые строки
+    op.execute(
+        "ALTER TABLE transfer_complaints ADD CONSTRAINT transfer_complaints_transfer_id_fkey "
+        "FOREIGN KEY (transfer_id) REFERENCES operation_history (id) NOT VALID"
+    )
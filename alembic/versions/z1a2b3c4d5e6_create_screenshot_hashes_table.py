@@ -0,0 +1,40 @@
+"""create screenshot_hashes table
+
+Revision ID: z1a2b3c4d5e6
+Revises: x2y3z4a5b6c7
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'z1a2b3c4d5e6'
+down_revision: Union[str, None] = 'x2y3z4a5b6c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('screenshot_hashes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('review_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('kind', sa.Enum('submission', 'confirmation', name='screenshot_kind_enum'), nullable=False),
+    sa.Column('file_id', sa.String(), nullable=False),
+    sa.Column('dhash', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['review_id'], ['reviews.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('review_id', 'kind')
+    )
+    op.create_index(op.f('ix_screenshot_hashes_review_id'), 'screenshot_hashes', ['review_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_screenshot_hashes_review_id'), table_name='screenshot_hashes')
+    op.drop_table('screenshot_hashes')
+    sa.Enum(name='screenshot_kind_enum').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,112 @@
+# file: balance_contention_benchmark.py
+
+"""
+Конкурентные изменения баланса горячих пользователей (update_balance и transfer_stars).
+
+Запуск (только на тестовой базе: скрипт создает пользователей и пишет операции в книгу):
+    python balance_contention_benchmark.py --hot-users 5 --operations 1000
+
+Все операции запускаются одновременно на нескольких "горячих" пользователях: начисления,
+списания и переводы между ними. Печатается пропускная способность и p95 операции, затем
+проверяется, что ни одно изменение не потеряно (итоговый баланс каждого пользователя равен
+стартовому плюс сумма успешных изменений), и запускается verify_ledger.
+Пользователи берутся с id от --user-base.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import TRANSFER_COMMISSION_PERCENT  # noqa: E402
+from database import db_manager  # noqa: E402
+from utils.money import Stars  # noqa: E402
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+async def _balance(user_id: int) -> Stars:
+    balance, _ = await db_manager.get_balance_and_streak(user_id)
+    return Stars(balance)
+
+
+async def _run_operation(rng: random.Random, user_ids: list, expected: dict, latencies: list) -> bool:
+    amount = Stars.from_minor(rng.randint(1, 500))
+    started = time.perf_counter()
+    if rng.random() < 0.5:
+        user_id = rng.choice(user_ids)
+        delta = amount if rng.random() < 0.5 else -amount
+        applied = await db_manager.update_balance(user_id, float(delta)) is not None
+        if applied:
+            expected[user_id] += delta
+    else:
+        sender_id, recipient_id = rng.sample(user_ids, 2)
+        applied, _ = await db_manager.transfer_stars(sender_id, recipient_id, float(amount), None, False, [])
+        if applied:
+            expected[sender_id] -= amount + amount.percent(TRANSFER_COMMISSION_PERCENT)
+            expected[recipient_id] += amount
+    latencies.append(time.perf_counter() - started)
+    return applied
+
+
+async def run_benchmark(hot_users: int, operations: int, user_base: int, seed: int):
+    await db_manager.init_db()
+    rng = random.Random(seed)
+    user_ids = [user_base + i for i in range(hot_users)]
+    for user_id in user_ids:
+        await db_manager.ensure_user_exists(user_id, None)
+        await db_manager.set_first_task_completed(user_id)
+        # Стартового запаса хватает на любые списания, чтобы отказов не было
+        await db_manager.update_balance(user_id, 10.0 * operations)
+    expected = {user_id: await _balance(user_id) for user_id in user_ids}
+
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_run_operation(rng, user_ids, expected, latencies) for _ in range(operations)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{operations} одновременных операций на {hot_users} пользователях")
+    print(f"{operations / elapsed:.1f} операций/с, всего {elapsed:.2f} с, p95 операции {_p95(latencies) * 1000:.0f} мс")
+    if not all(results):
+        print(f"отклонено операций: {results.count(False)}")
+
+    lost = 0
+    for user_id in user_ids:
+        actual = await _balance(user_id)
+        if actual != expected[user_id]:
+            lost += 1
+            print(f"пользователь {user_id}: ожидалось {expected[user_id]}, в базе {actual}")
+    print("потерянных изменений нет" if not lost else f"балансы не сошлись у {lost} пользователей")
+
+    report = await db_manager.verify_ledger()
+    print(
+        f"verify_ledger: проводок {report['entries']}, счетов {report['accounts']}, "
+        f"снимков {report['snapshots']}, расхождений {report['mismatched']}"
+    )
+    for example in report["examples"]:
+        print(f"  {example}")
+    await db_manager.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Конкурентные изменения баланса горячих пользователей.")
+    parser.add_argument("--hot-users", type=int, default=5, help="не меньше двух, чтобы были переводы")
+    parser.add_argument("--operations", type=int, default=1000)
+    parser.add_argument("--user-base", type=int, default=9_100_000_000_000, help="id первого тестового пользователя")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    asyncio.run(run_benchmark(args.hot_users, args.operations, args.user_base, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# file: coinflip_benchmark.py
+
+"""
+Пропускная способность расчета ставок "Орёл и Решка" (db_manager.settle_coinflip).
+
+Запуск (только на тестовой базе: скрипт создает пользователей и пишет операции в книгу):
+    python coinflip_benchmark.py --users 50 --flips 200 --bet 1
+
+Каждый из N пользователей получает стартовый баланс и делает M ставок подряд; пользователи
+играют параллельно. Печатаются ставки/с по каждому пользователю (min/медиана/max), общая
+пропускная способность и p95 одного расчета. Пользователи берутся с id от --user-base.
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import db_manager  # noqa: E402
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+async def _play(user_id: int, flips: int, bet: float, latencies: list) -> tuple:
+    settled, started = 0, time.perf_counter()
+    for _ in range(flips):
+        flip_started = time.perf_counter()
+        if await db_manager.settle_coinflip(user_id, bet, random.choice([True, False])) is not None:
+            settled += 1
+        latencies.append(time.perf_counter() - flip_started)
+    return settled, time.perf_counter() - started
+
+
+async def run_benchmark(users: int, flips: int, bet: float, user_base: int):
+    await db_manager.init_db()
+    user_ids = [user_base + i for i in range(users)]
+    # Баланса хватает на любую серию проигрышей
+    for user_id in user_ids:
+        await db_manager.ensure_user_exists(user_id, None)
+        await db_manager.update_balance(user_id, bet * flips)
+
+    latencies = []
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_play(user_id, flips, bet, latencies) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+
+    per_user = [settled / seconds for settled, seconds in results]
+    total = sum(settled for settled, _ in results)
+    print(f"{users} пользователей x {flips} ставок, ставка {bet:.2f}")
+    print(f"ставок/с на пользователя: min {min(per_user):.1f}, медиана {statistics.median(per_user):.1f}, max {max(per_user):.1f}")
+    print(f"всего: {total} ставок за {elapsed:.2f} с, {total / elapsed:.1f} ставок/с")
+    print(f"расчет ставки: среднее {statistics.mean(latencies) * 1000:.1f} мс, p95 {_p95(latencies) * 1000:.1f} мс")
+    if total != users * flips:
+        print(f"не рассчитано ставок: {users * flips - total}")
+    await db_manager.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ставки/с в 'Орёл и Решка' на пользователя и всего.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--flips", type=int, default=200)
+    parser.add_argument("--bet", type=float, default=1.0)
+    parser.add_argument("--user-base", type=int, default=9_000_000_000_000, help="id первого тестового пользователя")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    asyncio.run(run_benchmark(args.users, args.flips, args.bet, args.user_base))
+
+
+if __name__ == "__main__":
+    main()
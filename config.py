@@ -37,6 +37,10 @@ GOOGLE_API_KEY_1 = os.getenv("GOOGLE_API_KEY_1")
 GOOGLE_API_KEY_2 = os.getenv("GOOGLE_API_KEY_2")
 GOOGLE_API_KEYS = [key for key in [GOOGLE_API_KEY_1, GOOGLE_API_KEY_2] if key]
 GROQ_MODEL_NAME = os.getenv("GROQ_MODEL_NAME", "llama3-70b-8192")
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY") or 4)
+AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS") or 30.0)
+AI_EXECUTOR_WORKERS = int(os.getenv("AI_EXECUTOR_WORKERS") or 2)
+AI_WEB_SEARCH_CACHE_TTL_SECONDS = int(os.getenv("AI_WEB_SEARCH_CACHE_TTL_SECONDS") or 7 * 24 * 3600)
 #--- ПАРАМЕТРЫ ПЛАТНОГО РАЗБАНА ---
 PAYMENT_PROVIDER_TOKEN = os.getenv("PAYMENT_PROVIDER_TOKEN", "")
 PAID_UNBAN_COST_STARS = int(os.getenv("PAID_UNBAN_COST_STARS") or 1)
@@ -104,11 +108,38 @@ class Limits:
     WARNINGS_THRESHOLD_FOR_BAN = 3
     LINKS_PER_PAGE = 10
 
+#--- Подготовка изображений для OCR ---
+class ImageProcessing:
+    WORKERS = int(os.getenv("IMAGE_PROCESSING_WORKERS") or 2)
+    JPEG_QUALITY = int(os.getenv("IMAGE_PROCESSING_JPEG_QUALITY") or 80)
+    DEFAULT_MAX_EDGE = 1280
+    # Максимальная сторона изображения для каждой задачи OCR.
+    # Имя и уровень читаются и с небольших скриншотов, даты отзывов - мельче.
+    MAX_EDGE_BY_TASK = {
+        'google_profile_check': 1024,
+        'yandex_profile_check': 1024,
+        'google_reviews_check': 1600,
+    }
+    # Относительная область (left, top, right, bottom) для обрезки перед отправкой.
+    # Для проверки отзывов важен только верх экрана с самым свежим отзывом.
+    CROP_BY_TASK = {
+        'google_reviews_check': (0.0, 0.0, 1.0, 0.7),
+    }
+    # Максимальное расстояние Хэмминга между dHash, при котором скриншоты считаются похожими
+    DUPLICATE_MAX_DISTANCE = int(os.getenv("SCREENSHOT_DUPLICATE_MAX_DISTANCE") or 6)
+    DUPLICATE_BACKFILL_BATCH = 200
+
+#--- Дисковый кэш файлов Telegram ---
+FILE_CACHE_DIR = os.getenv("FILE_CACHE_DIR", "cache/telegram_files")
+FILE_CACHE_MAX_MB = int(os.getenv("FILE_CACHE_MAX_MB") or 512)
+
 #--- Экономика и игры ---
 TRANSFER_COMMISSION_PERCENT = float(os.getenv("TRANSFER_COMMISSION_PERCENT") or 5.0)
 STAKE_THRESHOLD_REWARD = float(os.getenv("STAKE_THRESHOLD_REWARD") or 50.0)
 STAKE_AMOUNT = float(os.getenv("STAKE_AMOUNT") or 5.0)
 NOVICE_HELP_AMOUNT = float(os.getenv("NOVICE_HELP_AMOUNT") or 0.5)
+# Минимальная ставка в "Орёл и Решка": меньше сотой звезды ставка округлилась бы до нуля
+COINFLIP_MIN_BET = max(float(os.getenv("COINFLIP_MIN_BET") or 0.01), 0.01)
 
 #--- Депозитные планы ---
 DEPOSIT_PLANS = {
@@ -137,6 +168,124 @@ DEPOSIT_PLANS = {
 "description": "+3% каждые 24 часа в течение 4 дней (неотзывной)"
 }
 }
+#--- Пул заранее сгенерированных текстов отзывов ---
+class ReviewTextPool:
+    TEXTS_PER_LINK = int(os.getenv("REVIEW_POOL_TEXTS_PER_LINK") or 3)
+    CONCURRENCY = int(os.getenv("REVIEW_POOL_CONCURRENCY") or 2)
+    DAILY_BUDGET = int(os.getenv("REVIEW_POOL_DAILY_BUDGET") or 300)
+    PLATFORMS = ("google_maps", "yandex_with_text")
+
+#--- Распределение задач между админами одной роли ---
+class AdminRouting:
+    # Через сколько минут неотработанная задача перестает учитываться в очереди админа
+    TASK_TTL_MINUTES = int(os.getenv("ADMIN_TASK_TTL_MINUTES") or 120)
+    # Рассылка уведомления нескольким админам: сколько отправок идет одновременно и сколько ждать каждую
+    NOTIFY_CONCURRENCY = int(os.getenv("ADMIN_NOTIFY_CONCURRENCY") or 8)
+    NOTIFY_TIMEOUT_SECONDS = float(os.getenv("ADMIN_NOTIFY_TIMEOUT_SECONDS") or 10)
+
+#--- Очередь модерации с арендой задач ---
+class ModerationQueue:
+    # На сколько минут задача закрепляется за взявшим ее админом; после истечения возвращается в очередь
+    LEASE_MINUTES = int(os.getenv("MODERATION_LEASE_MINUTES") or 15)
+
+
+#--- Массовый импорт ссылок ---
+class LinkImport:
+    CHUNK_SIZE = 1000
+    MAX_FILE_MB = 20  # лимит Bot API на скачивание файлов
+    BACKFILL_BATCH = 5000
+
+
+#--- Уведомления подписчиков о новых заданиях ---
+class SubscriberNotifications:
+    CHUNK_SIZE = int(os.getenv("SUBSCRIBER_NOTIFY_CHUNK_SIZE") or 200)
+    CONCURRENCY = int(os.getenv("SUBSCRIBER_NOTIFY_CONCURRENCY") or 10)
+    # Общий лимит Telegram - около 30 сообщений в секунду, оставляем запас для остального бота
+    RATE_PER_SECOND = float(os.getenv("SUBSCRIBER_NOTIFY_RATE") or 20)
+    # Повторные добавления ссылок за это время объединяются в одну рассылку
+    COALESCE_SECONDS = float(os.getenv("SUBSCRIBER_NOTIFY_COALESCE_SECONDS") or 5)
+
+
+#--- Поиск почти одинаковых текстов отзывов (MinHash/LSH) ---
+class TextSimilarity:
+    # Порог оценки сходства Жаккара по символьным шинглам, выше которого текст считается повтором
+    THRESHOLD = float(os.getenv("TEXT_SIMILARITY_THRESHOLD") or 0.7)
+    SHINGLE_SIZE = 5
+    NUM_PERM = 64
+    BANDS = 16
+    # Сколько раз генератор пытается получить уникальный текст
+    MAX_REGENERATIONS = int(os.getenv("TEXT_SIMILARITY_MAX_REGENERATIONS") or 2)
+    BACKFILL_BATCH = 500
+
+#--- Промокоды ---
+class PromoCodes:
+    # Сколько помнить, что кода нет: в Redis (общий для процессов) и в памяти процесса
+    NEGATIVE_CACHE_TTL_SECONDS = int(os.getenv("PROMO_NEGATIVE_CACHE_TTL") or 600)
+    LOCAL_NEGATIVE_CACHE_TTL_SECONDS = 60
+    NEGATIVE_CACHE_SIZE = 10000
+    # Более длинный ввод не может быть промокодом и в БД не ищется
+    MAX_CODE_LENGTH = 64
+    # Массовая генерация одноразовых кодов
+    BATCH_MAX_COUNT = 50000
+    BATCH_CHUNK_SIZE = 1000
+    BATCH_CODE_LENGTH = 8
+    BATCH_INSERT_ATTEMPTS = 5
+
+
+#--- Книга двойной записи ---
+class Ledger:
+    # Снимок баланса пользовательского счета пишется раз в столько проводок по нему
+    SNAPSHOT_EVERY = int(os.getenv("LEDGER_SNAPSHOT_EVERY") or 100)
+    # Сколько проводок читается за раз при полной проверке книги
+    VERIFY_BATCH = int(os.getenv("LEDGER_VERIFY_BATCH") or 5000)
+    MAX_REPORTED = 20
+
+
+#--- Сверка балансов с историей операций ---
+class BalanceReconciliation:
+    CHUNK_SIZE = int(os.getenv("BALANCE_RECONCILIATION_CHUNK_SIZE") or 2000)
+    # Сколько расхождений попадает в лог подробно
+    MAX_REPORTED = 20
+
+
+#--- История операций пользователя ---
+class OperationHistoryView:
+    PAGE_SIZE = 10
+    # Сколько строк за раз забирается из серверного курсора при выгрузке в CSV
+    EXPORT_BATCH = 1000
+
+
+#--- Секции и архив истории операций ---
+class OperationHistoryArchiving:
+    # На сколько месяцев вперед заранее создаются секции operation_history
+    PREMAKE_MONTHS = 2
+    # Секции старше стольких полных месяцев отсоединяются в архив; 0 - не архивировать
+    ARCHIVE_AFTER_MONTHS = int(os.getenv("OPERATION_HISTORY_ARCHIVE_AFTER_MONTHS") or 12)
+    # "table" - отсоединенная секция остается в БД отдельной таблицей,
+    # "file" - выгружается в сжатый CSV в ARCHIVE_DIR, после чего таблица удаляется
+    ARCHIVE_MODE = os.getenv("OPERATION_HISTORY_ARCHIVE_MODE", "table")
+    ARCHIVE_DIR = os.getenv("OPERATION_HISTORY_ARCHIVE_DIR", "archive/operation_history")
+    EXPORT_BATCH = 5000
+    LOCK_TIMEOUT_SECONDS = 5
+
+
+#--- Redis-индекс кулдаунов ---
+class CooldownIndex:
+    # Сколько наступивших окончаний кулдаунов разбирается за один запуск рассылки уведомлений
+    NOTIFY_BATCH = 200
+    # Как часто проверяется, что индекс построен (после потери данных Redis он перестраивается из БД)
+    CHECK_INTERVAL_MINUTES = 5
+
+
+#--- Реферальная система ---
+class Referrals:
+    # Реферал считается активным, если за столько дней принес рефереру награду
+    ACTIVE_DAYS = 30
+    LIST_PAGE_SIZE = 20
+    # Как часто накопленные награды зачисляются в копилки рефереров одним пакетом
+    FLUSH_INTERVAL_SECONDS = int(os.getenv("REFERRAL_FLUSH_INTERVAL_SECONDS") or 60)
+
+
 #Категории для AI сценариев
 AI_SCENARIO_CATEGORIES = ["Кафе/Ресторан", "Автосервис", "Салон красоты", "Общее"]
 #--- Настройки подключения к базам данных ---
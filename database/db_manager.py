@@ -6,17 +6,28 @@ import json
 import asyncio
 from typing import Union, List, Tuple, Dict, Optional, Set, Any
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy import select, update, and_, delete, func, desc, case, insert
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update, and_, or_, delete, func, desc, case, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import BigInteger, DateTime, Integer, Numeric, String, cast, column, literal, tuple_, text as sa_text, values as sa_values
+from sqlalchemy.orm import aliased, selectinload
 from sqlalchemy.exc import IntegrityError
+from redis.exceptions import RedisError
+from cachetools import TTLCache
 
 from database.models import (Base, User, Review, Link, WithdrawalRequest,
                              PromoCode, PromoActivation, SupportTicket,
                              RewardSetting, SystemSetting, OperationHistory, UnbanRequest,
                              InternshipApplication, InternshipTask, InternshipMistake,
                              Administrator, PostTemplate, TransferComplaint, TaskSubscription,
-                             AIScenario, UserDeposit, Donation)
-from config import DATABASE_URL, Durations, Limits, TRANSFER_COMMISSION_PERCENT
+                             AIScenario, UserDeposit, Donation, ScreenshotHash, ReviewTextPoolItem,
+                             ReviewTextSignature, ModerationQueueItem, LinkCounter,
+                             LedgerEntry, LedgerAccount, LedgerSnapshot,
+                             OperationHistoryArchive, ArchivedOperationTotal,
+                             ReferralStats, ReferralAccrual)
+from config import COINFLIP_MIN_BET, DATABASE_URL, Durations, Ledger, Limits, OperationHistoryView, Referrals, TRANSFER_COMMISSION_PERCENT
+from utils import cooldown_index, intern_index, promo_cache
+from utils.money import Stars
+from utils.url_normalizer import normalize_url, url_hash
 
 logger = logging.getLogger(__name__)
 
@@ -48,26 +59,491 @@ async def log_operation(session, user_id: int, op_type: str, amount: float, desc
     await session.flush()
     return new_op.id
 
-async def get_operation_history(user_id: int, limit: int = 6) -> List[OperationHistory]:
-    """Получает последние N операций пользователя за 24 часа."""
-    async with async_session() as session:
-        time_threshold = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
+
+# --- Книга двойной записи ---
+LEDGER_HOUSE = "house"
+LEDGER_FUND = "fund"
+# Через системные счета идет почти каждая проводка, поэтому своей строки в ledger_accounts
+# у них нет: общая строка сериализовала бы все денежные операции. Их баланс считает проверка книги.
+_LEDGER_SYSTEM_ACCOUNTS = (LEDGER_HOUSE, LEDGER_FUND)
+
+# Проводка: (счет-получатель, счет-источник, сумма)
+LedgerPosting = Tuple[str, str, Any]
+
+
+def ledger_account(kind: str, user_id: int) -> str:
+    """Имя пользовательского счета книги: kind - user, hold или referral."""
+    return f"{kind}:{user_id}"
+
+
+async def _post_ledger(session, postings: List[LedgerPosting], operation_id: Optional[int] = None):
+    """
+    Записывает проводки в текущей транзакции и обновляет балансы пользовательских счетов.
+    Отрицательная сумма разворачивает проводку, нулевые пропускаются.
+    Строки счетов блокируются до вставки проводок, поэтому номера проводок по счету растут
+    в порядке фиксации, и снимок после проводки entry_id учитывает все проводки до нее.
+    """
+    rows = []
+    changes: Dict[str, List[int]] = {}  # счет -> [изменение в сотых, число проводок]
+    for debit, credit, amount in postings:
+        amount = Stars(amount)
+        if amount < 0:
+            debit, credit, amount = credit, debit, -amount
+        if not amount or debit == credit:
+            continue
+        rows.append({"debit_account": debit, "credit_account": credit, "amount": amount, "operation_id": operation_id})
+        for account, minor in ((debit, amount.minor), (credit, -amount.minor)):
+            if account not in _LEDGER_SYSTEM_ACCOUNTS:
+                change = changes.setdefault(account, [0, 0])
+                change[0] += minor
+                change[1] += 1
+    if not rows:
+        return
+
+    updated = []
+    if changes:
+        account_rows = [
+            {"account": account, "balance": Stars.from_minor(minor), "entry_count": count}
+            for account, (minor, count) in sorted(changes.items())
+        ]
+        stmt = pg_insert(LedgerAccount).values(account_rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LedgerAccount.account],
+            set_={
+                "balance": LedgerAccount.balance + stmt.excluded.balance,
+                "entry_count": LedgerAccount.entry_count + stmt.excluded.entry_count,
+            }
+        ).returning(LedgerAccount.account, LedgerAccount.balance, LedgerAccount.entry_count)
+        updated = (await session.execute(stmt)).all()
+
+    # Время берется у БД уже после блокировки счетов: проводки по счету упорядочены
+    # по created_at так же, как по фиксации, и get_ledger_balance_at не расходится с ней на границе
+    now = (await session.execute(select(func.timezone('utc', func.clock_timestamp())))).scalar_one()
+    for row in rows:
+        row["created_at"] = now
+    result = await session.execute(
+        insert(LedgerEntry).values(rows).returning(LedgerEntry.id, LedgerEntry.debit_account, LedgerEntry.credit_account)
+    )
+    last_entry_ids: Dict[str, int] = {}
+    for entry_id, debit, credit in result.all():
+        for account in (debit, credit):
+            last_entry_ids[account] = max(last_entry_ids.get(account, 0), entry_id)
+
+    every = Ledger.SNAPSHOT_EVERY
+    snapshots = [
+        {"account": account, "entry_id": last_entry_ids[account], "balance": balance, "entry_count": entry_count, "created_at": now}
+        for account, balance, entry_count in updated
+        if entry_count // every > (entry_count - changes[account][1]) // every
+    ]
+    if snapshots:
+        await session.execute(insert(LedgerSnapshot).values(snapshots))
+
+
+async def get_ledger_balance_at(account: str, at: datetime.datetime) -> float:
+    """
+    Баланс счета на момент at: последний снимок не позже at плюс проводки после него.
+    Проводки читаются только до следующего снимка, то есть не больше Ledger.SNAPSHOT_EVERY.
+    У системных счетов снимков нет, для них суммируются все проводки.
+    """
+    async with async_session() as session:
+        snapshot_query = (
+            select(LedgerSnapshot.entry_id, LedgerSnapshot.balance)
+            .where(LedgerSnapshot.account == account, LedgerSnapshot.created_at <= at)
+            .order_by(LedgerSnapshot.created_at.desc(), LedgerSnapshot.entry_id.desc())
+            .limit(1)
+        )
+        snapshot = (await session.execute(snapshot_query)).first()
+        after_entry_id, balance = (snapshot.entry_id, snapshot.balance) if snapshot else (0, 0.0)
+
+        next_query = select(func.min(LedgerSnapshot.entry_id)).where(
+            LedgerSnapshot.account == account, LedgerSnapshot.entry_id > after_entry_id
+        )
+        next_entry_id = (await session.execute(next_query)).scalar_one_or_none()
+
+        entry_filter = [LedgerEntry.id > after_entry_id, LedgerEntry.created_at <= at]
+        if next_entry_id:
+            entry_filter.append(LedgerEntry.id <= next_entry_id)
+        debits = select(func.coalesce(func.sum(LedgerEntry.amount), 0)).where(LedgerEntry.debit_account == account, *entry_filter)
+        credits = select(func.coalesce(func.sum(LedgerEntry.amount), 0)).where(LedgerEntry.credit_account == account, *entry_filter)
+        result = await session.execute(select(debits.scalar_subquery(), credits.scalar_subquery()))
+        debit_total, credit_total = result.one()
+        return float(Stars(balance) + Stars(debit_total) - Stars(credit_total))
+
+
+async def verify_ledger() -> Dict[str, Any]:
+    """
+    Проверяет всю книгу одним потоковым проходом по проводкам в порядке id, параллельно
+    с таким же проходом по снимкам в порядке entry_id (в памяти только балансы счетов):
+    каждый снимок сверяется с нарастающим балансом счета на его проводке, итоговые суммы -
+    с ledger_accounts, пользовательские счета - с балансами в users, счет fund - с балансом фонда.
+    Все чтения идут в одном снимке данных (REPEATABLE READ), параллельные операции не мешают.
+    Возвращает {'entries', 'accounts', 'snapshots', 'mismatched', 'examples'}.
+    """
+    report = {"entries": 0, "accounts": 0, "snapshots": 0, "mismatched": 0, "examples": []}
+
+    def mismatch(text: str):
+        report["mismatched"] += 1
+        if len(report["examples"]) < Ledger.MAX_REPORTED:
+            report["examples"].append(text)
+
+    async with async_session() as session:
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+        async def stream_rows(query):
+            stream = await session.stream(query.execution_options(yield_per=Ledger.VERIFY_BATCH))
+            async for partition in stream.partitions():
+                for row in partition:
+                    yield row
+
+        snapshots = stream_rows(
+            select(LedgerSnapshot.entry_id, LedgerSnapshot.account, LedgerSnapshot.balance)
+            .order_by(LedgerSnapshot.entry_id, LedgerSnapshot.account)
+        )
+        snapshot = await anext(snapshots, None)
+
+        def orphan_snapshot(snapshot):
+            mismatch(f"снимок {snapshot.account} ссылается на отсутствующую проводку #{snapshot.entry_id}")
+
+        balances: Dict[str, int] = {}
+        counts: Dict[str, int] = {}
+        entries = stream_rows(
+            select(LedgerEntry.id, LedgerEntry.debit_account, LedgerEntry.credit_account, LedgerEntry.amount)
+            .order_by(LedgerEntry.id)
+        )
+        async for entry_id, debit, credit, amount in entries:
+            report["entries"] += 1
+            minor = Stars(amount).minor
+            if minor <= 0 or debit == credit:
+                mismatch(f"проводка #{entry_id}: {credit} -> {debit} на {amount}")
+            balances[debit] = balances.get(debit, 0) + minor
+            balances[credit] = balances.get(credit, 0) - minor
+            for account in (debit, credit):
+                counts[account] = counts.get(account, 0) + 1
+
+            # Оба прохода упорядочены по номеру проводки, снимки разбираются слиянием
+            while snapshot is not None and snapshot.entry_id <= entry_id:
+                report["snapshots"] += 1
+                if snapshot.entry_id < entry_id or snapshot.account not in (debit, credit):
+                    orphan_snapshot(snapshot)
+                elif Stars(snapshot.balance).minor != balances[snapshot.account]:
+                    mismatch(
+                        f"снимок {snapshot.account} на проводке #{entry_id}: {Stars(snapshot.balance)}, "
+                        f"по проводкам {Stars.from_minor(balances[snapshot.account])}"
+                    )
+                snapshot = await anext(snapshots, None)
+        while snapshot is not None:
+            report["snapshots"] += 1
+            orphan_snapshot(snapshot)
+            snapshot = await anext(snapshots, None)
+        if sum(balances.values()) != 0:
+            mismatch(f"сумма всех счетов не равна нулю: {Stars.from_minor(sum(balances.values()))}")
+
+        stored_accounts = set()
+        stream = await session.stream(
+            select(LedgerAccount.account, LedgerAccount.balance, LedgerAccount.entry_count)
+            .execution_options(yield_per=Ledger.VERIFY_BATCH)
+        )
+        async for partition in stream.partitions():
+            for account, balance, entry_count in partition:
+                report["accounts"] += 1
+                stored_accounts.add(account)
+                if Stars(balance).minor != balances.get(account, 0) or entry_count != counts.get(account, 0):
+                    mismatch(
+                        f"счет {account}: {balance} ({entry_count} пров.), по проводкам "
+                        f"{Stars.from_minor(balances.get(account, 0))} ({counts.get(account, 0)} пров.)"
+                    )
+        for account in balances.keys() - stored_accounts - set(_LEDGER_SYSTEM_ACCOUNTS):
+            mismatch(f"счет {account} есть в проводках, но отсутствует в ledger_accounts")
+
+        stream = await session.stream(
+            select(User.id, User.balance, User.hold_balance, User.referral_earnings)
+            .execution_options(yield_per=Ledger.VERIFY_BATCH)
+        )
+        async for partition in stream.partitions():
+            for user_id, balance, hold_balance, referral_earnings in partition:
+                for kind, value in (("user", balance), ("hold", hold_balance), ("referral", referral_earnings)):
+                    account = ledger_account(kind, user_id)
+                    if Stars(value or 0).minor != balances.get(account, 0):
+                        mismatch(f"{account}: в users {Stars(value or 0)}, в книге {Stars.from_minor(balances.get(account, 0))}")
+
+        fund_setting = await session.get(SystemSetting, "donation_fund_balance")
+        fund_balance = Stars(fund_setting.value) if fund_setting and fund_setting.value else Stars()
+        if fund_balance.minor != balances.get(LEDGER_FUND, 0):
+            mismatch(f"fund: в настройках {fund_balance}, в книге {Stars.from_minor(balances.get(LEDGER_FUND, 0))}")
+    return report
+
+
+# --- Атомарное изменение баланса ---
+async def _apply_balance_delta(
+    session,
+    user_id: int,
+    delta: float,
+    op_type: Optional[str] = None,
+    description: Optional[str] = None,
+    allow_negative: bool = False,
+    extra_values: Optional[Dict[str, Any]] = None,
+    counter_account: Optional[str] = LEDGER_HOUSE,
+    **log_kwargs
+) -> Optional[float]:
+    """
+    Меняет баланс одним UPDATE ... RETURNING вместо чтения-изменения-записи через ORM,
+    поэтому параллельные изменения не теряются и не требуют предварительной блокировки.
+    Списание не проходит, если баланс ушел бы в минус (кроме allow_negative, например для штрафов).
+    Операция и проводка между счетом пользователя и counter_account пишутся в той же транзакции;
+    counter_account=None - проводки делает вызывающий код. Возвращает новый баланс или None,
+    если пользователя нет или средств недостаточно.
+    """
+    query = update(User).where(User.id == user_id).values(balance=User.balance + delta, **(extra_values or {}))
+    if delta < 0 and not allow_negative:
+        query = query.where(User.balance + delta >= 0)
+    result = await session.execute(query.returning(User.balance).execution_options(synchronize_session=False))
+    new_balance = result.scalar_one_or_none()
+    if new_balance is None:
+        return None
+    operation_id = await log_operation(session, user_id, op_type, delta, description, **log_kwargs) if op_type else None
+    if counter_account:
+        await _post_ledger(session, [(ledger_account("user", user_id), counter_account, delta)], operation_id)
+    return new_balance
+
+
+async def _apply_hold_delta(session, user_id: int, delta: float, partial: bool = False) -> Optional[Stars]:
+    """
+    Меняет hold_balance одним UPDATE, как _apply_balance_delta для баланса.
+    Списание не проходит, если холда не хватает; при partial=True списывается весь остаток холда.
+    Возвращает фактическое изменение (для списания - отрицательное) или None,
+    если пользователя нет или холда не хватило. Проводки делает вызывающий код.
+    """
+    if delta >= 0 or not partial:
+        query = update(User).where(User.id == user_id).values(hold_balance=User.hold_balance + delta)
+        if delta < 0:
+            query = query.where(User.hold_balance + delta >= 0)
+        result = await session.execute(query.returning(User.id).execution_options(synchronize_session=False))
+        return Stars(delta) if result.scalar_one_or_none() is not None else None
+
+    # Прежнее значение холда нужно, чтобы знать, сколько списано: RETURNING отдает только новое
+    held = select(User.id, User.hold_balance).where(User.id == user_id).with_for_update().subquery()
+    query = (
+        update(User)
+        .where(User.id == held.c.id)
+        .values(hold_balance=func.greatest(User.hold_balance + delta, 0))
+        .returning(held.c.hold_balance)
+        .execution_options(synchronize_session=False)
+    )
+    old_hold = (await session.execute(query)).scalar_one_or_none()
+    if old_hold is None:
+        return None
+    return -max(min(Stars(old_hold), -Stars(delta)), Stars())
+
+
+async def _lock_users(session, user_ids: List[int]) -> Dict[int, Any]:
+    """
+    Блокирует строки пользователей в порядке возрастания id. Операции над несколькими
+    балансами (переводы) берут блокировки в одном порядке и не взаимоблокируются.
+    """
+    query = (
+        select(User.id, User.username, User.first_task_completed)
+        .where(User.id.in_(set(user_ids)))
+        .order_by(User.id)
+        .with_for_update()
+    )
+    result = await session.execute(query)
+    return {row.id: row for row in result.all()}
+
+
+async def _adjust_setting_amount(session, key: str, delta: float) -> Optional[float]:
+    """
+    Атомарно меняет числовую системную настройку (баланс фонда и т.п.).
+    Списание не проходит, если значение ушло бы в минус. Возвращает новое значение или None.
+    """
+    new_value = cast(cast(func.coalesce(SystemSetting.value, '0'), Numeric) + delta, String)
+    if delta >= 0:
         query = (
-            select(OperationHistory)
-            .where(
-                and_(
-                    OperationHistory.user_id == user_id,
-                    OperationHistory.created_at >= time_threshold
-                )
-            )
-            .options(
-                selectinload(OperationHistory.sender), # Загружаем отправителя
-            )
-            .order_by(desc(OperationHistory.created_at))
+            pg_insert(SystemSetting)
+            .values(key=key, value=str(delta))
+            .on_conflict_do_update(index_elements=[SystemSetting.key], set_={"value": new_value})
+        )
+    else:
+        query = (
+            update(SystemSetting)
+            .where(SystemSetting.key == key, cast(func.coalesce(SystemSetting.value, '0'), Numeric) + delta >= 0)
+            .values(value=new_value)
+            .execution_options(synchronize_session=False)
+        )
+    result = await session.execute(query.returning(SystemSetting.value))
+    value = result.scalar_one_or_none()
+    return float(value) if value is not None else None
+
+
+async def get_balance_reconciliation_chunk(after_user_id: int, limit: int) -> List[Tuple[int, float, float]]:
+    """
+    Порция пользователей с id > after_user_id по возрастанию id: (id, баланс, сумма операций).
+    Баланс и сумма читаются одним запросом, то есть из одного снимка данных,
+    а операции суммируются только для пользователей порции (по индексу user_id).
+    Операции из архивированных секций учитываются итогами archived_operation_totals.
+    """
+    async with async_session() as session:
+        users_chunk = (
+            select(User.id, User.balance)
+            .where(User.id > after_user_id)
+            .order_by(User.id)
             .limit(limit)
+            .cte("users_chunk")
+        )
+        totals = (
+            select(OperationHistory.user_id, func.sum(OperationHistory.amount).label("total"))
+            .where(OperationHistory.user_id.in_(select(users_chunk.c.id)))
+            .group_by(OperationHistory.user_id)
+            .subquery()
+        )
+        query = (
+            select(
+                users_chunk.c.id, func.coalesce(users_chunk.c.balance, 0),
+                func.coalesce(totals.c.total, 0) + func.coalesce(ArchivedOperationTotal.amount, 0)
+            )
+            .outerjoin(totals, totals.c.user_id == users_chunk.c.id)
+            .outerjoin(ArchivedOperationTotal, ArchivedOperationTotal.user_id == users_chunk.c.id)
+            .order_by(users_chunk.c.id)
         )
         result = await session.execute(query)
-        return result.scalars().all()
+        return [tuple(row) for row in result.all()]
+
+# --- Секции и архив истории операций ---
+async def get_operation_history_partitions() -> List[str]:
+    """Имена секций, подключенных к operation_history (включая DEFAULT)."""
+    async with async_session() as session:
+        result = await session.execute(sa_text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = 'operation_history'"
+        ))
+        return [name for (name,) in result.all()]
+
+async def create_operation_history_partition(name: str, range_start: datetime.date, range_end: datetime.date) -> int:
+    """
+    Создает секцию [range_start, range_end). Строки этого диапазона, успевшие попасть в DEFAULT-секцию,
+    переносятся в новую секцию той же транзакцией. Возвращает число перенесенных строк.
+    """
+    bounds = {"range_start": range_start, "range_end": range_end}
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(sa_text(f'CREATE TABLE "{name}" (LIKE operation_history INCLUDING DEFAULTS)'))
+            moved = await session.execute(sa_text(
+                "WITH moved AS ("
+                "    DELETE FROM operation_history_default WHERE created_at >= :range_start AND created_at < :range_end RETURNING *"
+                f') INSERT INTO "{name}" SELECT * FROM moved'
+            ), bounds)
+            await session.execute(sa_text(
+                f"ALTER TABLE operation_history ATTACH PARTITION \"{name}\" "
+                f"FOR VALUES FROM ('{range_start.isoformat()}') TO ('{range_end.isoformat()}')"
+            ))
+            return moved.rowcount
+
+async def archive_operation_history_partition(name: str, range_start: datetime.date, range_end: datetime.date, lock_timeout_seconds: int) -> int:
+    """
+    Отсоединяет секцию от operation_history. В той же транзакции суммы операций секции добавляются
+    к archived_operation_totals (сверка баланса с историей остается точной) и секция регистрируется
+    в operation_history_archives. Возвращает число строк секции.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            # DETACH берет эксклюзивную блокировку operation_history: лучше пропустить запуск, чем долго ждать
+            await session.execute(sa_text(f"SET LOCAL lock_timeout = '{int(lock_timeout_seconds)}s'"))
+            row_count = (await session.execute(sa_text(f'SELECT count(*) FROM "{name}"'))).scalar_one()
+            await session.execute(sa_text(
+                "INSERT INTO archived_operation_totals (user_id, amount, operations) "
+                f'SELECT user_id, sum(amount), count(*) FROM "{name}" GROUP BY user_id '
+                "ON CONFLICT (user_id) DO UPDATE SET "
+                "amount = archived_operation_totals.amount + excluded.amount, "
+                "operations = archived_operation_totals.operations + excluded.operations"
+            ))
+            session.add(OperationHistoryArchive(
+                partition_name=name,
+                range_start=datetime.datetime.combine(range_start, datetime.time()),
+                range_end=datetime.datetime.combine(range_end, datetime.time()),
+                row_count=row_count
+            ))
+            await session.execute(sa_text(f'ALTER TABLE operation_history DETACH PARTITION "{name}"'))
+            return row_count
+
+async def get_history_archives_in_db() -> List[str]:
+    """Архивированные секции, которые еще лежат в БД отдельными таблицами."""
+    async with async_session() as session:
+        query = select(OperationHistoryArchive.partition_name).where(OperationHistoryArchive.file_path.is_(None))
+        return (await session.execute(query.order_by(OperationHistoryArchive.range_start))).scalars().all()
+
+# Колонки выгрузки архивной секции, в порядке модели
+HISTORY_ARCHIVE_COLUMNS = [history_column.name for history_column in OperationHistory.__table__.columns]
+
+async def stream_history_archive(name: str, batch_size: int):
+    """Строки отсоединенной секции (колонки HISTORY_ARCHIVE_COLUMNS) порциями через серверный курсор."""
+    columns = ", ".join(f'"{column_name}"' for column_name in HISTORY_ARCHIVE_COLUMNS)
+    async with async_session() as session:
+        stream = await session.stream(
+            sa_text(f'SELECT {columns} FROM "{name}" ORDER BY created_at, id').execution_options(yield_per=batch_size)
+        )
+        async for partition in stream.partitions():
+            yield partition
+
+async def drop_history_archive_table(name: str, file_path: str):
+    """Помечает секцию выгруженной в файл и удаляет ее таблицу."""
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(OperationHistoryArchive)
+                .where(OperationHistoryArchive.partition_name == name)
+                .values(file_path=file_path)
+            )
+            await session.execute(sa_text(f'DROP TABLE "{name}"'))
+
+# Позиция в истории для keyset-пагинации: (created_at, id) последней показанной операции
+HistoryCursor = Tuple[datetime.datetime, int]
+
+async def get_operation_history_page(
+    user_id: int, before: Optional[HistoryCursor] = None, limit: int = OperationHistoryView.PAGE_SIZE
+) -> Tuple[List[OperationHistory], Dict[int, str], bool]:
+    """
+    Страница истории от новых операций к старым по индексу (user_id, created_at, id).
+    Имена отправителей переводов подгружаются одним запросом на страницу.
+    Возвращает (операции, {id отправителя: username}, есть ли операции старше).
+    """
+    async with async_session() as session:
+        query = select(OperationHistory).where(OperationHistory.user_id == user_id)
+        if before:
+            query = query.where(tuple_(OperationHistory.created_at, OperationHistory.id) < tuple_(*before))
+        query = query.order_by(desc(OperationHistory.created_at), desc(OperationHistory.id)).limit(limit + 1)
+        operations = (await session.execute(query)).scalars().all()
+        has_more = len(operations) > limit
+        operations = operations[:limit]
+
+        sender_ids = {op.sender_id for op in operations if op.sender_id and not op.is_anonymous}
+        usernames = {}
+        if sender_ids:
+            rows = await session.execute(select(User.id, User.username).where(User.id.in_(sender_ids)))
+            usernames = {sender_id: username for sender_id, username in rows.all() if username}
+        return operations, usernames, has_more
+
+async def stream_operation_history(user_id: int):
+    """
+    Вся история пользователя от новых операций к старым порциями по OperationHistoryView.EXPORT_BATCH
+    через серверный курсор: в памяти одновременно только одна порция.
+    Строки: (created_at, operation_type, amount, description, username отправителя или None).
+    """
+    sender = aliased(User)
+    query = (
+        select(
+            OperationHistory.created_at, OperationHistory.operation_type, OperationHistory.amount,
+            OperationHistory.description, case((OperationHistory.is_anonymous, None), else_=sender.username)
+        )
+        .outerjoin(sender, sender.id == OperationHistory.sender_id)
+        .where(OperationHistory.user_id == user_id)
+        .order_by(desc(OperationHistory.created_at), desc(OperationHistory.id))
+        .execution_options(yield_per=OperationHistoryView.EXPORT_BATCH)
+    )
+    async with async_session() as session:
+        stream = await session.stream(query)
+        async for partition in stream.partitions():
+            yield partition
 
 # --- Операции с пользователями ---
 async def ensure_user_exists(user_id: int, username: str, referrer_id: int = None):
@@ -88,6 +564,12 @@ async def ensure_user_exists(user_id: int, username: str, referrer_id: int = Non
 
                 new_user = User(id=user_id, username=username, referrer_id=valid_referrer_id)
                 session.add(new_user)
+                if valid_referrer_id:
+                    stmt = pg_insert(ReferralStats).values(referrer_id=valid_referrer_id, referrals_count=1, total_earned=0)
+                    await session.execute(stmt.on_conflict_do_update(
+                        index_elements=[ReferralStats.referrer_id],
+                        set_={"referrals_count": ReferralStats.referrals_count + 1}
+                    ))
 
 
 async def get_user(user_id: int) -> Union[User, None]:
@@ -113,15 +595,11 @@ async def toggle_anonymity(user_id: int) -> bool:
             new_status = user.is_anonymous_in_stats
             return new_status
 
-async def update_balance(user_id: int, amount: float, op_type: str = None, description: str = None):
-    """Обновляет баланс и опционально логирует операцию."""
+async def update_balance(user_id: int, amount: float, op_type: str = None, description: str = None, allow_negative: bool = False) -> Optional[float]:
+    """Атомарно обновляет баланс и опционально логирует операцию. Возвращает новый баланс или None."""
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id)
-            if user:
-                user.balance += amount
-                if op_type:
-                    await log_operation(session, user_id, op_type, amount, description)
+            return await _apply_balance_delta(session, user_id, amount, op_type, description, allow_negative=allow_negative)
 
 
 async def update_username(user_id: int, new_username: str):
@@ -131,15 +609,95 @@ async def update_username(user_id: int, new_username: str):
             if user:
                 user.username = new_username
 
-async def add_referral_earning(user_id: int, amount: float):
+async def add_referral_earning(referrer_id: int, referral_id: int, amount: float):
+    """
+    Ставит награду реферера в очередь одной вставкой, не блокируя его строку в users.
+    В копилку, referral_stats и книгу она попадает пакетно через flush_referral_accruals
+    или сразу при сборе копилки.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            session.add(ReferralAccrual(referrer_id=referrer_id, referral_id=referral_id, amount=amount))
+    logger.info(f"Queued {amount} stars for referrer {referrer_id} from user {referral_id}")
+
+
+async def _flush_referral_accruals(session, referrer_id: Optional[int] = None) -> Tuple[int, int]:
+    """
+    Зачисляет ожидающие награды (все или одного реферера) в текущей транзакции.
+    Строки очереди забираются одним DELETE ... RETURNING, блокируясь по возрастанию id, поэтому
+    параллельные сборы не взаимоблокируются. Копилки, total_earned и referral_active_at обновляются
+    одним запросом на пакет, в книгу идет одна проводка на реферера.
+    Возвращает (число наград, число рефереров).
+    """
+    pending = select(ReferralAccrual.id).order_by(ReferralAccrual.id).with_for_update()
+    if referrer_id is not None:
+        pending = pending.where(ReferralAccrual.referrer_id == referrer_id)
+    query = (
+        delete(ReferralAccrual)
+        .where(ReferralAccrual.id.in_(pending.scalar_subquery()))
+        .returning(ReferralAccrual.referrer_id, ReferralAccrual.referral_id, ReferralAccrual.amount, ReferralAccrual.created_at)
+    )
+    rows = (await session.execute(query)).all()
+    if not rows:
+        return 0, 0
+
+    totals: Dict[int, Stars] = {}
+    active_at: Dict[int, datetime.datetime] = {}
+    for accrual_referrer_id, referral_id, amount, created_at in rows:
+        totals[accrual_referrer_id] = totals.get(accrual_referrer_id, Stars()) + amount
+        active_at[referral_id] = max(active_at.get(referral_id, created_at), created_at)
+
+    locked = await _lock_users(session, list(totals) + list(active_at))
+    for missing_id in set(totals) - set(locked):
+        logger.warning(f"Referral accruals of {totals.pop(missing_id)} stars dropped: referrer {missing_id} not found.")
+    if totals:
+        credited = sorted(totals.items())
+        # Суммы передаются целыми сотыми: у VALUES нет типа колонки, а BIGINT приводится явно
+        earnings = sa_values(column('id', BigInteger), column('minor', BigInteger), name='v').data(
+            [(rid, amount.minor) for rid, amount in credited]
+        )
+        await session.execute(
+            update(User)
+            .where(User.id == earnings.c.id)
+            .values(referral_earnings=User.referral_earnings + cast(earnings.c.minor, Numeric(18, 2)) / 100)
+            .execution_options(synchronize_session=False)
+        )
+        stmt = pg_insert(ReferralStats).values([
+            {"referrer_id": rid, "referrals_count": 0, "total_earned": amount.to_decimal()} for rid, amount in credited
+        ])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[ReferralStats.referrer_id],
+            set_={"total_earned": ReferralStats.total_earned + stmt.excluded.total_earned}
+        ))
+        await _post_ledger(session, [(ledger_account("referral", rid), LEDGER_HOUSE, amount) for rid, amount in credited])
+
+    activity = sa_values(column('id', BigInteger), column('active_at', DateTime), name='a').data(sorted(active_at.items()))
+    await session.execute(
+        update(User)
+        .where(
+            User.id == activity.c.id,
+            or_(User.referral_active_at.is_(None), User.referral_active_at < activity.c.active_at)
+        )
+        .values(referral_active_at=activity.c.active_at)
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows), len(totals)
+
+
+async def flush_referral_accruals() -> Tuple[int, int]:
+    """Пакетное зачисление всех ожидающих реферальных наград. Возвращает (число наград, число рефереров)."""
     async with async_session() as session:
         async with session.begin():
-            user = await get_user(user_id)
-            if user and user.referrer_id:
-                referrer = await session.get(User, user.referrer_id)
-                if referrer:
-                    referrer.referral_earnings += amount
-                    logger.info(f"Added {amount} stars to referrer {referrer.id} from user {user_id}")
+            return await _flush_referral_accruals(session)
+
+
+def _pending_referral_amount(referrer_id: int):
+    """Сумма наград реферера, еще не зачисленных в копилку."""
+    return (
+        select(func.coalesce(func.sum(ReferralAccrual.amount), 0))
+        .where(ReferralAccrual.referrer_id == referrer_id)
+        .scalar_subquery()
+    )
 
 
 async def get_referrer_info(user_id: int) -> str:
@@ -171,70 +729,143 @@ async def transfer_stars(sender_id: int, recipient_id: int, amount: float, comme
     """Переводит звезды с учетом комиссии и доп. данных, возвращает (успех, ID операции)."""
     async with async_session() as session:
         async with session.begin():
-            sender = await session.get(User, sender_id)
-            recipient = await session.get(User, recipient_id)
+            users = await _lock_users(session, [sender_id, recipient_id])
+            sender, recipient = users.get(sender_id), users.get(recipient_id)
 
             # Проверка получателя на выполнение первого задания
             if not recipient or not recipient.first_task_completed:
                 return False, -1
-
-            commission = amount * (TRANSFER_COMMISSION_PERCENT / 100)
-            total_to_deduct = amount + commission
-
-            if not sender or sender.balance < total_to_deduct:
+            if not sender or sender_id == recipient_id:
                 return False, 0
 
-            sender.balance -= total_to_deduct
-            recipient.balance += amount
-            
+            commission = Stars(amount).percent(TRANSFER_COMMISSION_PERCENT)
+            total_to_deduct = float(commission + amount)
+
             recipient_info = f"@{recipient.username}" if recipient.username else f"ID {recipient.id}"
             sender_description = f"Получатель: {recipient_info}. Комиссия: {commission:.2f} ⭐"
-            await log_operation(
-                session, sender_id, "TRANSFER_SENT", -total_to_deduct, sender_description,
-                comment=comment, media_json=json.dumps(media_list), is_anonymous=is_anonymous
+            media_json = json.dumps(media_list) if media_list else None
+            sender_balance = await _apply_balance_delta(
+                session, sender_id, -total_to_deduct, "TRANSFER_SENT", sender_description,
+                counter_account=None, comment=comment, media_json=media_json, is_anonymous=is_anonymous
             )
-            
+            if sender_balance is None:
+                return False, 0
+
+            await _apply_balance_delta(session, recipient_id, amount, counter_account=None)
             sender_info = "Анонимный отправитель" if is_anonymous else (f"@{sender.username}" if sender.username else f"ID {sender.id}")
             recipient_description = f"Отправитель: {sender_info}"
+            # Вложения хранятся один раз, в операции отправителя
             transfer_id = await log_operation(
                 session, recipient_id, "TRANSFER_RECEIVED", amount, recipient_description,
-                comment=comment, media_json=json.dumps(media_list), is_anonymous=is_anonymous, sender_id=sender_id
+                comment=comment, is_anonymous=is_anonymous, sender_id=sender_id
             )
+            await _post_ledger(session, [
+                (ledger_account("user", recipient_id), ledger_account("user", sender_id), amount),
+                (LEDGER_HOUSE, ledger_account("user", sender_id), commission),
+            ], transfer_id)
 
         return True, transfer_id
 
-async def get_referrals(user_id: int) -> list:
+async def get_referrals_page(user_id: int, after_id: Optional[int] = None, limit: int = Referrals.LIST_PAGE_SIZE) -> Tuple[list, bool]:
+    """
+    Страница рефералов по возрастанию id после after_id (keyset по индексу (referrer_id, id)).
+    Возвращает ([(id, username, referral_active_at)], есть ли следующая страница).
+    """
+    query = (
+        select(User.id, User.username, User.referral_active_at)
+        .where(User.referrer_id == user_id)
+        .order_by(User.id)
+        .limit(limit + 1)
+    )
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    async with async_session() as session:
+        rows = [tuple(row) for row in (await session.execute(query)).all()]
+    return rows[:limit], len(rows) > limit
+
+async def get_referral_stats(user_id: int) -> Tuple[int, float, int]:
+    """
+    (число рефералов, заработано всего, активных за Referrals.ACTIVE_DAYS дней).
+    Счетчики берутся из referral_stats с учетом еще не зачисленных наград,
+    активные считаются по индексу (referrer_id, referral_active_at).
+    """
+    active_since = datetime.datetime.utcnow() - datetime.timedelta(days=Referrals.ACTIVE_DAYS)
+    active = (
+        select(func.count())
+        .select_from(User)
+        .where(User.referrer_id == user_id, User.referral_active_at >= active_since)
+        .scalar_subquery()
+    )
+    referrals_count = select(ReferralStats.referrals_count).where(ReferralStats.referrer_id == user_id).scalar_subquery()
+    total_earned = select(ReferralStats.total_earned).where(ReferralStats.referrer_id == user_id).scalar_subquery()
+    query = select(
+        func.coalesce(referrals_count, 0),
+        func.coalesce(total_earned, 0) + _pending_referral_amount(user_id),
+        active
+    )
     async with async_session() as session:
-        query = select(User.username).where(User.referrer_id == user_id)
-        result = await session.execute(query)
-        return result.scalars().all()
+        referrals_count, total_earned, active_count = (await session.execute(query)).one()
+    return referrals_count, total_earned, active_count
 
 async def get_referral_earnings(user_id: int) -> float:
-    user = await get_user(user_id)
-    return user.referral_earnings if user else 0.0
+    """Копилка вместе с наградами, ожидающими пакетного зачисления."""
+    async with async_session() as session:
+        query = select(User.referral_earnings + _pending_referral_amount(user_id)).where(User.id == user_id)
+        earnings = (await session.execute(query)).scalar_one_or_none()
+    return earnings or 0.0
 
-async def claim_referral_earnings(user_id: int):
+async def claim_referral_earnings(user_id: int) -> float:
+    """
+    Переносит реферальную копилку на баланс одним UPDATE. Ожидающие награды реферера
+    сначала зачисляются в копилку в той же транзакции. Возвращает перенесенную сумму.
+    """
     async with async_session() as session:
         async with session.begin():
-            user = await get_user(user_id)
-            if user and user.referral_earnings > 0:
-                earnings = user.referral_earnings
-                user.balance += earnings
-                user.referral_earnings = 0
-                await log_operation(session, user_id, "TOP_REWARD", earnings, "Сбор реферальных наград")
+            await _flush_referral_accruals(session, user_id)
+            claimed = (
+                select(User.id, User.referral_earnings)
+                .where(User.id == user_id, User.referral_earnings > 0)
+                .with_for_update()
+                .subquery()
+            )
+            query = (
+                update(User)
+                .where(User.id == claimed.c.id)
+                .values(balance=User.balance + claimed.c.referral_earnings, referral_earnings=0)
+                .returning(claimed.c.referral_earnings)
+                .execution_options(synchronize_session=False)
+            )
+            earnings = (await session.execute(query)).scalar_one_or_none()
+            if not earnings:
+                return 0.0
+            operation_id = await log_operation(session, user_id, "TOP_REWARD", earnings, "Сбор реферальных наград")
+            await _post_ledger(session, [(ledger_account("user", user_id), ledger_account("referral", user_id), earnings)], operation_id)
+            return earnings
 
 
 async def check_platform_cooldown(user_id: int, platform: str) -> Union[datetime.timedelta, None]:
-    user = await get_user(user_id)
-    if not user:
+    """
+    Остаток кулдауна платформы. Читается из Redis-индекса одним PTTL;
+    пока индекс не построен или Redis недоступен - одной колонкой из БД.
+    """
+    try:
+        remaining = await cooldown_index.get_remaining(user_id, [platform])
+        if remaining is not None:
+            return remaining[platform]
+    except RedisError as e:
+        logger.warning(f"Cooldown index unavailable, reading cooldown from DB: {e}")
+
+    cooldown_column = getattr(User, f"{platform}_cooldown_until", None)
+    if cooldown_column is None:
         return None
-    cooldown_field = f"{platform}_cooldown_until"
-    cooldown_end_time = getattr(user, cooldown_field, None)
+    async with async_session() as session:
+        cooldown_end_time = (await session.execute(select(cooldown_column).where(User.id == user_id))).scalar_one_or_none()
     if cooldown_end_time and cooldown_end_time > datetime.datetime.utcnow():
         return cooldown_end_time - datetime.datetime.utcnow()
     return None
 
 async def set_platform_cooldown(user_id: int, platform: str, hours: float) -> Union[datetime.datetime, None]:
+    end_time = None
     async with async_session() as session:
         async with session.begin():
             user = await session.get(User, user_id)
@@ -242,11 +873,13 @@ async def set_platform_cooldown(user_id: int, platform: str, hours: float) -> Un
                 cooldown_field = f"{platform}_cooldown_until"
                 end_time = datetime.datetime.utcnow() + datetime.timedelta(hours=hours)
                 setattr(user, cooldown_field, end_time)
-                return end_time
-            return None
+    if end_time:
+        await cooldown_index.set_cooldown(user_id, platform, end_time)
+    return end_time
 
 async def add_user_warning(user_id: int, platform: str, hours_block: int = Durations.COOLDOWN_WARNING_BLOCK_HOURS) -> int:
     current_warnings = 0
+    end_time = None
     async with async_session() as session:
         async with session.begin():
             user = await session.get(User, user_id, with_for_update=True)
@@ -256,8 +889,11 @@ async def add_user_warning(user_id: int, platform: str, hours_block: int = Durat
             current_warnings = user.warnings
             if user.warnings >= Limits.WARNINGS_THRESHOLD_FOR_BAN:
                 cooldown_field = f"{platform}_cooldown_until"
-                setattr(user, cooldown_field, datetime.datetime.utcnow() + datetime.timedelta(hours=hours_block))
+                end_time = datetime.datetime.utcnow() + datetime.timedelta(hours=hours_block)
+                setattr(user, cooldown_field, end_time)
                 user.warnings = 0
+    if end_time:
+        await cooldown_index.set_cooldown(user_id, platform, end_time)
     return current_warnings
 
 async def create_review_draft(user_id: int, link_id: int, platform: str, text: str, admin_message_id: int, screenshot_file_id: str = None, attached_photo_file_id: str = None, stake_amount: float = None) -> int:
@@ -314,15 +950,14 @@ async def move_review_to_hold(review_id: int, amount: float, hold_minutes: int)
                 logger.error(f"Failed to move review {review_id} to hold. Status was not 'pending'.")
                 return False
 
-            user = await session.get(User, review.user_id)
-            if not user:
+            if await _apply_hold_delta(session, review.user_id, amount) is None:
                 logger.error(f"Failed to move review {review_id} to hold. User {review.user_id} not found.")
                 return False
 
             review.status = 'on_hold'
             review.amount = amount
             review.hold_until = datetime.datetime.utcnow() + datetime.timedelta(minutes=hold_minutes)
-            user.hold_balance += amount
+            await _post_ledger(session, [(ledger_account("hold", review.user_id), LEDGER_HOUSE, amount)])
         return True
 
 async def get_user_hold_reviews(user_id: int) -> list:
@@ -344,13 +979,19 @@ async def admin_reject_review(review_id: int) -> Union[Review, None]:
             if not review or review.status not in ['pending', 'on_hold']:
                 return None
 
-            user = await session.get(User, review.user_id)
-            if user and review.status == 'on_hold':
-                user.hold_balance -= review.amount
-            
+            hold_account = ledger_account("hold", review.user_id)
+            postings = []
+            if review.status == 'on_hold' and review.amount:
+                released = await _apply_hold_delta(session, review.user_id, -review.amount, partial=True)
+                if released:
+                    postings.append((hold_account, LEDGER_HOUSE, released))
+
             # Списание залога при отклонении
-            if review.stake_amount and review.stake_amount > 0 and user.hold_balance >= review.stake_amount:
-                user.hold_balance -= review.stake_amount
+            if review.stake_amount and review.stake_amount > 0:
+                forfeited = await _apply_hold_delta(session, review.user_id, -review.stake_amount)
+                if forfeited:
+                    postings.append((hold_account, LEDGER_HOUSE, forfeited))
+            await _post_ledger(session, postings)
 
             review.status = 'rejected'
             return review
@@ -363,26 +1004,32 @@ async def admin_approve_review(review_id: int) -> Union[Review, None]:
                 logger.warning(f"Admin approve failed for review {review_id}. Status was {review.status}, not 'awaiting_confirmation' or 'on_hold'.")
                 return None
 
-            user = await session.get(User, review.user_id)
-            if user:
-                # Списание награды из холда
-                if user.hold_balance >= review.amount:
-                    user.hold_balance -= review.amount
-                else:
-                    logger.warning(f"User {user.id} hold balance ({user.hold_balance}) is less than review amount ({review.amount}) for review {review_id}. Setting hold to 0.")
-                    user.hold_balance = 0
-                
+            user_id = review.user_id
+            # Списание награды из холда
+            released = await _apply_hold_delta(session, user_id, -review.amount, partial=True)
+            if released is not None:
+                released = -released
+                user_account, hold_account = ledger_account("user", user_id), ledger_account("hold", user_id)
+                if released < review.amount:
+                    logger.warning(f"User {user_id} hold balance ({released}) is less than review amount ({review.amount}) for review {review_id}. Setting hold to 0.")
+
                 # Возврат залога из холда на основной баланс
                 if review.stake_amount and review.stake_amount > 0:
-                    if user.hold_balance >= review.stake_amount:
-                        user.hold_balance -= review.stake_amount
-                        user.balance += review.stake_amount
+                    if await _apply_hold_delta(session, user_id, -review.stake_amount) is not None:
+                        await _apply_balance_delta(
+                            session, user_id, review.stake_amount, "STAKE_RETURN", f"Залог за отзыв #{review.id}",
+                            counter_account=hold_account
+                        )
                     else:
-                         logger.warning(f"User {user.id} hold balance ({user.hold_balance}) is less than stake amount ({review.stake_amount}) for review {review_id}.")
-                
-                # Начисление основной награды на баланс
-                user.balance += review.amount
-                await log_operation(session, user.id, "REVIEW_APPROVED", review.amount, f"Отзыв #{review.id} ({review.platform})")
+                        logger.warning(f"User {user_id} hold balance is less than stake amount ({review.stake_amount}) for review {review_id}.")
+
+                # Начисление основной награды на баланс; недостающая в холде часть доплачивается со счета house
+                await _apply_balance_delta(session, user_id, review.amount, counter_account=None)
+                operation_id = await log_operation(session, user_id, "REVIEW_APPROVED", review.amount, f"Отзыв #{review.id} ({review.platform})")
+                await _post_ledger(session, [
+                    (user_account, hold_account, released),
+                    (user_account, LEDGER_HOUSE, Stars(review.amount) - released),
+                ], operation_id)
 
             review.status = 'approved'
             return review
@@ -393,41 +1040,181 @@ async def get_all_hold_reviews() -> list[Review]:
         result = await session.execute(query)
         return result.scalars().all()
 
-async def db_add_reference(url: str, platform: str, is_fast_track: bool = False, requires_photo: bool = False, reward_amount: float = 0.0, gender_requirement: str = 'any', campaign_tag: str = None) -> bool:
+# --- Счетчики пула ссылок ---
+# Ключ счетчика: (платформа, пол, статус, тег кампании или '')
+LinkCounterKey = Tuple[str, str, str, str]
+
+def _link_counter_key(platform: Optional[str], gender: Optional[str], status: str, campaign_tag: Optional[str]) -> LinkCounterKey:
+    return (platform or '', gender or 'any', status, campaign_tag or '')
+
+def _add_link_transition(deltas: Dict[LinkCounterKey, int], platform, gender, campaign_tag, old_status: Optional[str], new_status: Optional[str]):
+    """Учитывает переход ссылки между статусами (None - ссылка создана или удалена)."""
+    if old_status == new_status:
+        return
+    if old_status:
+        key = _link_counter_key(platform, gender, old_status, campaign_tag)
+        deltas[key] = deltas.get(key, 0) - 1
+    if new_status:
+        key = _link_counter_key(platform, gender, new_status, campaign_tag)
+        deltas[key] = deltas.get(key, 0) + 1
+
+async def _apply_link_counter_deltas(session, deltas: Dict[LinkCounterKey, int]):
+    """Применяет изменения счетчиков в текущей транзакции. Ключи сортируются, чтобы не ловить взаимные блокировки."""
+    rows = [
+        {'platform': key[0], 'gender_requirement': key[1], 'status': key[2], 'campaign_tag': key[3], 'count': delta}
+        for key, delta in sorted(deltas.items()) if delta
+    ]
+    if not rows:
+        return
+    stmt = pg_insert(LinkCounter).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LinkCounter.platform, LinkCounter.gender_requirement, LinkCounter.status, LinkCounter.campaign_tag],
+        set_={'count': LinkCounter.count + stmt.excluded.count}
+    )
+    await session.execute(stmt)
+
+async def db_add_reference(url: str, platform: str, is_fast_track: bool = False, requires_photo: bool = False, reward_amount: float = 0.0, gender_requirement: str = 'any', campaign_tag: str = None) -> Optional[int]:
+    """Добавляет ссылку и возвращает ее ID. Возвращает None, если такая ссылка уже есть."""
+    normalized_url = normalize_url(url)
     async with async_session() as session:
         async with session.begin():
-            new_link = Link(
-                url=url, 
-                platform=platform, 
-                is_fast_track=is_fast_track, 
+            stmt = pg_insert(Link).values(
+                url=url,
+                platform=platform,
+                is_fast_track=is_fast_track,
                 requires_photo=requires_photo,
                 reward_amount=reward_amount,
                 gender_requirement=gender_requirement,
-                campaign_tag=campaign_tag
+                campaign_tag=campaign_tag,
+                url_hash=url_hash(normalized_url) if normalized_url else None
+            ).on_conflict_do_nothing(
+                index_elements=[Link.platform, Link.url_hash], index_where=Link.url_hash.isnot(None)
+            ).returning(Link.id)
+            link_id = (await session.execute(stmt)).scalar_one_or_none()
+            if link_id:
+                deltas = {}
+                _add_link_transition(deltas, platform, gender_requirement, campaign_tag, None, 'available')
+                await _apply_link_counter_deltas(session, deltas)
+    if link_id:
+        _invalidate_link_counts()
+    return link_id
+
+async def bulk_insert_links(rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Вставляет порцию ссылок одним INSERT. Ссылки, которые уже есть в базе
+    (совпадает платформа и хэш URL), пропускаются. Возвращает ID добавленных.
+    """
+    if not rows:
+        return []
+    async with async_session() as session:
+        async with session.begin():
+            stmt = pg_insert(Link).values(rows).on_conflict_do_nothing(
+                index_elements=[Link.platform, Link.url_hash], index_where=Link.url_hash.isnot(None)
+            ).returning(Link.id, Link.platform, Link.gender_requirement, Link.status, Link.campaign_tag)
+            inserted = (await session.execute(stmt)).all()
+            deltas = {}
+            for row in inserted:
+                _add_link_transition(deltas, row.platform, row.gender_requirement, row.campaign_tag, None, row.status)
+            await _apply_link_counter_deltas(session, deltas)
+    link_ids = [row.id for row in inserted]
+    if link_ids:
+        _invalidate_link_counts()
+    return link_ids
+
+async def get_links_without_url_hash(after_id: int, limit: int) -> List[Tuple[int, str, str]]:
+    """Возвращает (id, платформа, url) ссылок без хэша для бэкфилла."""
+    async with async_session() as session:
+        query = (
+            select(Link.id, Link.platform, Link.url)
+            .where(Link.url_hash.is_(None), Link.id > after_id)
+            .order_by(Link.id)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+async def set_link_url_hashes(hashes: List[Tuple[int, str, str]]) -> int:
+    """
+    Проставляет хэши (id, платформа, хэш) старым ссылкам. Если такой хэш уже занят
+    другой ссылкой (дубликат, добавленный до появления проверки), ссылка остается без хэша.
+    """
+    if not hashes:
+        return 0
+    values = sa_values(
+        column('id', Integer), column('platform', String), column('url_hash', String), name='v'
+    ).data(hashes)
+    other = aliased(Link)
+    async with async_session() as session:
+        async with session.begin():
+            stmt = (
+                update(Link)
+                .where(
+                    Link.id == values.c.id,
+                    ~select(other.id).where(other.platform == values.c.platform, other.url_hash == values.c.url_hash).exists()
+                )
+                .values(url_hash=values.c.url_hash)
+                .execution_options(synchronize_session=False)
             )
-            session.add(new_link)
-        return True
+            result = await session.execute(stmt)
+            return result.rowcount
 
-async def db_get_available_reference(platform: str, gender: str) -> Union[Link, None]:
+def _available_link_conditions(platform: str, gender: str) -> list:
+    return [Link.platform == platform, Link.status == 'available', Link.gender_requirement.in_(['any', gender])]
+
+async def db_has_available_reference(platform: str, gender: str) -> bool:
+    """Проверка наличия свободных ссылок по счетчикам, без чтения и блокировки строк links."""
     async with async_session() as session:
-        async with session.begin():
-            stmt = select(Link.id).where(
-                Link.platform == platform,
-                Link.status == 'available',
-                Link.gender_requirement.in_(['any', gender])
-            ).limit(1).with_for_update(skip_locked=True)
+        query = select(func.coalesce(func.sum(LinkCounter.count), 0)).where(
+            LinkCounter.platform == platform,
+            LinkCounter.status == 'available',
+            LinkCounter.gender_requirement.in_(['any', gender])
+        )
+        return (await session.scalar(query)) > 0
 
-            result = await session.execute(stmt)
-            link_id = result.scalar_one_or_none()
+async def db_peek_available_reference(platform: str, gender: str) -> Union[Link, None]:
+    """Возвращает любую свободную ссылку без блокировки - чтобы показать условия задания до его взятия."""
+    if not await db_has_available_reference(platform, gender):
+        return None
+    async with async_session() as session:
+        query = select(Link).where(*_available_link_conditions(platform, gender)).limit(1)
+        return (await session.execute(query)).scalar_one_or_none()
 
-            if link_id:
-                link_obj = await session.get(Link, link_id)
-                return link_obj
-            return None
+async def db_claim_available_reference(platform: str, gender: str, user_id: int) -> Union[Link, None]:
+    """Атомарно назначает пользователю свободную ссылку (одним UPDATE с SKIP LOCKED)."""
+    async with async_session() as session:
+        async with session.begin():
+            candidate = (
+                select(Link.id)
+                .where(*_available_link_conditions(platform, gender))
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(Link)
+                .where(Link.id == candidate)
+                .values(status='assigned', assigned_to_user_id=user_id, assigned_at=datetime.datetime.utcnow())
+                .returning(Link)
+                .execution_options(synchronize_session=False)
+            )
+            link = (await session.execute(stmt)).scalar_one_or_none()
+            if link:
+                deltas = {}
+                _add_link_transition(deltas, link.platform, link.gender_requirement, link.campaign_tag, 'available', 'assigned')
+                await _apply_link_counter_deltas(session, deltas)
+            return link
 
 async def db_update_link_status(link_id: int, status: str, user_id: int | None = None):
     async with async_session() as session:
         async with session.begin():
+            current = (await session.execute(
+                select(Link.platform, Link.gender_requirement, Link.status, Link.campaign_tag)
+                .where(Link.id == link_id)
+                .with_for_update()
+            )).first()
+            if not current:
+                return
+
             stmt = update(Link).where(Link.id == link_id).values(
                 status=status,
                 assigned_to_user_id=user_id,
@@ -435,67 +1222,86 @@ async def db_update_link_status(link_id: int, status: str, user_id: int | None =
             )
             await session.execute(stmt)
 
-async def db_get_paginated_references(platform: str, page: int, limit: int, filter_type: str = "all", gender_filter: str = None, reward_filter: float = None, sort_by_tag: bool = False) -> Tuple[int, List[Link]]:
-    async with async_session() as session:
-        base_query = select(Link).where(Link.platform == platform)
-        count_query = select(func.count(Link.id)).where(Link.platform == platform)
-
-        if filter_type == 'fast':
-            base_query = base_query.where(Link.is_fast_track == True)
-            count_query = count_query.where(Link.is_fast_track == True)
-        elif filter_type == 'photo':
-            base_query = base_query.where(Link.requires_photo == True)
-            count_query = count_query.where(Link.requires_photo == True)
-        elif filter_type == 'regular':
-            base_query = base_query.where(and_(Link.is_fast_track == False, Link.requires_photo == False))
-            count_query = count_query.where(and_(Link.is_fast_track == False, Link.requires_photo == False))
-        
-        if gender_filter and gender_filter != 'all':
-            base_query = base_query.where(Link.gender_requirement == gender_filter)
-            count_query = count_query.where(Link.gender_requirement == gender_filter)
-
-        if reward_filter is not None:
-            base_query = base_query.where(Link.reward_amount == reward_filter)
-            count_query = count_query.where(Link.reward_amount == reward_filter)
-
-        total_count = await session.scalar(count_query)
-
-        order_by_clause = desc(Link.id)
-        if sort_by_tag:
-            # Сортируем так, чтобы ссылки с тегами были вверху, затем по ID
-            order_by_clause = desc(Link.campaign_tag.isnot(None)), desc(Link.id)
-
-        paginated_query = base_query.order_by(order_by_clause).offset((page - 1) * limit).limit(limit)
-        result = await session.execute(paginated_query)
-        links = result.scalars().all()
-
-        return total_count, links
+            deltas = {}
+            _add_link_transition(deltas, current.platform, current.gender_requirement, current.campaign_tag, current.status, status)
+            await _apply_link_counter_deltas(session, deltas)
+
+# Кэш количества ссылок по (платформа, фильтры) для списка ссылок.
+# Фильтры не зависят от статуса, поэтому кэш сбрасывается только при добавлении и удалении ссылок.
+_link_counts_cache = TTLCache(maxsize=1024, ttl=300)
+
+# Курсор постраничного просмотра: (есть ли тег кампании, id) последней/первой ссылки на странице
+LinkCursor = Tuple[bool, int]
+
+def _invalidate_link_counts():
+    _link_counts_cache.clear()
+
+def _link_list_conditions(platform: str, filter_type: str, gender_filter: Optional[str], reward_filter: Optional[float]) -> list:
+    conditions = [Link.platform == platform]
+    if filter_type == 'fast':
+        conditions.append(Link.is_fast_track == True)
+    elif filter_type == 'photo':
+        conditions.append(Link.requires_photo == True)
+    elif filter_type == 'regular':
+        conditions.extend([Link.is_fast_track == False, Link.requires_photo == False])
+
+    if gender_filter and gender_filter != 'all':
+        conditions.append(Link.gender_requirement == gender_filter)
+    if reward_filter is not None:
+        conditions.append(Link.reward_amount == reward_filter)
+    return conditions
+
+async def db_count_links(platform: str, filter_type: str = "all", gender_filter: str = None, reward_filter: float = None) -> int:
+    """Количество ссылок под фильтрами списка; результат кэшируется."""
+    cache_key = (platform, filter_type, gender_filter, reward_filter)
+    if cache_key in _link_counts_cache:
+        return _link_counts_cache[cache_key]
+    async with async_session() as session:
+        count_query = select(func.count(Link.id)).where(*_link_list_conditions(platform, filter_type, gender_filter, reward_filter))
+        total_count = await session.scalar(count_query) or 0
+    _link_counts_cache[cache_key] = total_count
+    return total_count
+
+async def db_get_links_page(platform: str, limit: int, filter_type: str = "all", gender_filter: str = None, reward_filter: float = None,
+                            sort_by_tag: bool = False, cursor: Optional[LinkCursor] = None, backward: bool = False) -> List[Link]:
+    """
+    Страница списка ссылок по курсору (keyset): без OFFSET, поэтому любая страница
+    читается по индексу за одно и то же время. cursor - ключ последней ссылки предыдущей
+    страницы (или первой ссылки следующей, если backward).
+    """
+    conditions = _link_list_conditions(platform, filter_type, gender_filter, reward_filter)
+    has_tag = Link.campaign_tag.isnot(None)
+    # Ссылки с тегами вверху, затем по убыванию ID
+    sort_key = tuple_(has_tag, Link.id) if sort_by_tag else Link.id
+    if cursor:
+        cursor_key = tuple_(literal(cursor[0]), literal(cursor[1])) if sort_by_tag else cursor[1]
+        conditions.append(sort_key > cursor_key if backward else sort_key < cursor_key)
+
+    order_by = [has_tag, Link.id] if sort_by_tag else [Link.id]
+    order_by = [column.asc() if backward else column.desc() for column in order_by]
+
+    async with async_session() as session:
+        query = select(Link).where(*conditions).order_by(*order_by).limit(limit)
+        links = (await session.execute(query)).scalars().all()
+    return list(reversed(links)) if backward else links
 
 async def db_get_link_stats(platform: str) -> Dict[str, int]:
     async with async_session() as session:
         query = (
-            select(
-                Link.status,
-                func.count(Link.id)
-            )
-            .where(Link.platform == platform)
-            .group_by(Link.status)
+            select(LinkCounter.status, func.sum(LinkCounter.count))
+            .where(LinkCounter.platform == platform)
+            .group_by(LinkCounter.status)
         )
         result = await session.execute(query)
-        stats = {status: count for status, count in result.all()}
-
-        total_query = select(func.count(Link.id)).where(Link.platform == platform)
-        total_count = await session.scalar(total_query)
-        stats['total'] = total_count
-
+        stats = {status: int(count) for status, count in result.all()}
+        stats['total'] = sum(stats.values())
         return stats
 
-async def db_get_links_count(platform: str) -> int:
-    """Возвращает общее количество ссылок для платформы."""
+async def db_has_links(platform: str) -> bool:
+    """Есть ли у платформы хотя бы одна ссылка."""
     async with async_session() as session:
-        query = select(func.count(Link.id)).where(Link.platform == platform)
-        result = await session.scalar(query)
-        return result or 0
+        query = select(select(Link.id).where(Link.platform == platform).exists())
+        return bool(await session.scalar(query))
 
 async def db_delete_reference(link_id: int):
     async with async_session() as session:
@@ -503,8 +1309,15 @@ async def db_delete_reference(link_id: int):
             unlink_stmt = update(Review).where(Review.link_id == link_id).values(link_id=None)
             await session.execute(unlink_stmt)
 
-            delete_stmt = delete(Link).where(Link.id == link_id)
-            await session.execute(delete_stmt)
+            delete_stmt = delete(Link).where(Link.id == link_id).returning(
+                Link.platform, Link.gender_requirement, Link.status, Link.campaign_tag
+            )
+            deleted = (await session.execute(delete_stmt)).first()
+            if deleted:
+                deltas = {}
+                _add_link_transition(deltas, deleted.platform, deleted.gender_requirement, deleted.campaign_tag, deleted.status, None)
+                await _apply_link_counter_deltas(session, deltas)
+    _invalidate_link_counts()
 
 async def db_get_link_by_id(link_id: int) -> Union[Link, None]:
     async with async_session() as session:
@@ -513,13 +1326,12 @@ async def db_get_link_by_id(link_id: int) -> Union[Link, None]:
 async def create_withdrawal_request(user_id: int, amount: float, recipient_info: str, comment: str = None) -> Union[int, None]:
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id)
-            if not user or user.balance < amount:
+            new_balance = await _apply_balance_delta(
+                session, user_id, -amount, "WITHDRAWAL", f"Запрос на вывод для {recipient_info}", comment=comment
+            )
+            if new_balance is None:
                 return None
 
-            user.balance -= amount
-            await log_operation(session, user_id, "WITHDRAWAL", -amount, f"Запрос на вывод для {recipient_info}", comment=comment)
-
             new_request = WithdrawalRequest(
                 user_id=user_id,
                 amount=amount,
@@ -550,10 +1362,7 @@ async def reject_withdrawal_request(request_id: int) -> Union[WithdrawalRequest,
             if not request or request.status != 'pending':
                 return None
 
-            user = await session.get(User, request.user_id)
-            if user:
-                user.balance += request.amount
-                await log_operation(session, user.id, "WITHDRAWAL", request.amount, "Отклонение запроса на вывод")
+            await _apply_balance_delta(session, request.user_id, request.amount, "WITHDRAWAL", "Отклонение запроса на вывод")
 
             request.status = 'rejected'
             return request
@@ -571,8 +1380,9 @@ async def reset_user_cooldowns(user_id: int) -> bool:
             user.gmail_cooldown_until = None
             user.blocked_until = None
             user.warnings = 0
-            logger.info(f"All cooldowns and warnings have been reset for user {user_id}.")
-            return True
+    await cooldown_index.clear(user_id)
+    logger.info(f"All cooldowns and warnings have been reset for user {user_id}.")
+    return True
 
 async def get_top_10_users() -> List[Tuple[int, str, float, int]]:
     async with async_session() as session:
@@ -612,34 +1422,19 @@ async def create_promo_code(code: str, condition: str, reward: float, total_uses
             session.add(new_promo)
             await session.flush()
             await session.refresh(new_promo)
-            return new_promo
+    await promo_cache.forget(code)
+    return new_promo
 
-async def get_promo_by_code(code: str, for_update: bool = False) -> Union[PromoCode, None]:
+async def get_promo_by_code(code: str) -> Union[PromoCode, None]:
     async with async_session() as session:
-        async with session.begin():
-            stmt = select(PromoCode).where(func.upper(PromoCode.code) == func.upper(code))
-            if for_update:
-                stmt = stmt.with_for_update()
-
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+        stmt = select(PromoCode).where(func.upper(PromoCode.code) == func.upper(code))
+        result = await session.execute(stmt)
+        return result.scalar_one_or_none()
 
 async def get_promo_by_id(promo_id: int) -> Union[PromoCode, None]:
     async with async_session() as session:
         return await session.get(PromoCode, promo_id)
 
-async def get_user_promo_activation(user_id: int, promo_code_id: int) -> Union[PromoActivation, None]:
-    async with async_session() as session:
-        result = await session.execute(
-            select(PromoActivation).where(
-                and_(
-                    PromoActivation.user_id == user_id,
-                    PromoActivation.promo_code_id == promo_code_id
-                )
-            )
-        )
-        return result.scalar_one_or_none()
-
 async def find_pending_promo_activation(user_id: int, condition: str = '%') -> Union[PromoActivation, None]:
     async with async_session() as session:
         base_query = select(PromoActivation).join(PromoCode).where(
@@ -659,26 +1454,59 @@ async def find_pending_promo_activation(user_id: int, condition: str = '%') -> U
         )
         return result.scalar_one_or_none()
 
-async def create_promo_activation(user_id: int, promo_id: int, status: str) -> PromoActivation:
+async def claim_promo_code(user_id: int, code: str) -> Tuple[str, Optional[PromoCode]]:
+    """
+    Активирует промокод в одной транзакции. Активации одного пользователя идут по очереди
+    (блокировка строки пользователя), а лимит списывается условным UPDATE ... RETURNING,
+    так что две параллельные активации не превысят total_uses.
+    Возвращает (результат, промокод): результат - 'activated', 'pending', 'not_found',
+    'exhausted', 'already_used' или 'pending_exists'.
+    """
     async with async_session() as session:
         async with session.begin():
-            new_activation = PromoActivation(
-                user_id=user_id,
-                promo_code_id=promo_id,
-                status=status
+            await session.execute(select(User.id).where(User.id == user_id).with_for_update())
+
+            pending = await session.execute(
+                select(PromoActivation.id)
+                .where(PromoActivation.user_id == user_id, PromoActivation.status == 'pending_condition')
+                .limit(1)
+            )
+            if pending.first():
+                return 'pending_exists', None
+
+            promo_result = await session.execute(select(PromoCode).where(func.upper(PromoCode.code) == func.upper(code)))
+            promo = promo_result.scalar_one_or_none()
+            if not promo:
+                return 'not_found', None
+
+            used = await session.execute(
+                select(PromoActivation.id)
+                .where(PromoActivation.user_id == user_id, PromoActivation.promo_code_id == promo.id)
+                .limit(1)
+            )
+            if used.first():
+                return 'already_used', promo
+
+            # Промокод с условием расходует активацию только при выполнении условия
+            if promo.condition != 'no_condition':
+                if promo.current_uses >= promo.total_uses:
+                    return 'exhausted', promo
+                session.add(PromoActivation(user_id=user_id, promo_code_id=promo.id, status='pending_condition'))
+                return 'pending', promo
+
+            claimed = await session.execute(
+                update(PromoCode)
+                .where(PromoCode.id == promo.id, PromoCode.current_uses < PromoCode.total_uses)
+                .values(current_uses=PromoCode.current_uses + 1)
+                .returning(PromoCode.id)
+                .execution_options(synchronize_session=False)
             )
-            session.add(new_activation)
-            if status == 'completed':
-                promo_to_update = await session.get(PromoCode, promo_id, with_for_update=True)
-                if promo_to_update:
-                    promo_to_update.current_uses += 1
-                else:
-                    logger.error(f"Could not increment promo uses for id {promo_id} as it was not found.")
-                    raise IntegrityError("Promo code not found during activation.", params=None, orig=None)
+            if claimed.scalar_one_or_none() is None:
+                return 'exhausted', promo
 
-            await session.flush()
-            await session.refresh(new_activation)
-            return new_activation
+            session.add(PromoActivation(user_id=user_id, promo_code_id=promo.id, status='completed'))
+            await _apply_balance_delta(session, user_id, promo.reward, "PROMO_ACTIVATED", f"Промокод {promo.code}")
+            return 'activated', promo
 
 
 async def delete_promo_activation(activation_id: int) -> bool:
@@ -690,21 +1518,41 @@ async def delete_promo_activation(activation_id: int) -> bool:
             await session.delete(activation)
             return True
 
-async def complete_promo_activation(activation_id: int) -> bool:
+async def complete_promo_activation(activation_id: int) -> Optional[PromoCode]:
+    """
+    Завершает активацию с выполненным условием: списывает использование условным UPDATE
+    и начисляет награду в той же транзакции. Возвращает промокод или None, если активация
+    уже завершена или лимит исчерпан.
+    """
     async with async_session() as session:
         async with session.begin():
-            activation = await session.get(PromoActivation, activation_id, options=[selectinload(PromoActivation.promo_code)])
-            if not activation or activation.status != 'pending_condition':
-                return False
-
-            promo_to_update = await session.get(PromoCode, activation.promo_code_id, with_for_update=True)
-            if promo_to_update.current_uses >= promo_to_update.total_uses:
-                logger.warning(f"Promo '{promo_to_update.code}' has no uses left, but user {activation.user_id} tried to complete it.")
-                return False
+            completed = await session.execute(
+                update(PromoActivation)
+                .where(PromoActivation.id == activation_id, PromoActivation.status == 'pending_condition')
+                .values(status='completed')
+                .returning(PromoActivation.user_id, PromoActivation.promo_code_id)
+                .execution_options(synchronize_session=False)
+            )
+            row = completed.first()
+            if not row:
+                return None
+            user_id, promo_code_id = row
+
+            claimed = await session.execute(
+                update(PromoCode)
+                .where(PromoCode.id == promo_code_id, PromoCode.current_uses < PromoCode.total_uses)
+                .values(current_uses=PromoCode.current_uses + 1)
+                .returning(PromoCode.code, PromoCode.reward)
+                .execution_options(synchronize_session=False)
+            )
+            promo_row = claimed.first()
+            if not promo_row:
+                logger.warning(f"Promo {promo_code_id} has no uses left, but user {user_id} tried to complete it.")
+                await session.rollback()
+                return None
 
-            activation.status = 'completed'
-            promo_to_update.current_uses += 1
-            return True
+            await _apply_balance_delta(session, user_id, promo_row.reward, "PROMO_ACTIVATED", f"Промокод {promo_row.code}")
+            return await session.get(PromoCode, promo_code_id)
 
 # --- Функции для системы поддержки ---
 async def create_support_ticket(user_id: int, username: str, question: str, admin_message_ids: dict, photo_file_id: str = None) -> SupportTicket:
@@ -801,12 +1649,10 @@ async def cancel_hold(review_id: int) -> Optional[Review]:
             if not review or review.status != 'awaiting_confirmation':
                 return None
 
-            user = review.user
-            if user and review.amount:
-                if user.hold_balance >= review.amount:
-                    user.hold_balance -= review.amount
-                else:
-                    user.hold_balance = 0
+            if review.amount:
+                released = await _apply_hold_delta(session, review.user_id, -review.amount, partial=True)
+                if released:
+                    await _post_ledger(session, [(ledger_account("hold", review.user_id), LEDGER_HOUSE, released)])
 
             review.status = 'rejected'
             return review
@@ -818,12 +1664,10 @@ async def admin_reject_final_confirmation(review_id: int) -> Optional[Review]:
             if not review or review.status != 'awaiting_confirmation':
                 return None
 
-            user = await session.get(User, review.user_id)
-            if user and review.amount:
-                if user.hold_balance >= review.amount:
-                    user.hold_balance -= review.amount
-                else:
-                    user.hold_balance = 0
+            if review.amount:
+                released = await _apply_hold_delta(session, review.user_id, -review.amount, partial=True)
+                if released:
+                    await _post_ledger(session, [(ledger_account("hold", review.user_id), LEDGER_HOUSE, released)])
 
             review.status = 'rejected'
             return review
@@ -848,6 +1692,10 @@ async def db_find_and_expire_old_assigned_links(hours_threshold: int = 24) -> Li
             result_objects = await session.execute(select_objects_stmt)
             expired_links = result_objects.scalars().all()
 
+            deltas = {}
+            for link in expired_links:
+                _add_link_transition(deltas, link.platform, link.gender_requirement, link.campaign_tag, link.status, 'expired')
+
             update_stmt = update(Link).where(
                 Link.id.in_(link_ids_to_expire)
             ).values(
@@ -856,6 +1704,7 @@ async def db_find_and_expire_old_assigned_links(hours_threshold: int = 24) -> Li
                 assigned_at=None
             )
             await session.execute(update_stmt)
+            await _apply_link_counter_deltas(session, deltas)
 
             return expired_links
 
@@ -863,9 +1712,15 @@ async def db_find_and_expire_old_assigned_links(hours_threshold: int = 24) -> Li
 async def reset_all_expired_links() -> int:
     async with async_session() as session:
         async with session.begin():
-            stmt = update(Link).where(Link.status == 'expired').values(status='available')
-            result = await session.execute(stmt)
-            return result.rowcount
+            stmt = update(Link).where(Link.status == 'expired').values(status='available').returning(
+                Link.platform, Link.gender_requirement, Link.campaign_tag
+            )
+            reset_links = (await session.execute(stmt)).all()
+            deltas = {}
+            for link in reset_links:
+                _add_link_transition(deltas, link.platform, link.gender_requirement, link.campaign_tag, 'expired', 'available')
+            await _apply_link_counter_deltas(session, deltas)
+            return len(reset_links)
 
 async def ban_user(user_id: int, reason: str) -> bool:
     async with async_session() as session:
@@ -1045,10 +1900,11 @@ async def get_banned_users_count() -> int:
         return result.scalar_one()
 
 async def get_all_promo_codes(page: int = 1, limit: int = 6) -> List[PromoCode]:
+    """Активные промокоды, созданные вручную. Сгенерированные пачки смотрятся через get_promo_batch_stats."""
     async with async_session() as session:
         query = (
             select(PromoCode)
-            .where(PromoCode.current_uses < PromoCode.total_uses)
+            .where(PromoCode.current_uses < PromoCode.total_uses, PromoCode.batch_tag.is_(None))
             .order_by(desc(PromoCode.created_at))
             .offset((page - 1) * limit)
             .limit(limit)
@@ -1058,10 +1914,54 @@ async def get_all_promo_codes(page: int = 1, limit: int = 6) -> List[PromoCode]:
 
 async def get_promo_codes_count() -> int:
     async with async_session() as session:
-        query = select(func.count(PromoCode.id)).where(PromoCode.current_uses < PromoCode.total_uses)
+        query = select(func.count(PromoCode.id)).where(PromoCode.current_uses < PromoCode.total_uses, PromoCode.batch_tag.is_(None))
         result = await session.execute(query)
         return result.scalar_one()
 
+async def bulk_insert_promo_codes(rows: List[Dict[str, Any]]) -> List[str]:
+    """Вставляет промокоды одним многострочным INSERT ... ON CONFLICT DO NOTHING. Возвращает вставленные коды."""
+    if not rows:
+        return []
+    async with async_session() as session:
+        async with session.begin():
+            stmt = pg_insert(PromoCode).values(rows).on_conflict_do_nothing().returning(PromoCode.code)
+            result = await session.execute(stmt)
+            return list(result.scalars().all())
+
+async def promo_batch_exists(batch_tag: str) -> bool:
+    async with async_session() as session:
+        query = select(PromoCode.id).where(PromoCode.batch_tag == batch_tag).limit(1)
+        return (await session.scalar(query)) is not None
+
+async def get_promo_batch_stats() -> List[Tuple[str, int, int, float, datetime.datetime]]:
+    """Статистика по пачкам одним сгруппированным запросом: (метка, кодов, активировано, выплачено, создана)."""
+    async with async_session() as session:
+        query = (
+            select(
+                PromoCode.batch_tag,
+                func.count(PromoCode.id),
+                func.coalesce(func.sum(PromoCode.current_uses), 0),
+                func.coalesce(func.sum(PromoCode.reward * PromoCode.current_uses), 0),
+                func.min(PromoCode.created_at),
+            )
+            .where(PromoCode.batch_tag.isnot(None))
+            .group_by(PromoCode.batch_tag)
+            .order_by(desc(func.min(PromoCode.created_at)))
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+async def get_promo_batch_codes(batch_tag: str) -> List[Tuple[str, float, int, int]]:
+    """Коды пачки для выгрузки: (код, награда, использовано, всего)."""
+    async with async_session() as session:
+        query = (
+            select(PromoCode.code, PromoCode.reward, PromoCode.current_uses, PromoCode.total_uses)
+            .where(PromoCode.batch_tag == batch_tag)
+            .order_by(PromoCode.id)
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
+
 async def delete_promo_code(promo_id: int) -> bool:
     async with async_session() as session:
         async with session.begin():
@@ -1164,9 +2064,10 @@ async def get_active_intern_task(intern_id: int) -> Optional[InternshipTask]:
         return result.scalar_one_or_none()
 
 async def find_available_intern(platform_family: str) -> Optional[User]:
+    """Поиск свободного стажера сканированием таблиц. Используется, только если Redis недоступен."""
     async with async_session() as session:
         candidate_ids_query = select(InternshipApplication.user_id).where(
-            InternshipApplication.platforms.like(f"%{platform_family}%")
+            InternshipApplication.platforms.ilike(f"%{platform_family}%")
         )
         candidate_ids_result = await session.execute(candidate_ids_query)
         candidate_ids = candidate_ids_result.scalars().all()
@@ -1187,6 +2088,69 @@ async def find_available_intern(platform_family: str) -> Optional[User]:
         result = await session.execute(query)
         return result.scalar_one_or_none()
 
+def _to_timestamp(value: Optional[datetime.datetime]) -> Optional[float]:
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp() if value else None
+
+def _intern_availability_query():
+    """(id, платформы из анкеты, время последней задачи) для стажеров."""
+    return (
+        select(User.id, InternshipApplication.platforms, func.max(InternshipTask.last_task_at))
+        .join(InternshipApplication, InternshipApplication.user_id == User.id)
+        .outerjoin(InternshipTask, InternshipTask.intern_id == User.id)
+        .group_by(User.id, InternshipApplication.platforms)
+    )
+
+async def sync_intern_availability(intern_id: int):
+    """Приводит запись стажера в Redis-индексе свободных стажеров в соответствие с БД."""
+    async with async_session() as session:
+        query = _intern_availability_query().where(
+            User.id == intern_id, User.is_intern == True, User.is_busy_intern == False
+        )
+        row = (await session.execute(query)).first()
+    if row:
+        await intern_index.mark_idle(intern_id, intern_index.families_from_platforms(row[1]), _to_timestamp(row[2]))
+    else:
+        await intern_index.remove(intern_id)
+
+async def rebuild_intern_index():
+    """Заполняет Redis-индекс свободных стажеров с нуля. Вызывается при старте и после потери данных в Redis."""
+    async with async_session() as session:
+        query = _intern_availability_query().where(User.is_intern == True, User.is_busy_intern == False)
+        rows = (await session.execute(query)).all()
+    await intern_index.rebuild((intern_id, platforms, _to_timestamp(last_task_at)) for intern_id, platforms, last_task_at in rows)
+
+async def rebuild_cooldown_index():
+    """Заполняет Redis-индекс кулдаунов активными кулдаунами из БД. Вызывается при старте и после сбоев записи."""
+    now = datetime.datetime.utcnow()
+    columns = [getattr(User, f"{platform}_cooldown_until") for platform in cooldown_index.COOLDOWN_PLATFORMS]
+    async with async_session() as session:
+        query = select(User.id, *columns).where(or_(*[cooldown_column > now for cooldown_column in columns]))
+        rows = (await session.execute(query)).all()
+    await cooldown_index.rebuild(
+        (row[0], platform, end_time)
+        for row in rows
+        for platform, end_time in zip(cooldown_index.COOLDOWN_PLATFORMS, row[1:])
+        if end_time
+    )
+
+async def claim_available_intern(platform_family: str) -> Optional[int]:
+    """
+    Находит свободного стажера семейства платформ и помечает его занятым.
+    Поиск идет по Redis-индексу; при недоступности Redis - по БД.
+    """
+    try:
+        if not await intern_index.is_ready():
+            await rebuild_intern_index()
+        intern_id = await intern_index.claim(platform_family)
+    except RedisError as e:
+        logger.warning(f"Intern index unavailable, falling back to DB scan: {e}")
+        intern = await find_available_intern(platform_family)
+        intern_id = intern.id if intern else None
+
+    if intern_id:
+        await set_intern_busy_status(intern_id, is_busy=True)
+    return intern_id
+
 async def set_intern_busy_status(intern_id: int, is_busy: bool):
     async with async_session() as session:
         async with session.begin():
@@ -1200,6 +2164,11 @@ async def set_intern_busy_status(intern_id: int, is_busy: bool):
                 ).values(last_task_at=datetime.datetime.utcnow())
                 await session.execute(task_stmt)
 
+    if is_busy:
+        await intern_index.remove(intern_id)
+    else:
+        await sync_intern_availability(intern_id)
+
 async def create_intern_task(intern_id: int, platform: str, task_type: str, goal_count: int, salary: float) -> Optional[InternshipTask]:
     async with async_session() as session:
         async with session.begin():
@@ -1218,7 +2187,9 @@ async def create_intern_task(intern_id: int, platform: str, task_type: str, goal
             session.add(new_task)
             await session.flush()
             await session.refresh(new_task)
-            return new_task
+
+    await sync_intern_availability(intern_id)
+    return new_task
 
 async def fire_intern(intern_id: int, reason: str):
     async with async_session() as session:
@@ -1234,6 +2205,8 @@ async def fire_intern(intern_id: int, reason: str):
             if active_task:
                 active_task.status = 'fired'
 
+    await intern_index.remove(intern_id)
+
 async def get_intern_mistakes(intern_id: int, page: int = 1, limit: int = 5) -> Tuple[List[InternshipMistake], int]:
     async with async_session() as session:
         query = select(InternshipMistake).where(InternshipMistake.intern_id == intern_id).order_by(desc(InternshipMistake.created_at))
@@ -1268,17 +2241,23 @@ async def complete_internship(task: InternshipTask) -> float:
             final_salary = task.estimated_salary - penalty
 
             if final_salary > 0:
-                intern.balance += final_salary
-                await log_operation(session, intern.id, "TOP_REWARD", final_salary, "Зарплата за стажировку")
+                await _apply_balance_delta(session, intern.id, final_salary, "TOP_REWARD", "Зарплата за стажировку")
 
-            return final_salary
+    await intern_index.remove(task.intern_id)
+    return final_salary
 
 async def process_intern_decision(review_id: int, is_approved: bool, reason: Optional[str] = None):
+    intern_id = await _apply_intern_decision(review_id, is_approved, reason)
+    if intern_id:
+        await sync_intern_availability(intern_id)
+
+async def _apply_intern_decision(review_id: int, is_approved: bool, reason: Optional[str]) -> Optional[int]:
+    """Засчитывает решение стажера. Возвращает ID стажера, если он освободился."""
     async with async_session() as session:
         async with session.begin():
             review = await session.get(Review, review_id, options=[selectinload(Review.user)])
             if not review or not review.user or not review.user.is_busy_intern:
-                return
+                return None
 
             intern = review.user
             intern.is_busy_intern = False
@@ -1290,7 +2269,7 @@ async def process_intern_decision(review_id: int, is_approved: bool, reason: Opt
                 )
             )
             task = task_result.scalar_one_or_none()
-            if not task: return
+            if not task: return intern.id
 
             mentor_decision_is_correct = is_approved
 
@@ -1311,6 +2290,8 @@ async def process_intern_decision(review_id: int, is_approved: bool, reason: Opt
             if task.current_progress >= task.goal_count:
                 await complete_internship(task)
 
+            return intern.id
+
 # --- Функции для управления администраторами ---
 async def get_administrator(user_id: int) -> Optional[Administrator]:
     async with async_session() as session:
@@ -1362,12 +2343,23 @@ async def delete_administrator(user_id: int, self_delete_check: int = 0) -> bool
             return True
 
 async def reassign_tasks_from_deleted_admin(deleted_admin_id: int, default_admin_id: int):
-    async with async_session() as session:
-        async with session.begin():
-            stmt = update(SystemSetting).where(
-                SystemSetting.value == str(deleted_admin_id)
-            ).values(value=str(default_admin_id))
-            await session.execute(stmt)
+    """
+    Убирает удаленного админа из наборов ролей ("id[:вес],id[:вес]").
+    Если он был единственным ответственным, роль переходит к default_admin_id.
+    """
+    role_value_pattern = r'^[0-9]+(:[0-9]+)?(,[0-9]+(:[0-9]+)?)*$'
+    async with async_session() as session:
+        async with session.begin():
+            query = select(SystemSetting).where(
+                SystemSetting.value.regexp_match(role_value_pattern),
+                SystemSetting.value.contains(str(deleted_admin_id))
+            ).with_for_update()
+            settings = (await session.execute(query)).scalars().all()
+            for setting in settings:
+                parts = [part for part in setting.value.split(",") if part.split(":")[0] != str(deleted_admin_id)]
+                if len(parts) == len(setting.value.split(",")):
+                    continue
+                setting.value = ",".join(parts) or str(default_admin_id)
             logger.info(f"Reassigned all roles from deleted admin {deleted_admin_id} to default admin {default_admin_id}.")
 
 
@@ -1491,21 +2483,43 @@ async def get_all_campaign_tags() -> List[str]:
 async def get_stats_for_campaign(tag: str) -> Dict[str, int]:
     async with async_session() as session:
         query = (
-            select(
-                Link.status,
-                func.count(Link.id)
-            )
-            .where(Link.campaign_tag == tag)
-            .group_by(Link.status)
+            select(LinkCounter.status, func.sum(LinkCounter.count))
+            .where(LinkCounter.campaign_tag == tag)
+            .group_by(LinkCounter.status)
         )
         result = await session.execute(query)
-        stats = {status: count for status, count in result.all()}
-
-        total_query = select(func.count(Link.id)).where(Link.campaign_tag == tag)
-        total_count = await session.scalar(total_query)
-        stats['total'] = total_count
+        stats = {status: int(count) for status, count in result.all()}
+        stats['total'] = sum(stats.values())
         return stats
 
+async def reconcile_link_counters() -> int:
+    """
+    Пересчитывает счетчики пула ссылок по таблице links и исправляет расхождения.
+    Таблица счетчиков блокируется на время пересчета, поэтому параллельные переходы
+    статусов применят свои изменения уже поверх пересчитанных значений.
+    Возвращает суммарную величину исправленного расхождения.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(sa_text("LOCK TABLE link_counters IN EXCLUSIVE MODE"))
+            actual_query = (
+                select(Link.platform, Link.gender_requirement, Link.status, Link.campaign_tag, func.count(Link.id))
+                .where(Link.status.isnot(None))
+                .group_by(Link.platform, Link.gender_requirement, Link.status, Link.campaign_tag)
+            )
+            actual: Dict[LinkCounterKey, int] = {}
+            for platform, gender, status, campaign_tag, count in (await session.execute(actual_query)).all():
+                key = _link_counter_key(platform, gender, status, campaign_tag)
+                actual[key] = actual.get(key, 0) + count
+
+            stored_rows = (await session.execute(select(LinkCounter))).scalars().all()
+            stored = {(c.platform, c.gender_requirement, c.status, c.campaign_tag): c.count for c in stored_rows}
+
+            deltas = {key: actual.get(key, 0) - stored.get(key, 0) for key in actual.keys() | stored.keys()}
+            await _apply_link_counter_deltas(session, deltas)
+            await session.execute(delete(LinkCounter).where(LinkCounter.count == 0))
+            return sum(abs(delta) for delta in deltas.values())
+
 # --- Подписки на задания (Модуль 2.1) ---
 async def add_task_subscription(user_id: int, platform: str, gender: str) -> bool:
     async with async_session() as session:
@@ -1517,43 +2531,48 @@ async def add_task_subscription(user_id: int, platform: str, gender: str) -> boo
             except IntegrityError: # Сработает, если подписка уже существует
                 return False
 
-async def find_subscribers(platform: str, gender: str) -> List[TaskSubscription]:
-    async with async_session() as session:
-        query = select(TaskSubscription).where(
-            TaskSubscription.platform == platform,
-            TaskSubscription.gender == gender
-        )
-        result = await session.execute(query)
-        return result.scalars().all()
-
-async def delete_subscriptions(user_ids: List[int], platform: str, gender: str):
+async def claim_subscribers_chunk(platform: str, gender: str, limit: int) -> List[int]:
+    """
+    Атомарно удаляет порцию подписок и возвращает ID подписчиков.
+    Параллельные рассылки получают разные порции благодаря SKIP LOCKED.
+    """
     async with async_session() as session:
         async with session.begin():
-            stmt = delete(TaskSubscription).where(
-                TaskSubscription.user_id.in_(user_ids),
-                TaskSubscription.platform == platform,
-                TaskSubscription.gender == gender
+            chunk_ids = (
+                select(TaskSubscription.id)
+                .where(TaskSubscription.platform == platform, TaskSubscription.gender == gender)
+                .order_by(TaskSubscription.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
             )
-            await session.execute(stmt)
+            stmt = (
+                delete(TaskSubscription)
+                .where(TaskSubscription.id.in_(chunk_ids.scalar_subquery()))
+                .returning(TaskSubscription.user_id)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(stmt)
+            return result.scalars().all()
 
 # --- Залог (Модуль 3.2) ---
 async def deduct_stake(user_id: int, amount: float) -> bool:
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id, with_for_update=True)
-            if not user or user.balance < amount:
-                return False
-            user.balance -= amount
-            user.hold_balance += amount
-            return True
+            new_balance = await _apply_balance_delta(
+                session, user_id, -amount, "STAKE_HOLD", "Залог за задание",
+                extra_values={"hold_balance": User.hold_balance + amount},
+                counter_account=ledger_account("hold", user_id)
+            )
+            return new_balance is not None
 
 async def return_stake(user_id: int, amount: float):
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id, with_for_update=True)
-            if user and user.hold_balance >= amount:
-                user.hold_balance -= amount
-                user.balance += amount
+            if await _apply_hold_delta(session, user_id, -amount) is not None:
+                await _apply_balance_delta(
+                    session, user_id, amount, "STAKE_RETURN", "Возврат залога",
+                    counter_account=ledger_account("hold", user_id)
+                )
 
 async def fail_stake(review_id: int):
     async with async_session() as session:
@@ -1562,10 +2581,9 @@ async def fail_stake(review_id: int):
             if not review or not review.stake_amount or review.stake_amount <= 0:
                 return
             
-            user = await session.get(User, review.user_id, with_for_update=True)
-            if user and user.hold_balance >= review.stake_amount:
-                user.hold_balance -= review.stake_amount
-                logger.info(f"Stake amount {review.stake_amount} forfeited from user {user.id} for failed review {review.id}.")
+            if await _apply_hold_delta(session, review.user_id, -review.stake_amount) is not None:
+                await _post_ledger(session, [(LEDGER_HOUSE, ledger_account("hold", review.user_id), review.stake_amount)])
+                logger.info(f"Stake amount {review.stake_amount} forfeited from user {review.user_id} for failed review {review.id}.")
 
 # --- Первое задание (Модуль 3.3) ---
 async def set_first_task_completed(user_id: int):
@@ -1631,13 +2649,38 @@ async def get_extended_admin_stats() -> Dict[str, Any]:
         return stats
 
 # --- Орёл и Решка (Модуль 4.1) ---
-async def update_user_balance_and_streak(user_id: int, balance_change: float, new_streak: int):
+async def get_balance_and_streak(user_id: int) -> Optional[Tuple[float, int]]:
+    """Баланс и серия побед одним легким запросом, без загрузки пользователя со связями."""
+    async with async_session() as session:
+        row = (await session.execute(select(User.balance, User.win_streak).where(User.id == user_id))).one_or_none()
+        return (row.balance, row.win_streak) if row else None
+
+async def settle_coinflip(user_id: int, bet: float, is_win: bool) -> Optional[Tuple[float, int]]:
+    """
+    Расчет ставки одним условным UPDATE: проверка баланса, выигрыш или проигрыш и серия побед
+    меняются вместе. Параллельные ставки одного пользователя выстраиваются в очередь на блокировке
+    его строки, и каждая видит баланс после предыдущей. Ставка округляется до сотых. Возвращает
+    (новый баланс, серия побед) или None, если ставка меньше COINFLIP_MIN_BET или ее нечем покрыть.
+    """
+    stake = Stars(bet)
+    if stake < COINFLIP_MIN_BET:
+        return None
+    delta = stake if is_win else -stake
+    query = (
+        update(User)
+        .where(User.id == user_id, User.balance >= stake)
+        .values(balance=User.balance + delta, win_streak=User.win_streak + 1 if is_win else 0)
+        .returning(User.balance, User.win_streak)
+        .execution_options(synchronize_session=False)
+    )
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id, with_for_update=True)
-            if user:
-                user.balance += balance_change
-                user.win_streak = new_streak
+            row = (await session.execute(query)).one_or_none()
+            if row is None:
+                return None
+            operation_id = await log_operation(session, user_id, "COINFLIP", float(delta), "Выигрыш" if is_win else "Проигрыш")
+            await _post_ledger(session, [(ledger_account("user", user_id), LEDGER_HOUSE, delta)], operation_id)
+            return row.balance, row.win_streak
 
 # --- Депозиты (Модуль 4.2) ---
 async def create_user_deposit(user_id: int, plan_id: str, amount: float):
@@ -1646,11 +2689,10 @@ async def create_user_deposit(user_id: int, plan_id: str, amount: float):
     
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id, with_for_update=True)
-            if not user or user.balance < amount:
+            new_balance = await _apply_balance_delta(session, user_id, -amount, 'DEPOSIT_OPEN', f"Открытие депозита '{plan['name']}'")
+            if new_balance is None:
                 return
-            
-            user.balance -= amount
+
             now = datetime.datetime.utcnow()
             new_deposit = UserDeposit(
                 user_id=user_id,
@@ -1662,7 +2704,6 @@ async def create_user_deposit(user_id: int, plan_id: str, amount: float):
                 last_accrual_at=now
             )
             session.add(new_deposit)
-            await log_operation(session, user_id, 'DEPOSIT_OPEN', -amount, f"Открытие депозита '{plan['name']}'")
 
 async def get_active_user_deposits(user_id: int) -> List[UserDeposit]:
     async with async_session() as session:
@@ -1698,11 +2739,8 @@ async def close_deposit(deposit_id: int, final_balance: float):
             deposit = await session.get(UserDeposit, deposit_id)
             if not deposit: return
             
-            user = await session.get(User, deposit.user_id)
-            if user:
-                user.balance += final_balance
-                plan_name = DEPOSIT_PLANS.get(deposit.deposit_plan_id, {}).get('name', 'N/A')
-                await log_operation(session, user.id, 'DEPOSIT_CLOSE', final_balance, f"Закрытие депозита '{plan_name}'")
+            plan_name = DEPOSIT_PLANS.get(deposit.deposit_plan_id, {}).get('name', 'N/A')
+            await _apply_balance_delta(session, deposit.user_id, final_balance, 'DEPOSIT_CLOSE', f"Закрытие депозита '{plan_name}'")
 
             await session.delete(deposit)
 
@@ -1724,6 +2762,12 @@ async def get_ai_scenarios_by_category(category: str) -> List[AIScenario]:
         result = await session.execute(query)
         return result.scalars().all()
 
+async def get_random_ai_scenarios(limit: int) -> List[AIScenario]:
+    async with async_session() as session:
+        query = select(AIScenario).order_by(func.random()).limit(limit)
+        result = await session.execute(query)
+        return result.scalars().all()
+
 async def get_ai_scenario_by_id(scenario_id: int) -> Optional[AIScenario]:
     async with async_session() as session:
         return await session.get(AIScenario, scenario_id)
@@ -1755,30 +2799,302 @@ async def get_top_donators(limit: int = 5) -> List[Tuple[int, float]]:
         result = await session.execute(query)
         return result.all()
 
-async def process_donation(user_id: int, amount: float):
+async def process_donation(user_id: int, amount: float) -> bool:
+    """Списывает пожертвование и пополняет фонд в одной транзакции. False - если средств недостаточно."""
     async with async_session() as session:
         async with session.begin():
-            user = await session.get(User, user_id)
-            user.balance -= amount
+            new_balance = await _apply_balance_delta(
+                session, user_id, -amount, 'DONATION', "Пожертвование в Фонд Помощи", counter_account=LEDGER_FUND
+            )
+            if new_balance is None:
+                return False
             session.add(Donation(user_id=user_id, amount=amount))
-            await log_operation(session, user_id, 'DONATION', -amount, "Пожертвование в Фонд Помощи")
-
-            fund_balance_str = await get_system_setting("donation_fund_balance")
-            fund_balance = float(fund_balance_str) if fund_balance_str else 0.0
-            await set_system_setting("donation_fund_balance", str(fund_balance + amount))
+            await _adjust_setting_amount(session, "donation_fund_balance", amount)
+            return True
 
 async def process_help_request(user_id: int, amount: float) -> bool:
     async with async_session() as session:
         async with session.begin():
-            fund_balance_str = await get_system_setting("donation_fund_balance")
-            fund_balance = float(fund_balance_str) if fund_balance_str else 0.0
-            
-            if fund_balance < amount:
+            # Сначала списание из фонда: условие в UPDATE не даст двум запросам потратить одни и те же звезды
+            fund_balance = await _adjust_setting_amount(session, "donation_fund_balance", -amount)
+            if fund_balance is None:
                 return False
-            
-            user = await session.get(User, user_id)
-            user.balance += amount
-            user.last_help_request_at = datetime.datetime.utcnow()
-            await log_operation(session, user.id, 'HELP_RECEIVED', amount, "Помощь из Фонда")
-            await set_system_setting("donation_fund_balance", str(fund_balance - amount))
-            return True
\ No newline at end of file
+
+            new_balance = await _apply_balance_delta(
+                session, user_id, amount, 'HELP_RECEIVED', "Помощь из Фонда",
+                extra_values={"last_help_request_at": datetime.datetime.utcnow()}, counter_account=LEDGER_FUND
+            )
+            if new_balance is None:
+                await session.rollback()
+                return False
+            return True
+
+async def get_usernames_by_ids(user_ids: List[int]) -> Dict[int, Optional[str]]:
+    """Возвращает {user_id: username} одним запросом."""
+    if not user_ids:
+        return {}
+    async with async_session() as session:
+        result = await session.execute(select(User.id, User.username).where(User.id.in_(user_ids)))
+        return {user_id: username for user_id, username in result.all()}
+
+# --- Индекс перцептивных хэшей скриншотов ---
+async def add_screenshot_hash(review_id: int, user_id: int, kind: str, file_id: str, dhash: int) -> Tuple[bool, Optional[int]]:
+    """
+    Сохраняет хэш скриншота отзыва. Замененный или заново загруженный скриншот того же вида
+    перезаписывает прежний хэш, чтобы дубликаты искались по актуальной картинке.
+    Возвращает (изменился ли хэш, прежний хэш или None).
+    """
+    async with async_session() as session:
+        async with session.begin():
+            previous = await session.scalar(
+                select(ScreenshotHash.dhash)
+                .where(ScreenshotHash.review_id == review_id, ScreenshotHash.kind == kind)
+                .with_for_update()
+            )
+            stmt = pg_insert(ScreenshotHash).values(
+                review_id=review_id, user_id=user_id, kind=kind, file_id=file_id, dhash=dhash
+            )
+            await session.execute(stmt.on_conflict_do_update(
+                index_elements=[ScreenshotHash.review_id, ScreenshotHash.kind],
+                set_={"user_id": user_id, "file_id": file_id, "dhash": dhash, "created_at": datetime.datetime.utcnow()}
+            ))
+            return previous != dhash, previous
+
+async def get_all_screenshot_hashes() -> List[Tuple[int, int, int]]:
+    """Возвращает (dhash, review_id, user_id) для построения индекса в памяти."""
+    async with async_session() as session:
+        result = await session.stream(select(ScreenshotHash.dhash, ScreenshotHash.review_id, ScreenshotHash.user_id))
+        return [tuple(row) async for row in result]
+
+async def get_reviews_without_screenshot_hash(kind: str, after_id: int = 0, limit: int = 100) -> List[Tuple[int, int, str]]:
+    """Находит отзывы со скриншотом, для которых еще не посчитан хэш. Возвращает (review_id, user_id, file_id)."""
+    file_column = Review.screenshot_file_id if kind == 'submission' else Review.confirmation_screenshot_file_id
+    async with async_session() as session:
+        hashed = select(ScreenshotHash.review_id).where(ScreenshotHash.kind == kind)
+        query = (
+            select(Review.id, Review.user_id, file_column)
+            .where(file_column.isnot(None), Review.id > after_id, Review.id.not_in(hashed))
+            .order_by(Review.id)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+# --- Подписи текстов отзывов для поиска почти-дубликатов ---
+async def add_text_signature(signature: bytes, source: str, link_id: Optional[int] = None, review_id: Optional[int] = None) -> bool:
+    """Сохраняет MinHash-подпись текста. Возвращает False, если подпись для этого отзыва уже есть."""
+    try:
+        async with async_session() as session:
+            async with session.begin():
+                session.add(ReviewTextSignature(signature=signature, source=source, link_id=link_id, review_id=review_id))
+        return True
+    except IntegrityError:
+        return False
+
+async def get_all_text_signatures() -> List[Tuple[bytes, Optional[int]]]:
+    """Возвращает (signature, link_id) для построения индекса в памяти."""
+    async with async_session() as session:
+        result = await session.stream(select(ReviewTextSignature.signature, ReviewTextSignature.link_id).order_by(ReviewTextSignature.id))
+        return [tuple(row) async for row in result]
+
+async def get_reviews_without_text_signature(after_id: int = 0, limit: int = 100) -> List[Tuple[int, Optional[int], str]]:
+    """Находит отзывы с текстом, которые еще не попали в индекс. Возвращает (review_id, link_id, review_text)."""
+    async with async_session() as session:
+        indexed = select(ReviewTextSignature.review_id).where(ReviewTextSignature.review_id.isnot(None))
+        query = (
+            select(Review.id, Review.link_id, Review.review_text)
+            .where(Review.review_text.isnot(None), Review.review_text != '', Review.id > after_id, Review.id.not_in(indexed))
+            .order_by(Review.id)
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+# --- Пул заранее сгенерированных текстов отзывов ---
+async def add_pool_texts(link_id: int, items: List[Tuple[Optional[int], str, str]]):
+    """Сохраняет готовые тексты для ссылки. items: [(scenario_id, scenario_text, text)]."""
+    if not items:
+        return
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(insert(ReviewTextPoolItem), [
+                {"link_id": link_id, "scenario_id": scenario_id, "scenario_text": scenario_text, "text": text}
+                for scenario_id, scenario_text, text in items
+            ])
+
+async def count_ready_pool_texts(link_ids: List[int]) -> Dict[int, int]:
+    if not link_ids:
+        return {}
+    async with async_session() as session:
+        query = (
+            select(ReviewTextPoolItem.link_id, func.count(ReviewTextPoolItem.id))
+            .where(ReviewTextPoolItem.link_id.in_(link_ids), ReviewTextPoolItem.status == 'ready')
+            .group_by(ReviewTextPoolItem.link_id)
+        )
+        result = await session.execute(query)
+        return {link_id: count for link_id, count in result.all()}
+
+async def claim_pool_text(link_id: int) -> Optional[ReviewTextPoolItem]:
+    """Атомарно забирает один готовый текст для ссылки."""
+    async with async_session() as session:
+        async with session.begin():
+            candidate = (
+                select(ReviewTextPoolItem.id)
+                .where(ReviewTextPoolItem.link_id == link_id, ReviewTextPoolItem.status == 'ready')
+                .order_by(ReviewTextPoolItem.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(ReviewTextPoolItem)
+                .where(ReviewTextPoolItem.id == candidate)
+                .values(status='used', used_at=datetime.datetime.utcnow())
+                .returning(ReviewTextPoolItem)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
+
+# --- Очередь модерации с арендой задач ---
+async def enqueue_moderation_task(review_id: int, task_type: str):
+    """Ставит отзыв в очередь модерации. Повторная постановка сбрасывает аренду и статус."""
+    now = datetime.datetime.utcnow()
+    async with async_session() as session:
+        async with session.begin():
+            stmt = pg_insert(ModerationQueueItem).values(
+                review_id=review_id, task_type=task_type, status='queued', attempts=0, created_at=now
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ModerationQueueItem.review_id],
+                set_={'task_type': task_type, 'status': 'queued', 'claimed_by': None, 'lease_expires_at': None,
+                      'attempts': 0, 'created_at': now, 'completed_at': None}
+            )
+            await session.execute(stmt)
+
+def _moderation_claimable(now: datetime.datetime):
+    return or_(
+        ModerationQueueItem.status == 'queued',
+        and_(ModerationQueueItem.status == 'claimed', ModerationQueueItem.lease_expires_at < now)
+    )
+
+async def claim_moderation_task(review_id: int, admin_id: int, lease_seconds: int) -> Tuple[str, Optional[int]]:
+    """
+    Берет в работу конкретный отзыв из очереди.
+    Возвращает (результат, id админа): 'claimed' - аренда получена или продлена,
+    'busy' - отзыв в работе у другого админа, 'done' - уже обработан,
+    'untracked' - отзыва нет в очереди (поставлен до ее появления).
+    """
+    now = datetime.datetime.utcnow()
+    async with async_session() as session:
+        async with session.begin():
+            stmt = (
+                update(ModerationQueueItem)
+                .where(
+                    ModerationQueueItem.review_id == review_id,
+                    or_(_moderation_claimable(now),
+                        and_(ModerationQueueItem.status == 'claimed', ModerationQueueItem.claimed_by == admin_id))
+                )
+                .values(status='claimed', claimed_by=admin_id,
+                        lease_expires_at=now + datetime.timedelta(seconds=lease_seconds),
+                        attempts=ModerationQueueItem.attempts + 1)
+                .returning(ModerationQueueItem.id)
+                .execution_options(synchronize_session=False)
+            )
+            if (await session.execute(stmt)).scalar_one_or_none():
+                return 'claimed', admin_id
+
+            item = (await session.execute(
+                select(ModerationQueueItem.status, ModerationQueueItem.claimed_by).where(ModerationQueueItem.review_id == review_id)
+            )).first()
+            if not item:
+                return 'untracked', None
+            return ('done' if item.status == 'done' else 'busy'), item.claimed_by
+
+async def claim_next_moderation_task(admin_id: int, task_types: List[str], lease_seconds: int) -> Optional[ModerationQueueItem]:
+    """Атомарно берет самую старую свободную задачу указанных типов (или задачу с истекшей арендой)."""
+    if not task_types:
+        return None
+    now = datetime.datetime.utcnow()
+    async with async_session() as session:
+        async with session.begin():
+            candidate = (
+                select(ModerationQueueItem.id)
+                .where(ModerationQueueItem.task_type.in_(task_types), _moderation_claimable(now))
+                .order_by(ModerationQueueItem.created_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            stmt = (
+                update(ModerationQueueItem)
+                .where(ModerationQueueItem.id == candidate)
+                .values(status='claimed', claimed_by=admin_id,
+                        lease_expires_at=now + datetime.timedelta(seconds=lease_seconds),
+                        attempts=ModerationQueueItem.attempts + 1)
+                .returning(ModerationQueueItem)
+                .execution_options(synchronize_session=False)
+            )
+            result = await session.execute(stmt)
+            return result.scalar_one_or_none()
+
+async def complete_moderation_task(review_id: int, admin_id: int) -> bool:
+    """
+    Закрывает задачу, только если она арендована этим админом и аренда не истекла.
+    Возвращает False, если аренда потеряна (истекла или задачу взял другой админ).
+    Отзыв без записи в очереди (поставлен до ее появления) охранять нечем - True.
+    """
+    now = datetime.datetime.utcnow()
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(ModerationQueueItem)
+                .where(ModerationQueueItem.review_id == review_id, ModerationQueueItem.status == 'claimed',
+                       ModerationQueueItem.claimed_by == admin_id, ModerationQueueItem.lease_expires_at > now)
+                .values(status='done', lease_expires_at=None, completed_at=now)
+                .returning(ModerationQueueItem.id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.scalar_one_or_none():
+                return True
+            item_id = await session.scalar(select(ModerationQueueItem.id).where(ModerationQueueItem.review_id == review_id))
+            return item_id is None
+
+async def release_moderation_task(review_id: int, admin_id: int):
+    """
+    Возвращает задачу в очередь, если она арендована этим админом или закрыта им
+    перед решением, которое не удалось применить.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                update(ModerationQueueItem)
+                .where(ModerationQueueItem.review_id == review_id, ModerationQueueItem.status.in_(['claimed', 'done']),
+                       ModerationQueueItem.claimed_by == admin_id)
+                .values(status='queued', claimed_by=None, lease_expires_at=None, completed_at=None)
+            )
+
+async def requeue_expired_moderation_leases() -> int:
+    """Возвращает в очередь задачи, аренда которых истекла. Возвращает их количество."""
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(
+                update(ModerationQueueItem)
+                .where(ModerationQueueItem.status == 'claimed', ModerationQueueItem.lease_expires_at < datetime.datetime.utcnow())
+                .values(status='queued', claimed_by=None, lease_expires_at=None)
+            )
+            return result.rowcount
+
+async def get_moderation_queue_stats() -> List[Tuple[str, str, int, datetime.datetime]]:
+    """Возвращает (task_type, status, количество, время постановки самой старой задачи) для незавершенных задач."""
+    async with async_session() as session:
+        query = (
+            select(ModerationQueueItem.task_type, ModerationQueueItem.status,
+                   func.count(ModerationQueueItem.id), func.min(ModerationQueueItem.created_at))
+            .where(ModerationQueueItem.status != 'done')
+            .group_by(ModerationQueueItem.task_type, ModerationQueueItem.status)
+            .order_by(ModerationQueueItem.task_type)
+        )
+        result = await session.execute(query)
+        return [tuple(row) for row in result.all()]
@@ -2,19 +2,37 @@
 
 import datetime
 from sqlalchemy import (Column, Integer, String, BigInteger, JSON,
-                        DateTime, ForeignKey, Float, Enum, Boolean, Text, UniqueConstraint)
+                        DateTime, ForeignKey, Numeric, Enum, Boolean, Text, UniqueConstraint,
+                        LargeBinary, Index, CheckConstraint)
 from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
+
+from utils.money import STARS_PRECISION, STARS_SCALE, Stars
 
 Base = declarative_base()
 
+
+class StarsAmount(TypeDecorator):
+    """Денежная сумма: точный NUMERIC в БД, float в коде. При записи округляется до сотых."""
+    impl = Numeric(STARS_PRECISION, STARS_SCALE)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return Stars(value).to_decimal() if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return float(value) if value is not None else None
+
+
 class User(Base):
     __tablename__ = 'users'
 
     id = Column(BigInteger, primary_key=True, index=True)
     username = Column(String, unique=True, nullable=True)
-    balance = Column(Float, default=0.0)
-    hold_balance = Column(Float, default=0.0)
-    referral_earnings = Column(Float, default=0.0)
+    balance = Column(StarsAmount, default=0.0)
+    hold_balance = Column(StarsAmount, default=0.0)
+    referral_earnings = Column(StarsAmount, default=0.0)
     registration_date = Column(DateTime, default=datetime.datetime.utcnow)
     
     referrer_id = Column(BigInteger, ForeignKey('users.id'), nullable=True)
@@ -52,6 +70,8 @@ class User(Base):
     first_task_completed = Column(Boolean, default=False, nullable=False)
     win_streak = Column(Integer, default=0, nullable=False)
     last_help_request_at = Column(DateTime, nullable=True)
+    # Когда пользователь последний раз принес награду своему рефереру (для счетчика активных рефералов)
+    referral_active_at = Column(DateTime, nullable=True)
 
 
     reviews = relationship("Review", back_populates="user")
@@ -67,6 +87,12 @@ class User(Base):
     internship_tasks = relationship("InternshipTask", back_populates="intern")
     internship_mistakes = relationship("InternshipMistake", back_populates="intern")
 
+    __table_args__ = (
+        # Keyset-пагинация списка рефералов и подсчет активных рефералов реферера
+        Index('ix_users_referrer_id_id', 'referrer_id', 'id'),
+        Index('ix_users_referrer_id_referral_active_at', 'referrer_id', 'referral_active_at'),
+    )
+
 
 class Review(Base):
     __tablename__ = 'reviews'
@@ -78,7 +104,7 @@ class Review(Base):
     status = Column(String, default='pending')
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     hold_until = Column(DateTime, nullable=True)
-    amount = Column(Float, nullable=True)
+    amount = Column(StarsAmount, nullable=True)
     
     review_text = Column(String, nullable=True)
     admin_message_id = Column(BigInteger, nullable=True)
@@ -88,7 +114,7 @@ class Review(Base):
     attached_photo_file_id = Column(String, nullable=True)
     
     # Новое поле
-    stake_amount = Column(Float, nullable=True)
+    stake_amount = Column(StarsAmount, nullable=True)
     
     link = relationship("Link")
     user = relationship("User", back_populates="reviews")
@@ -107,9 +133,18 @@ class Link(Base):
     requires_photo = Column(Boolean, default=False, nullable=False)
     
     # Новые поля
-    reward_amount = Column(Float, nullable=False, default=0.0)
+    reward_amount = Column(StarsAmount, nullable=False, default=0.0)
     gender_requirement = Column(Enum('any', 'male', 'female', name='gender_enum'), nullable=False, default='any')
     campaign_tag = Column(String(255), nullable=True)
+    # sha1 нормализованного URL для поиска дубликатов (у старых ссылок заполняется бэкфиллом)
+    url_hash = Column(String(40), nullable=True)
+
+    __table_args__ = (
+        Index('uq_links_platform_url_hash', 'platform', 'url_hash', unique=True, postgresql_where=url_hash.isnot(None)),
+        # Для keyset-пагинации списка ссылок (обычная сортировка и сортировка по наличию тега)
+        Index('ix_links_platform_id', 'platform', 'id'),
+        Index('ix_links_platform_has_tag_id', 'platform', campaign_tag.isnot(None), 'id'),
+    )
 
 
 class WithdrawalRequest(Base):
@@ -117,7 +152,7 @@ class WithdrawalRequest(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(StarsAmount, nullable=False)
     status = Column(Enum('pending', 'approved', 'rejected', name='withdrawal_status_enum'), default='pending', nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
@@ -132,13 +167,18 @@ class PromoCode(Base):
     id = Column(Integer, primary_key=True)
     code = Column(String, unique=True, index=True, nullable=False)
     condition = Column(Enum('no_condition', 'google_review', 'yandex_review', 'gmail_account', name='promo_condition_enum'), nullable=False)
-    reward = Column(Float, nullable=False)
+    reward = Column(StarsAmount, nullable=False)
     total_uses = Column(Integer, nullable=False)
     current_uses = Column(Integer, default=0, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    # Метка пачки для сгенерированных кодов; у созданных вручную - NULL
+    batch_tag = Column(String(32), nullable=True, index=True)
     
     activations = relationship("PromoActivation", back_populates="promo_code")
 
+    # Поиск кода идет без учета регистра
+    __table_args__ = (Index('ix_promo_codes_upper_code', func.upper(code)),)
+
 
 class PromoActivation(Base):
     __tablename__ = 'promo_activations'
@@ -175,7 +215,7 @@ class SupportTicket(Base):
 class RewardSetting(Base):
     __tablename__ = 'reward_settings'
     place = Column(Integer, primary_key=True)
-    reward_amount = Column(Float, nullable=False)
+    reward_amount = Column(StarsAmount, nullable=False)
 
 class SystemSetting(Base):
     __tablename__ = 'system_settings'
@@ -185,17 +225,19 @@ class SystemSetting(Base):
 class OperationHistory(Base):
     __tablename__ = 'operation_history'
 
-    id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, ForeignKey('users.id'), nullable=False, index=True)
+    # Таблица секционирована по месяцам created_at, поэтому ключ секционирования входит в PK
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
     operation_type = Column(Enum(
         'REVIEW_APPROVED', 'PROMO_ACTIVATED', 'WITHDRAWAL', 'FINE', 
         'TRANSFER_SENT', 'TRANSFER_RECEIVED', 'TOP_REWARD',
         'DEPOSIT_OPEN', 'DEPOSIT_CLOSE', 'DONATION', 'HELP_RECEIVED', # Новые типы
+        'STAKE_HOLD', 'STAKE_RETURN', 'COINFLIP', 'BALANCE_OPENING',
         name='operation_type_enum'
     ), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(StarsAmount, nullable=False)
     description = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False, primary_key=True)
     
     comment = Column(Text, nullable=True)
     media_json = Column(Text, nullable=True)
@@ -204,7 +246,32 @@ class OperationHistory(Base):
 
     user = relationship("User", back_populates="operations", foreign_keys=[user_id])
     sender = relationship("User", foreign_keys=[sender_id])
-    complaints = relationship("TransferComplaint", back_populates="transfer", cascade="all, delete-orphan")
+
+    # Keyset-пагинация истории пользователя от новых операций к старым; покрывает и поиск по user_id
+    __table_args__ = (
+        Index('ix_operation_history_user_created_id', 'user_id', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+class OperationHistoryArchive(Base):
+    """Секция operation_history, отсоединенная в архив: осталась отдельной таблицей или выгружена в файл."""
+    __tablename__ = 'operation_history_archives'
+    partition_name = Column(String(63), primary_key=True)
+    range_start = Column(DateTime, nullable=False)
+    range_end = Column(DateTime, nullable=False)
+    row_count = Column(BigInteger, nullable=False)
+    # Путь к сжатому CSV; NULL - секция лежит в БД отдельной таблицей
+    file_path = Column(String, nullable=True)
+    archived_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ArchivedOperationTotal(Base):
+    """Сумма и число операций пользователя в архивированных секциях - для сверки баланса с историей."""
+    __tablename__ = 'archived_operation_totals'
+    user_id = Column(BigInteger, primary_key=True)
+    amount = Column(StarsAmount, nullable=False)
+    operations = Column(BigInteger, nullable=False)
 
 
 class UnbanRequest(Base):
@@ -244,7 +311,7 @@ class InternshipTask(Base):
     goal_count = Column(Integer, nullable=False)
     current_progress = Column(Integer, default=0)
     error_count = Column(Integer, default=0)
-    estimated_salary = Column(Float, default=0.0)
+    estimated_salary = Column(StarsAmount, default=0.0)
     status = Column(Enum('active', 'completed', 'fired', name='internship_task_status_enum'), default='active', nullable=False)
     assigned_at = Column(DateTime, default=datetime.datetime.utcnow)
     last_task_at = Column(DateTime, default=datetime.datetime.utcnow)
@@ -260,7 +327,7 @@ class InternshipMistake(Base):
     intern_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
     review_id = Column(Integer, nullable=True)
     reason = Column(String, nullable=False)
-    penalty_amount = Column(Float, nullable=False)
+    penalty_amount = Column(StarsAmount, nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
     task = relationship("InternshipTask", back_populates="mistakes")
@@ -291,13 +358,14 @@ class TransferComplaint(Base):
     __tablename__ = 'transfer_complaints'
 
     id = Column(Integer, primary_key=True)
-    transfer_id = Column(Integer, ForeignKey('operation_history.id'), nullable=False)
+    # Без FK: operation_history секционирована, и перевод может уйти в архив раньше жалобы
+    transfer_id = Column(BigInteger, nullable=False)
     complainant_id = Column(BigInteger, ForeignKey('users.id'), nullable=False)
     reason = Column(Text, nullable=False)
     status = Column(Enum('pending', 'reviewed', name='complaint_status_enum'), default='pending', nullable=False)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     
-    transfer = relationship("OperationHistory", back_populates="complaints")
+    transfer = relationship("OperationHistory", primaryjoin="foreign(TransferComplaint.transfer_id) == OperationHistory.id", viewonly=True)
     complainant = relationship("User", foreign_keys=[complainant_id])
 
 # --- Новые модели ---
@@ -325,8 +393,8 @@ class UserDeposit(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     deposit_plan_id = Column(String, nullable=False)
-    initial_amount = Column(Float, nullable=False)
-    current_balance = Column(Float, nullable=False)
+    initial_amount = Column(StarsAmount, nullable=False)
+    current_balance = Column(StarsAmount, nullable=False)
     opens_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
     closes_at = Column(DateTime, nullable=False)
     last_accrual_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
@@ -337,7 +405,133 @@ class Donation(Base):
     __tablename__ = 'donations'
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount = Column(StarsAmount, nullable=False)
     donated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
 
-    user = relationship("User", back_populates="donations")
\ No newline at end of file
+    user = relationship("User", back_populates="donations")
+
+class ScreenshotHash(Base):
+    __tablename__ = 'screenshot_hashes'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    review_id = Column(Integer, ForeignKey('reviews.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(BigInteger, nullable=False)
+    kind = Column(Enum('submission', 'confirmation', name='screenshot_kind_enum'), nullable=False)
+    file_id = Column(String, nullable=False)
+    dhash = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (UniqueConstraint('review_id', 'kind'),)
+
+
+class ReviewTextPoolItem(Base):
+    __tablename__ = 'review_text_pool'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    link_id = Column(Integer, ForeignKey('links.id', ondelete='CASCADE'), nullable=False, index=True)
+    scenario_id = Column(Integer, ForeignKey('ai_scenarios.id', ondelete='SET NULL'), nullable=True)
+    scenario_text = Column(Text, nullable=True)
+    text = Column(Text, nullable=False)
+    status = Column(Enum('ready', 'used', name='review_text_pool_status_enum'), default='ready', nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+
+
+class ReviewTextSignature(Base):
+    __tablename__ = 'review_text_signatures'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    link_id = Column(Integer, ForeignKey('links.id', ondelete='SET NULL'), nullable=True)
+    review_id = Column(Integer, ForeignKey('reviews.id', ondelete='CASCADE'), nullable=True, unique=True)
+    source = Column(Enum('issued', 'submitted', name='review_text_source_enum'), nullable=False)
+    signature = Column(LargeBinary, nullable=False)  # MinHash-подпись текста
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+
+class ModerationQueueItem(Base):
+    __tablename__ = 'moderation_queue'
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    review_id = Column(Integer, ForeignKey('reviews.id', ondelete='CASCADE'), nullable=False, unique=True)
+    task_type = Column(String, nullable=False)
+    status = Column(Enum('queued', 'claimed', 'done', name='moderation_queue_status_enum'), default='queued', nullable=False)
+    claimed_by = Column(BigInteger, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index('ix_moderation_queue_status_task_type_created_at', 'status', 'task_type', 'created_at'),)
+
+
+class LinkCounter(Base):
+    """Количество ссылок по (платформа, пол, статус, тег кампании). Обновляется в тех же транзакциях, что и ссылки."""
+    __tablename__ = 'link_counters'
+    platform = Column(String, primary_key=True)
+    gender_requirement = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    campaign_tag = Column(String(255), primary_key=True, default='')  # '' - без тега
+    count = Column(Integer, nullable=False, default=0)
+
+
+class LedgerEntry(Base):
+    """
+    Неизменяемая проводка двойной записи: amount переходит со счета credit_account на счет debit_account.
+    Счета: user:<id>, hold:<id>, referral:<id>, fund, house. Баланс счета = сумма дебетов - сумма кредитов.
+    """
+    __tablename__ = 'ledger_entries'
+    id = Column(BigInteger, primary_key=True)
+    debit_account = Column(String(64), nullable=False)
+    credit_account = Column(String(64), nullable=False)
+    amount = Column(StarsAmount, nullable=False)
+    # Запись в operation_history, если проводка к ней относится (без FK: история хранится отдельно)
+    operation_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        CheckConstraint('amount > 0', name='ck_ledger_entries_amount_positive'),
+        CheckConstraint('debit_account <> credit_account', name='ck_ledger_entries_distinct_accounts'),
+        Index('ix_ledger_entries_debit_account_id', 'debit_account', 'id'),
+        Index('ix_ledger_entries_credit_account_id', 'credit_account', 'id'),
+    )
+
+
+class LedgerAccount(Base):
+    """Текущий баланс пользовательского счета книги. Обновляется в той же транзакции, что и проводки."""
+    __tablename__ = 'ledger_accounts'
+    account = Column(String(64), primary_key=True)
+    balance = Column(StarsAmount, nullable=False, default=0)
+    entry_count = Column(BigInteger, nullable=False, default=0)
+
+
+class LedgerSnapshot(Base):
+    """Баланс пользовательского счета после проводки entry_id. Пишется каждые Ledger.SNAPSHOT_EVERY проводок счета."""
+    __tablename__ = 'ledger_snapshots'
+    id = Column(BigInteger, primary_key=True)
+    account = Column(String(64), nullable=False)
+    entry_id = Column(BigInteger, nullable=False)
+    balance = Column(StarsAmount, nullable=False)
+    entry_count = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('account', 'entry_id', name='uq_ledger_snapshots_account_entry'),
+        Index('ix_ledger_snapshots_account_created_at', 'account', 'created_at'),
+    )
+
+
+class ReferralStats(Base):
+    """Агрегаты реферера, обновляемые вместе с регистрациями рефералов и зачислением наград."""
+    __tablename__ = 'referral_stats'
+    referrer_id = Column(BigInteger, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    referrals_count = Column(Integer, default=0, nullable=False)
+    total_earned = Column(StarsAmount, default=0, nullable=False)
+
+
+class ReferralAccrual(Base):
+    """Реферальная награда, ожидающая пакетного зачисления в копилку реферера."""
+    __tablename__ = 'referral_accruals'
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    referrer_id = Column(BigInteger, nullable=False)
+    referral_id = Column(BigInteger, nullable=False)
+    amount = Column(StarsAmount, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    # Зачисление по одному рефереру при сборе копилки
+    __table_args__ = (Index('ix_referral_accruals_referrer_id', 'referrer_id'),)
@@ -14,14 +14,17 @@ from aiogram.fsm.storage.base import StorageKey
 from aiogram.types import CallbackQuery, Message
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from config import Durations, Limits, SUPER_ADMIN_ID
+from config import Durations, Limits, LinkImport, ModerationQueue, SUPER_ADMIN_ID
 from database import db_manager
 from keyboards import inline, reply
 from logic import (admin_logic, admin_roles, internship_logic)
-from logic.ai_helper import generate_review_text
+from logic.ai_helper import generate_review_text, is_generation_error
+from logic import link_import, moderation_queue, review_text_pool, text_similarity
+from logic.admin_routing import queue_tracker
 from logic.notification_logic import notify_subscribers
 from logic.notification_manager import send_notification_to_admins
 from logic.ocr_helper import analyze_screenshot
+from logic.image_processing import pick_photo_size
 from references import reference_manager
 from states.user_states import AdminState, UserState
 from utils.access_filters import IsAdmin, IsSuperAdmin
@@ -140,7 +143,7 @@ async def admin_skip_campaign_tag(callback: CallbackQuery, state: FSMContext):
     await state.update_data(campaign_tag_for_links=None)
     await state.set_state(AdminState.waiting_for_links)
     prompt_msg = await callback.message.edit_text(
-        "**Шаг 4/4:** Отправьте URL-ссылки. Каждая ссылка с новой строки.",
+        "**Шаг 4/4:** Отправьте URL-ссылки (каждая с новой строки) или файл .txt/.csv со ссылками.",
         reply_markup=inline.get_cancel_inline_keyboard(f"admin_refs:select_platform:{(await state.get_data())['platform_for_links']}")
     )
     await state.update_data(prompt_message_id=prompt_msg.message_id)
@@ -153,34 +156,44 @@ async def admin_add_link_campaign(message: Message, state: FSMContext):
     
     await state.set_state(AdminState.waiting_for_links)
     prompt_msg = await message.answer(
-        "**Шаг 4/4:** Отправьте URL-ссылки. Каждая ссылка с новой строки.",
+        "**Шаг 4/4:** Отправьте URL-ссылки (каждая с новой строки) или файл .txt/.csv со ссылками.",
         reply_markup=inline.get_cancel_inline_keyboard(f"admin_refs:select_platform:{(await state.get_data())['platform_for_links']}")
     )
     await state.update_data(prompt_message_id=prompt_msg.message_id)
 
-@router.message(AdminState.waiting_for_links, F.text, IsSuperAdmin())
-async def admin_add_links_handler(message: Message, state: FSMContext, bot: Bot):
+async def _import_links(message: Message, state: FSMContext, bot: Bot, content: str, is_csv: bool = False):
+    """Импортирует ссылки, показывая прогресс по мере вставки порций."""
     data = await state.get_data()
-    await delete_previous_messages(message, state)
-
     platform = data.get("platform_for_links")
-    reward = data.get("reward_amount_for_links")
     gender = data.get("gender_requirement_for_links")
-    campaign = data.get("campaign_tag_for_links")
-    is_fast = data.get("is_fast_track_for_links")
-    requires_photo = data.get("requires_photo_for_links")
+
+    progress_msg = await message.answer("⏳ Импорт ссылок...")
+    last_update = {"at": 0.0}
+
+    async def report_progress(done: int, total: int):
+        # Telegram ограничивает частоту редактирования, поэтому обновляем не чаще раза в секунду
+        now = asyncio.get_running_loop().time()
+        if done < total and now - last_update["at"] < 1:
+            return
+        last_update["at"] = now
+        try:
+            await progress_msg.edit_text(f"⏳ Импорт ссылок: {done}/{total}")
+        except TelegramBadRequest:
+            pass
 
     try:
         result_text = await admin_logic.process_add_links_logic(
-            links_text=message.text, 
+            links_text=content,
             platform=platform,
-            is_fast_track=is_fast,
-            requires_photo=requires_photo,
-            reward_amount=reward,
+            is_fast_track=data.get("is_fast_track_for_links"),
+            requires_photo=data.get("requires_photo_for_links"),
+            reward_amount=data.get("reward_amount_for_links"),
             gender_requirement=gender,
-            campaign_tag=campaign
+            campaign_tag=data.get("campaign_tag_for_links"),
+            is_csv=is_csv,
+            progress=report_progress
         )
-        await message.answer(result_text, reply_markup=inline.get_back_to_platform_refs_keyboard(platform))
+        await progress_msg.edit_text(result_text, reply_markup=inline.get_back_to_platform_refs_keyboard(platform))
         
         await notify_subscribers(platform, gender, bot)
 
@@ -190,6 +203,27 @@ async def admin_add_links_handler(message: Message, state: FSMContext, bot: Bot)
     finally:
         await state.clear()
 
+@router.message(AdminState.waiting_for_links, F.text, IsSuperAdmin())
+async def admin_add_links_handler(message: Message, state: FSMContext, bot: Bot):
+    await delete_previous_messages(message, state)
+    await _import_links(message, state, bot, message.text)
+
+@router.message(AdminState.waiting_for_links, F.document, IsSuperAdmin())
+async def admin_add_links_file_handler(message: Message, state: FSMContext, bot: Bot):
+    document = message.document
+    file_name = (document.file_name or "").lower()
+    if not file_name.endswith((".txt", ".csv")):
+        await message.answer("Поддерживаются только файлы .txt и .csv.")
+        return
+    if document.file_size and document.file_size > LinkImport.MAX_FILE_MB * 1024 * 1024:
+        await message.answer(f"Файл слишком большой: максимум {LinkImport.MAX_FILE_MB} МБ.")
+        return
+
+    await delete_previous_messages(message, state)
+    downloaded = await bot.download(document)
+    content = link_import.decode_document(downloaded.getvalue())
+    await _import_links(message, state, bot, content, is_csv=file_name.endswith(".csv"))
+
 
 @router.callback_query(F.data == "admin_refs:back_to_selection", IsSuperAdmin())
 async def admin_back_to_platform_selection(callback: CallbackQuery, state: FSMContext):
@@ -219,21 +253,27 @@ async def admin_view_refs_stats(callback: CallbackQuery, state: FSMContext):
 
 # --- ОБНОВЛЕННЫЙ БЛОК ПРОСМОТРА СПИСКА ССЫЛОК С ФИЛЬТРАМИ ---
 
-async def show_links_page(callback: CallbackQuery, state: FSMContext, platform: str, page: int):
-    """Отображает конкретную страницу списка ссылок с учетом всех фильтров из state."""
+async def show_links_page(callback: CallbackQuery, state: FSMContext, platform: str, page: int, cursor: tuple = None, backward: bool = False):
+    """Отображает страницу списка ссылок с учетом всех фильтров из state. Без cursor - первая страница."""
     data = await state.get_data()
     filter_type = data.get("link_list_filter_type", "all")
     gender_filter = data.get("link_list_gender_filter")
     reward_filter = data.get("link_list_reward_filter")
     sort_by_tag = data.get("link_list_sort_by_tag", False)
 
-    total_links, links_on_page = await db_manager.db_get_paginated_references(
-        platform, page, Limits.LINKS_PER_PAGE, filter_type, gender_filter, reward_filter, sort_by_tag
+    total_links = await db_manager.db_count_links(platform, filter_type, gender_filter, reward_filter)
+    links_on_page = await db_manager.db_get_links_page(
+        platform, Limits.LINKS_PER_PAGE, filter_type, gender_filter, reward_filter, sort_by_tag, cursor=cursor, backward=backward
     )
     total_pages = ceil(total_links / Limits.LINKS_PER_PAGE) if total_links > 0 else 1
-    
+    page = min(page, total_pages)
+
+    first_key = (links_on_page[0].campaign_tag is not None, links_on_page[0].id) if links_on_page else None
+    last_key = (links_on_page[-1].campaign_tag is not None, links_on_page[-1].id) if links_on_page else None
     page_text = admin_logic.get_paginated_links_text(links_on_page, page, total_pages, platform, filter_type)
-    keyboard = inline.get_link_list_control_keyboard(platform, page, total_pages, filter_type, reward_filter, gender_filter, sort_by_tag)
+    keyboard = inline.get_link_list_control_keyboard(
+        platform, page, total_pages, filter_type, reward_filter, gender_filter, sort_by_tag, first_key=first_key, last_key=last_key
+    )
     
     if callback.message:
         await callback.message.edit_text(page_text, reply_markup=keyboard, disable_web_page_preview=True)
@@ -259,8 +299,19 @@ async def admin_view_refs_list(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.startswith("links_page:"), AdminState.LINK_LIST_VIEW, IsSuperAdmin())
 async def link_list_paginator(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
-    _, platform, page_str = callback.data.split(":")
-    await show_links_page(callback, state, platform, int(page_str))
+    parts = callback.data.split(":")
+    platform = parts[1]
+    if len(parts) < 6:
+        # Кнопка из сообщения, отправленного до перехода на курсоры: открываем первую страницу
+        await show_links_page(callback, state, platform, 1)
+        return
+    _, _, direction, page_str, has_tag_str, link_id_str = parts
+    page = int(page_str)
+    if page <= 1:
+        await show_links_page(callback, state, platform, 1)
+        return
+    cursor = (has_tag_str == "1", int(link_id_str))
+    await show_links_page(callback, state, platform, page, cursor=cursor, backward=direction == "p")
 
 @router.callback_query(F.data.startswith("admin_refs:filter_gender:"), AdminState.LINK_LIST_VIEW, IsSuperAdmin())
 async def filter_by_gender_start(callback: CallbackQuery, state: FSMContext):
@@ -330,8 +381,7 @@ async def reset_all_filters(callback: CallbackQuery, state: FSMContext):
 async def admin_delete_ref_start(callback: CallbackQuery, state: FSMContext):
     platform = callback.data.split(':')[2]
     
-    links_count = await db_manager.db_get_links_count(platform)
-    if links_count == 0:
+    if not await db_manager.db_has_links(platform):
         await callback.answer("База ссылок для этой платформы пуста. Нечего удалять.", show_alert=True)
         return
         
@@ -403,8 +453,7 @@ async def admin_return_ref_start(callback: CallbackQuery, state: FSMContext):
     """Начало процесса возврата ссылки в 'available'."""
     platform = callback.data.split(':')[2]
 
-    links_count = await db_manager.db_get_links_count(platform)
-    if links_count == 0:
+    if not await db_manager.db_has_links(platform):
         await callback.answer("База ссылок для этой платформы пуста. Нечего возвращать.", show_alert=True)
         return
 
@@ -473,7 +522,6 @@ async def admin_ocr_check(callback: CallbackQuery, state: FSMContext, bot: Bot):
     if not (callback.message and callback.message.photo):
         await callback.answer("Не удалось найти фото для анализа.", show_alert=True)
         return
-    file_id = callback.message.photo[-1].file_id
     original_caption = callback.message.caption or ""
 
     await callback.answer("🤖 Запускаю проверку с помощью ИИ...", show_alert=False)
@@ -500,6 +548,7 @@ async def admin_ocr_check(callback: CallbackQuery, state: FSMContext, bot: Bot):
         except TelegramBadRequest: pass
         return
 
+    file_id = pick_photo_size(callback.message.photo, task).file_id
     ocr_result = await analyze_screenshot(bot, file_id, task)
     
     ai_summary_text = ""
@@ -556,9 +605,8 @@ async def admin_verification_handler(callback: CallbackQuery, state: FSMContext,
             await user_state.set_state(UserState.YANDEX_REVIEW_READY_TO_TASK)
             await bot.send_message(user_id, "Профиль Yandex прошел проверку. Можете продолжить.", reply_markup=inline.get_yandex_continue_writing_keyboard())
         elif context == "gmail_device_model":
-            responsible_admin = await admin_roles.get_gmail_data_admin()
-            if callback.from_user.id != responsible_admin:
-                admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+            if not await admin_roles.is_role_admin(callback.from_user.id, admin_roles.GMAIL_ISSUE_DATA_ADMIN):
+                admin_name = await admin_roles.get_role_admin_names(bot, admin_roles.GMAIL_ISSUE_DATA_ADMIN)
                 await callback.message.answer(f"Запрос на выдачу данных отправлен {admin_name}")
                 try:
                     user_info = await bot.get_chat(user_id)
@@ -618,16 +666,13 @@ async def admin_start_providing_text(callback: CallbackQuery, state: FSMContext,
     try:
         _, platform, user_id_str, link_id_str, photo_required = callback.data.split(':')
         
-        if platform == 'google':
-            responsible_admin = await admin_roles.get_google_issue_admin()
-        elif platform == 'yandex_with_text':
-            responsible_admin = await admin_roles.get_yandex_text_issue_admin()
-        else:
+        role_key = admin_roles.ISSUE_TEXT_ROLE_BY_PLATFORM.get(platform)
+        if not role_key:
             await callback.message.answer("Ошибка: неизвестная платформа для выдачи текста.")
             return
 
-        if callback.from_user.id != responsible_admin:
-            admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+        if not await admin_roles.is_role_admin(callback.from_user.id, role_key):
+            admin_name = await admin_roles.get_role_admin_names(bot, role_key)
             await callback.message.answer(f"Эту задачу выполняет {admin_name}")
             return
 
@@ -667,12 +712,11 @@ async def admin_ai_generate_start(callback: CallbackQuery, state: FSMContext, bo
     try:
         _, platform, user_id_str, link_id_str, photo_required = callback.data.split(':')
         
-        if platform == 'google': responsible_admin = await admin_roles.get_google_issue_admin()
-        elif platform == 'yandex_with_text': responsible_admin = await admin_roles.get_yandex_text_issue_admin()
-        else: return
+        role_key = admin_roles.ISSUE_TEXT_ROLE_BY_PLATFORM.get(platform)
+        if not role_key: return
         
-        if callback.from_user.id != responsible_admin:
-            admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+        if not await admin_roles.is_role_admin(callback.from_user.id, role_key):
+            admin_name = await admin_roles.get_role_admin_names(bot, role_key)
             await callback.answer(f"Эту задачу выполняет {admin_name}", show_alert=True)
             return
 
@@ -689,6 +733,55 @@ async def admin_ai_generate_start(callback: CallbackQuery, state: FSMContext, bo
     except Exception as e: 
         logger.exception(f"Ошибка на старте AI генерации: {e}")
 
+@router.callback_query(F.data.startswith('admin_pool_text:'), IsAdmin())
+async def admin_take_pool_text(callback: CallbackQuery, state: FSMContext, bot: Bot):
+    """Мгновенно выдает заранее сгенерированный текст из пула для ссылки."""
+    try:
+        _, platform, user_id_str, link_id_str = callback.data.split(':')
+    except ValueError:
+        await callback.answer("Ошибка в данных кнопки.", show_alert=True)
+        return
+
+    role_key = admin_roles.ISSUE_TEXT_ROLE_BY_PLATFORM.get(platform)
+    if not role_key:
+        await callback.answer("Ошибка: неизвестная платформа для выдачи текста.", show_alert=True)
+        return
+
+    if not await admin_roles.is_role_admin(callback.from_user.id, role_key):
+        admin_name = await admin_roles.get_role_admin_names(bot, role_key)
+        await callback.answer(f"Эту задачу выполняет {admin_name}", show_alert=True)
+        return
+
+    link_id = int(link_id_str)
+    pool_item = await review_text_pool.take_text(link_id)
+    if not pool_item:
+        link = await db_manager.db_get_link_by_id(link_id)
+        if link:
+            review_text_pool.schedule_warming([link_id], link.platform)
+        await callback.answer("Готовых текстов для этой ссылки пока нет. Воспользуйтесь генерацией с ИИ или ручным вводом.", show_alert=True)
+        return
+
+    await callback.answer()
+    await state.set_state(AdminState.AI_AWAITING_MODERATION)
+    await state.update_data(
+        target_user_id=int(user_id_str),
+        target_link_id=link_id,
+        platform=platform,
+        photo_required=False,
+        original_message_id=callback.message.message_id,
+        ai_scenario=pool_item.scenario_text,
+        ai_generated_text=pool_item.text,
+        attached_photo_id=None,
+        from_pool=True
+    )
+
+    moderation_text = (
+        "📄 **Готовый текст отзыва из пула:**\n\n"
+        f"*{pool_item.text}*\n\n"
+        "Выберите следующее действие:"
+    )
+    await callback.message.answer(moderation_text, reply_markup=inline.get_ai_moderation_keyboard())
+
 @router.callback_query(F.data == "input_scenario_manually", IsAdmin())
 async def input_scenario_manually(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
@@ -802,7 +895,7 @@ async def admin_process_ai_scenario(message: Message, state: FSMContext, bot: Bo
 
     await status_msg.delete()
 
-    if "ошибка" in generated_text.lower() or "ai-сервис" in generated_text.lower() or "ai-модель" in generated_text.lower():
+    if is_generation_error(generated_text):
         await message.answer(
             f"❌ {generated_text}\n\nПопробуйте снова или напишите вручную.", 
             reply_markup=inline.get_ai_error_keyboard()
@@ -831,6 +924,13 @@ async def admin_process_ai_moderation(callback: CallbackQuery, state: FSMContext
     
     if action == 'send':
         review_text = data.get('ai_generated_text')
+        duplicate_warning = text_similarity.get_duplicate_text_warning(review_text)
+        if duplicate_warning:
+            await callback.message.edit_text(
+                f"❌ {duplicate_warning}\n\nСгенерируйте новый текст или напишите вручную.",
+                reply_markup=inline.get_ai_error_keyboard()
+            )
+            return
         
         dp_dummy = Dispatcher(storage=state.storage)
         success, response_text = await admin_logic.send_review_text_to_user_logic(
@@ -851,17 +951,24 @@ async def admin_process_ai_moderation(callback: CallbackQuery, state: FSMContext
             return
 
         link_id = data.get('target_link_id')
-        link = await db_manager.db_get_link_by_id(link_id)
-        company_info = link.url if link else "Неизвестная компания"
 
-        status_msg = await callback.message.answer("🤖 Повторная генерация...")
-        generated_text = await generate_review_text(
-            company_info=company_info,
-            scenario=scenario,
-        )
-        await status_msg.delete()
+        # Текст из пула сначала меняем на следующий готовый кандидат
+        pool_item = await review_text_pool.take_text(link_id) if data.get('from_pool') else None
+        if pool_item:
+            generated_text = pool_item.text
+            await state.update_data(ai_scenario=pool_item.scenario_text)
+        else:
+            link = await db_manager.db_get_link_by_id(link_id)
+            company_info = link.url if link else "Неизвестная компания"
+
+            status_msg = await callback.message.answer("🤖 Повторная генерация...")
+            generated_text = await generate_review_text(
+                company_info=company_info,
+                scenario=scenario,
+            )
+            await status_msg.delete()
 
-        if "ошибка" in generated_text.lower() or "ai-сервис" in generated_text.lower() or "ai-модель" in generated_text.lower():
+        if is_generation_error(generated_text):
             await callback.message.edit_text(
                 f"❌ {generated_text}\n\nПопробуйте снова или напишите вручную.", 
                 reply_markup=inline.get_ai_error_keyboard()
@@ -898,20 +1005,34 @@ async def admin_final_approve(callback: CallbackQuery, bot: Bot, scheduler: Asyn
         await callback.answer("Ошибка: отзыв не найден.", show_alert=True)
         return
     
-    platform = review.platform
-    responsible_admin = SUPER_ADMIN_ID
-
-    if platform == 'google': responsible_admin = await admin_roles.get_google_final_admin()
-    elif platform == 'yandex_with_text': responsible_admin = await admin_roles.get_yandex_text_final_admin()
-    elif platform == 'yandex_without_text': responsible_admin = await admin_roles.get_yandex_no_text_final_admin()
+    role_key = admin_roles.FINAL_CHECK_ROLE_BY_PLATFORM.get(review.platform)
+    if role_key:
+        is_responsible = await admin_roles.is_role_admin(callback.from_user.id, role_key)
+    else:
+        is_responsible = callback.from_user.id == SUPER_ADMIN_ID
         
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not is_responsible:
+        admin_name = await admin_roles.get_role_admin_names(bot, role_key) if role_key else await admin_roles.get_admin_username(bot, SUPER_ADMIN_ID)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
 
-    success, message_text = await admin_logic.approve_review_to_hold_logic(review_id, bot, scheduler)
+    claim_error = await moderation_queue.claim_review(bot, review_id, callback.from_user.id)
+    if claim_error:
+        await callback.answer(claim_error, show_alert=True)
+        return
+    lease_error = await moderation_queue.complete_review(review_id, callback.from_user.id)
+    if lease_error:
+        await callback.answer(lease_error, show_alert=True)
+        return
+
+    try:
+        success, message_text = await admin_logic.approve_review_to_hold_logic(review_id, bot, scheduler)
+    except Exception:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
+        raise
     await callback.answer(message_text, show_alert=True)
+    if not success:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
     if success and callback.message:
         await callback.message.edit_caption(caption=f"{(callback.message.caption or '')}\n\n✅ В **ХОЛДЕ** (@{callback.from_user.username})", reply_markup=None)
 
@@ -924,18 +1045,23 @@ async def admin_final_reject_start(callback: CallbackQuery, state: FSMContext, b
         await callback.answer("Ошибка: отзыв не найден.", show_alert=True)
         return
         
-    platform = review.platform
-    responsible_admin = SUPER_ADMIN_ID
-
-    if platform == 'google': responsible_admin = await admin_roles.get_google_final_admin()
-    elif platform == 'yandex_with_text': responsible_admin = await admin_roles.get_yandex_text_final_admin()
-    elif platform == 'yandex_without_text': responsible_admin = await admin_roles.get_yandex_no_text_final_admin()
+    role_key = admin_roles.FINAL_CHECK_ROLE_BY_PLATFORM.get(review.platform)
+    if role_key:
+        is_responsible = await admin_roles.is_role_admin(callback.from_user.id, role_key)
+    else:
+        is_responsible = callback.from_user.id == SUPER_ADMIN_ID
         
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not is_responsible:
+        admin_name = await admin_roles.get_role_admin_names(bot, role_key) if role_key else await admin_roles.get_admin_username(bot, SUPER_ADMIN_ID)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
 
+    # Аренда держится, пока админ вводит причину, и истекает сама, если он передумает
+    claim_error = await moderation_queue.claim_review(bot, review_id, callback.from_user.id)
+    if claim_error:
+        await callback.answer(claim_error, show_alert=True)
+        return
+
     await state.set_state(AdminState.PROVIDE_FINAL_REJECTION_REASON)
     await state.update_data(review_id_to_reject=review_id)
     
@@ -957,21 +1083,33 @@ async def admin_final_reject_process_reason(message: Message, state: FSMContext,
     review_id = data.get('review_id_to_reject')
     reason = message.text
 
-    success, message_text = await admin_logic.reject_initial_review_logic(review_id, bot, scheduler, reason=reason)
-    
+    # Пока вводилась причина, аренда могла истечь: продлеваем ее и проверяем в момент решения
+    lease_error = (
+        await moderation_queue.claim_review(bot, review_id, message.from_user.id)
+        or await moderation_queue.complete_review(review_id, message.from_user.id)
+    )
+    if lease_error:
+        await message.answer(lease_error)
+        await state.clear()
+        return
+
+    try:
+        success, message_text = await admin_logic.reject_initial_review_logic(review_id, bot, scheduler, reason=reason)
+    except Exception:
+        await db_manager.release_moderation_task(review_id, message.from_user.id)
+        raise
+    if not success:
+        await db_manager.release_moderation_task(review_id, message.from_user.id)
+
     admin_info_msg = await message.answer(message_text)
     asyncio.create_task(schedule_message_deletion(admin_info_msg, Durations.DELETE_ADMIN_REPLY_DELAY))
 
     try:
         review = await db_manager.get_review_by_id(review_id)
         if review and review.admin_message_id:
-            responsible_admin = SUPER_ADMIN_ID
-            if review.platform == 'google': responsible_admin = await admin_roles.get_google_final_admin()
-            elif review.platform == 'yandex_with_text': responsible_admin = await admin_roles.get_yandex_text_final_admin()
-            elif review.platform == 'yandex_without_text': responsible_admin = await admin_roles.get_yandex_no_text_final_admin()
-
+            # Сообщение с отзывом лежит в чате админа, который нажал "отклонить"
             original_message = await bot.edit_message_caption(
-                chat_id=responsible_admin,
+                chat_id=message.chat.id,
                 message_id=review.admin_message_id,
                 caption=f"{(review.review_text or '')}\n\n❌ **ОТКЛОНЕН** (@{message.from_user.username})\nПричина: {reason}",
                 reply_markup=None
@@ -1005,14 +1143,28 @@ async def final_verify_approve_handler(callback: CallbackQuery, bot: Bot):
             except TelegramBadRequest: pass
         return
 
-    responsible_admin = await admin_roles.get_other_hold_admin()
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not await admin_roles.is_role_admin(callback.from_user.id, admin_roles.OTHER_HOLD_REVIEW_ADMIN):
+        admin_name = await admin_roles.get_role_admin_names(bot, admin_roles.OTHER_HOLD_REVIEW_ADMIN)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
 
-    success, message_text = await admin_logic.approve_final_review_logic(review_id, bot)
+    claim_error = await moderation_queue.claim_review(bot, review_id, callback.from_user.id)
+    if claim_error:
+        await callback.answer(claim_error, show_alert=True)
+        return
+    lease_error = await moderation_queue.complete_review(review_id, callback.from_user.id)
+    if lease_error:
+        await callback.answer(lease_error, show_alert=True)
+        return
+
+    try:
+        success, message_text = await admin_logic.approve_final_review_logic(review_id, bot)
+    except Exception:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
+        raise
     await callback.answer(message_text, show_alert=True)
+    if not success:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
     if success and callback.message:
         new_caption = (callback.message.caption or "") + f"\n\n✅ **ОДОБРЕН И ВЫПЛАЧЕН** (@{callback.from_user.username})"
         try:
@@ -1045,14 +1197,28 @@ async def final_verify_reject_handler(callback: CallbackQuery, bot: Bot, state:
         await callback.answer("Ожидание причины для стажера...")
         return
 
-    responsible_admin = await admin_roles.get_other_hold_admin()
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not await admin_roles.is_role_admin(callback.from_user.id, admin_roles.OTHER_HOLD_REVIEW_ADMIN):
+        admin_name = await admin_roles.get_role_admin_names(bot, admin_roles.OTHER_HOLD_REVIEW_ADMIN)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
 
-    success, message_text = await admin_logic.reject_final_review_logic(review_id, bot)
+    claim_error = await moderation_queue.claim_review(bot, review_id, callback.from_user.id)
+    if claim_error:
+        await callback.answer(claim_error, show_alert=True)
+        return
+    lease_error = await moderation_queue.complete_review(review_id, callback.from_user.id)
+    if lease_error:
+        await callback.answer(lease_error, show_alert=True)
+        return
+
+    try:
+        success, message_text = await admin_logic.reject_final_review_logic(review_id, bot)
+    except Exception:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
+        raise
     await callback.answer(message_text, show_alert=True)
+    if not success:
+        await db_manager.release_moderation_task(review_id, callback.from_user.id)
     if success and callback.message:
         new_caption = (callback.message.caption or "") + f"\n\n❌ **ОТКЛОНЕН** (@{callback.from_user.username})"
         try:
@@ -1069,6 +1235,61 @@ async def final_verify_reject_handler(callback: CallbackQuery, bot: Bot, state:
             pass
             
 
+@router.message(Command("next_task"), IsAdmin())
+async def admin_next_task(message: Message, state: FSMContext, bot: Bot):
+    """Выдает админу самую старую свободную задачу из очереди модерации по его ролям."""
+    try:
+        await message.delete()
+    except TelegramBadRequest:
+        pass
+    await state.clear()
+
+    task_types = await moderation_queue.get_admin_task_types(message.from_user.id)
+    if not task_types:
+        msg = await message.answer("За вами не закреплено ни одной роли финальной проверки.")
+        asyncio.create_task(schedule_message_deletion(msg, Durations.DELETE_ADMIN_REPLY_DELAY))
+        return
+
+    item, review = await moderation_queue.claim_next_review(message.from_user.id, task_types)
+    if not item:
+        msg = await message.answer("✅ Очередь пуста: свободных задач нет.")
+        asyncio.create_task(schedule_message_deletion(msg, Durations.DELETE_ADMIN_REPLY_DELAY))
+        return
+
+    username = f"@{review.user.username}" if review.user and review.user.username else "нет юзернейма"
+    link_url = review.link.url if review.link else "Ссылка не найдена"
+    task_name = moderation_queue.TASK_TYPE_NAMES.get(item.task_type, item.task_type)
+    caption = (
+        f"📥 <b>{task_name}</b> (отзыв #{review.id})\n"
+        f"Пользователь: {username} (ID: <code>{review.user_id}</code>)\n"
+        f"Ссылка: <code>{link_url}</code>\n"
+        f"Закреплено за вами на {ModerationQueue.LEASE_MINUTES} мин."
+    )
+    if review.review_text:
+        caption += f"\n\nТекст: <i>{review.review_text}</i>"
+
+    if item.task_type == "other_hold_check":
+        photo_id = review.confirmation_screenshot_file_id or review.screenshot_file_id
+        keyboard = inline.get_admin_final_verification_keyboard(review.id)
+    else:
+        photo_id = review.screenshot_file_id
+        keyboard = inline.get_admin_final_verdict_keyboard(review.id)
+
+    try:
+        if photo_id:
+            sent = await message.answer_photo(photo=photo_id, caption=caption[:1024], reply_markup=keyboard)
+        else:
+            sent = await message.answer(caption, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Failed to send queued review {review.id} to admin {message.from_user.id}: {e}")
+        await db_manager.release_moderation_task(review.id, message.from_user.id)
+        await message.answer("Не удалось показать задачу, она возвращена в очередь.")
+        return
+
+    await db_manager.db_update_review_admin_message_id(review.id, sent.message_id)
+    queue_tracker.assign(message.from_user.id, sent.message_id)
+
+
 # --- БЛОК УПРАВЛЕНИЯ НАГРАДАМИ СТАТИСТИКИ ---
 
 async def show_reward_settings_menu(message_or_callback: Union[Message, CallbackQuery], state: FSMContext):
@@ -1408,6 +1629,11 @@ async def admin_process_review_text(message: Message, state: FSMContext, bot: Bo
             return
         review_text = message.text
 
+    duplicate_warning = text_similarity.get_duplicate_text_warning(review_text)
+    if duplicate_warning:
+        await message.answer(f"❌ {duplicate_warning}\n\nИзмените текст и отправьте его заново.")
+        return
+
     original_message_id = data.get("original_message_id")
     if original_message_id:
         try:
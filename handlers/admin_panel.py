@@ -10,9 +10,9 @@ from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import StorageKey
-from aiogram.types import CallbackQuery, Message
+from aiogram.types import BufferedInputFile, CallbackQuery, Message
 
-from config import Durations, Limits
+from config import Durations, Limits, PromoCodes
 from database import db_manager
 from keyboards import inline
 # --- ИСПРАВЛЕНИЕ: Добавлены недостающие импорты ---
@@ -20,6 +20,7 @@ from logic.admin_logic import (apply_fine_to_user, format_banned_user_page,
                                format_complaints_page, format_promo_code_page,
                                get_unban_requests_page, get_user_hold_info_logic,
                                process_unban_request_logic)
+from logic import moderation_queue, promo_batches
 from states.user_states import AdminState
 from utils.access_filters import IsAdmin, IsSuperAdmin
 
@@ -79,7 +80,8 @@ async def show_pending_tasks(message: Message, state: FSMContext):
         "📥 <b>Задачи, ожидающие внимания:</b>\n\n"
         f"➡️ <b>Отзывы на проверку:</b> {tasks_count['reviews']} шт.\n"
         f"➡️ <b>Открытые тикеты поддержки:</b> {tasks_count['tickets']} шт.\n\n"
-        "<i>Используйте соответствующие разделы для обработки.</i>"
+        f"{await moderation_queue.format_queue_stats()}\n\n"
+        "<i>Используйте соответствующие разделы для обработки или /next_task, чтобы взять следующую задачу.</i>"
     )
     
     msg = await message.answer(text)
@@ -142,6 +144,22 @@ async def panel_actions(callback: CallbackQuery, state: FSMContext):
     elif action == "promo_list":
         await state.set_state(AdminState.PROMO_LIST_VIEW)
         await show_promo_codes_page(callback, state, 1)
+    elif action == "generate_promos":
+        await state.set_state(AdminState.PROMO_BATCH_PARAMS)
+        prompt = await callback.message.edit_text(
+            "Введите через пробел метку пачки, количество кодов и награду, например:\n"
+            "<code>AUTUMN 500 10</code>\n\n"
+            f"Метка - латиница, цифры и _ (до 16 символов), кодов - не больше {PromoCodes.BATCH_MAX_COUNT}. "
+            "Каждый код одноразовый.",
+            reply_markup=inline.get_cancel_inline_keyboard("panel:manage_promos")
+        )
+        await state.update_data(prompt_message_id=prompt.message_id)
+    elif action == "promo_batches":
+        stats = (await db_manager.get_promo_batch_stats())[:promo_batches.BATCHES_SHOWN]
+        await callback.message.edit_text(
+            promo_batches.format_batch_stats(stats),
+            reply_markup=inline.get_promo_batches_keyboard([row[0] for row in stats])
+        )
 
     # Меню жалоб (внутри штрафов)
     elif action == "view_complaints":
@@ -370,6 +388,46 @@ async def promo_condition_selected(callback: CallbackQuery, state: FSMContext):
         await callback.message.edit_text("❌ Произошла ошибка при создании промокода.", reply_markup=inline.get_back_to_panel_keyboard("panel:manage_promos"))
     await state.clear()
     
+@router.message(AdminState.PROMO_BATCH_PARAMS, IsSuperAdmin())
+async def promo_batch_params_entered(message: Message, state: FSMContext):
+    if not message.text: return
+    await delete_previous_messages(message, state)
+    try:
+        batch_tag, count_text, reward_text = message.text.split()
+        batch_tag, count, reward = batch_tag.upper(), int(count_text), float(reward_text.replace(',', '.'))
+        if not promo_batches.BATCH_TAG_PATTERN.match(batch_tag) or not 0 < count <= PromoCodes.BATCH_MAX_COUNT or reward <= 0:
+            raise ValueError
+    except ValueError:
+        prompt_msg = await message.answer(
+            f"❌ Неверный формат. Пример: <code>AUTUMN 500 10</code> (кодов от 1 до {PromoCodes.BATCH_MAX_COUNT}, награда больше нуля).",
+            reply_markup=inline.get_cancel_inline_keyboard("panel:manage_promos")
+        )
+        await state.update_data(prompt_message_id=prompt_msg.message_id)
+        return
+    await state.clear()
+
+    status_msg = await message.answer(f"⏳ Генерирую {count} кодов пачки <code>{batch_tag}</code>...")
+    codes = await promo_batches.generate_promo_batch(batch_tag, count, reward)
+    if codes is None:
+        await status_msg.edit_text(
+            f"❌ Пачка <code>{batch_tag}</code> уже существует. Выберите другую метку.",
+            reply_markup=inline.get_back_to_panel_keyboard("panel:manage_promos")
+        )
+        return
+    csv_bytes = await promo_batches.export_batch_csv(batch_tag)
+    await status_msg.edit_text(
+        f"✅ Пачка <code>{batch_tag}</code>: создано {len(codes)} из {count} кодов по {reward} ⭐.",
+        reply_markup=inline.get_back_to_panel_keyboard("panel:manage_promos")
+    )
+    await message.answer_document(BufferedInputFile(csv_bytes, filename=f"promo_{batch_tag}.csv"))
+
+@router.callback_query(F.data.startswith("promo_batch_export:"), IsSuperAdmin())
+async def promo_batch_export(callback: CallbackQuery):
+    batch_tag = callback.data.split(":", 1)[1]
+    await callback.answer("Готовлю файл...")
+    csv_bytes = await promo_batches.export_batch_csv(batch_tag)
+    await callback.message.answer_document(BufferedInputFile(csv_bytes, filename=f"promo_{batch_tag}.csv"))
+
 @router.message(AdminState.BAN_USER_IDENTIFIER, IsSuperAdmin())
 async def ban_user_get_identifier(message: Message, state: FSMContext):
     if not message.text: return
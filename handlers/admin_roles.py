@@ -9,10 +9,11 @@ from aiogram.exceptions import TelegramBadRequest
 from math import ceil
 import asyncio
 
-from config import ADMIN_ID_1, ADMIN_ID_2, SUPER_ADMIN_ID
+from config import ADMIN_ID_2, SUPER_ADMIN_ID
 from keyboards import inline
 from database import db_manager
 from logic import admin_roles
+from logic.admin_routing import queue_tracker
 from utils.access_filters import IsSuperAdmin
 from states.user_states import AdminState
 
@@ -112,49 +113,52 @@ async def roles_back_to_yandex_cat(callback: CallbackQuery):
     
 # --- Логика переключения и отображения ---
 
-@router.callback_query(F.data.startswith("roles_switch:"))
-async def roles_switch_admin_start(callback: CallbackQuery, bot: Bot):
-    """Начинает процесс смены админа, показывая список доступных."""
-    role_key = callback.data.split(":", 1)[1]
-    
+async def _show_role_settings(callback: CallbackQuery, bot: Bot, role_key: str):
+    """Показывает состав роли и стратегию распределения задач."""
     all_admins = await db_manager.get_all_administrators_by_role()
-    current_admin_id_str = await db_manager.get_system_setting(role_key)
-    current_admin_id = int(current_admin_id_str) if current_admin_id_str else ADMIN_ID_1
-    
+    role_admins, strategy = await admin_roles.get_role_config(role_key)
     task_description = admin_roles.ROLE_DESCRIPTIONS.get(role_key, "Неизвестная задача")
     
     await callback.message.edit_text(
-        f"Выберите нового ответственного для задачи:\n**«{task_description}»**",
-        reply_markup=await inline.get_admin_selection_keyboard(all_admins, role_key, current_admin_id, bot)
+        f"Ответственные за задачу:\n**«{task_description}»**\n\n"
+        "Нажмите на администратора, чтобы добавить его в роль или убрать из нее. "
+        "Новые задачи распределяются между всеми ответственными, которые не в режиме «Не беспокоить».",
+        reply_markup=await inline.get_admin_selection_keyboard(all_admins, role_key, role_admins, strategy, bot)
     )
+
+@router.callback_query(F.data.startswith("roles_switch:"))
+async def roles_switch_admin_start(callback: CallbackQuery, bot: Bot):
+    """Открывает настройку состава роли."""
+    role_key = callback.data.split(":", 1)[1]
+    await _show_role_settings(callback, bot, role_key)
     await callback.answer()
 
 @router.callback_query(F.data.startswith("roles_set_admin:"))
 async def roles_set_new_admin(callback: CallbackQuery, bot: Bot):
-    """Устанавливает нового админа для роли."""
-    _, role_key, new_admin_id_str = callback.data.split(":")
-    new_admin_id = int(new_admin_id_str)
-    
-    current_admin_id_str = await db_manager.get_system_setting(role_key)
-    current_admin_id = int(current_admin_id_str) if current_admin_id_str else ADMIN_ID_1
-    
-    if new_admin_id == current_admin_id:
-        await callback.answer("Этот администратор уже назначен на эту роль.", show_alert=True)
-        return
-
-    await db_manager.set_system_setting(role_key, str(new_admin_id))
+    """Добавляет админа в роль или убирает его из нее."""
+    _, role_key, admin_id_str = callback.data.split(":")
+    admin_id = int(admin_id_str)
     
-    await callback.answer("Ответственный изменен!")
+    role_admins, _ = await admin_roles.get_role_config(role_key)
+    if admin_id in role_admins:
+        if len(role_admins) == 1:
+            await callback.answer("Это единственный ответственный. Сначала добавьте другого администратора.", show_alert=True)
+            return
+        del role_admins[admin_id]
+        action_text = "больше не выполняет"
+    else:
+        role_admins[admin_id] = 1
+        action_text = "теперь тоже выполняет"
 
-    category, subcategory = admin_roles.get_category_from_role_key(role_key)
+    await admin_roles.set_role_admins(role_key, role_admins)
+    await callback.answer("Состав роли изменен!")
 
-    new_admin_name = await admin_roles.get_admin_username(bot, new_admin_id)
-    old_admin_name = await admin_roles.get_admin_username(bot, current_admin_id)
+    admin_name = await admin_roles.get_admin_username(bot, admin_id)
     task_description = admin_roles.ROLE_DESCRIPTIONS.get(role_key, "Неизвестная задача")
 
     notification_text = (
         f"🔄 **Смена ролей!**\n\n"
-        f"Задача «**{task_description}**» была передана от {old_admin_name} к {new_admin_name}."
+        f"{admin_name} {action_text} задачу «**{task_description}**»."
     )
     
     all_db_admins = await db_manager.get_all_administrators_by_role()
@@ -164,27 +168,45 @@ async def roles_set_new_admin(callback: CallbackQuery, bot: Bot):
         except Exception as e:
             logger.warning(f"Не удалось уведомить админа {admin.user_id} о смене роли: {e}")
     
-    # Возвращаемся в меню выбора задач
-    title_map = {"text": "📝 Яндекс (с текстом)", "no_text": "🚫 Яндекс (без текста)"}
-    category_title_map = {"google": "🌍 Google Maps", "gmail": "📧 Gmail", "other": "📦 Другие задачи"}
+    await _show_role_settings(callback, bot, role_key)
 
-    title = ""
-    if category == "yandex":
-        title = title_map.get(subcategory)
-    else:
-        title = category_title_map.get(category)
-        
-    await callback.message.edit_text(
-        f"**{title}**\n\nНажмите на задачу, чтобы сменить ответственного.",
-        reply_markup=await inline.get_task_switching_keyboard(bot, category, subcategory)
-    )
+@router.callback_query(F.data.startswith("roles_weight:"))
+async def roles_change_weight(callback: CallbackQuery, bot: Bot):
+    """Переключает вес админа в роли для распределения по весам."""
+    _, role_key, admin_id_str = callback.data.split(":")
+    admin_id = int(admin_id_str)
+
+    role_admins, _ = await admin_roles.get_role_config(role_key)
+    if admin_id not in role_admins:
+        await callback.answer("Администратор не входит в эту роль.", show_alert=True)
+        return
+    weights = [1, 2, 3, 5]
+    current = role_admins[admin_id]
+    role_admins[admin_id] = weights[(weights.index(current) + 1) % len(weights)] if current in weights else 1
+
+    await admin_roles.set_role_admins(role_key, role_admins)
+    await callback.answer(f"Вес: {role_admins[admin_id]}")
+    await _show_role_settings(callback, bot, role_key)
+
+@router.callback_query(F.data.startswith("roles_strategy:"))
+async def roles_change_strategy(callback: CallbackQuery, bot: Bot):
+    """Переключает стратегию распределения задач роли."""
+    role_key = callback.data.split(":", 1)[1]
+
+    _, strategy = await admin_roles.get_role_config(role_key)
+    strategies = list(admin_roles.ROUTING_STRATEGIES)
+    new_strategy = strategies[(strategies.index(strategy) + 1) % len(strategies)]
+
+    await admin_roles.set_role_strategy(role_key, new_strategy)
+    await callback.answer(f"Распределение: {admin_roles.ROUTING_STRATEGIES[new_strategy]}")
+    await _show_role_settings(callback, bot, role_key)
 
 @router.callback_query(F.data == "roles_show_current")
 async def roles_show_current_settings(callback: CallbackQuery, bot: Bot):
     """Показывает отдельное сообщение с текущими настройками."""
     await callback.answer("Загружаю настройки...", show_alert=False)
     # Вызываем оптимизированную функцию
-    settings_text = await admin_roles.get_all_roles_readable_optimized(bot)
+    settings_text = await admin_roles.get_all_roles_readable_optimized(bot, queue_depths=queue_tracker.snapshot())
     await callback.message.answer(
         settings_text,
         reply_markup=inline.get_current_settings_keyboard()
@@ -1,5 +1,6 @@
 # file: handlers/admin_stats.py
 
+import datetime
 import logging
 from aiogram import Router, F
 from aiogram.filters import Command
@@ -8,6 +9,7 @@ from aiogram.types import Message, CallbackQuery
 from database import db_manager
 from keyboards import inline
 from utils.access_filters import IsSuperAdmin
+from utils import metrics
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -40,6 +42,46 @@ async def get_admin_stats(message: Message):
     )
     await message.answer(text, reply_markup=inline.get_close_post_keyboard())
 
+@router.message(Command("metrics"), IsSuperAdmin())
+async def show_metrics(message: Message):
+    """Показывает внутренние метрики процесса (кэши, тайминги)."""
+    try:
+        await message.delete()
+    except:
+        pass
+
+    await message.answer(metrics.format_snapshot(), reply_markup=inline.get_close_post_keyboard())
+
+@router.message(Command("balance_at"), IsSuperAdmin())
+async def show_balance_at(message: Message):
+    """Баланс пользователя по книге проводок на заданный момент (UTC)."""
+    args = message.text.split()
+    usage = "Использование: <code>/balance_at ID_или_@username ГГГГ-ММ-ДД [ЧЧ:ММ]</code> (время UTC)"
+    if len(args) < 3:
+        await message.answer(usage)
+        return
+    try:
+        at = datetime.datetime.strptime(" ".join(args[2:4]), "%Y-%m-%d %H:%M" if len(args) > 3 else "%Y-%m-%d")
+    except ValueError:
+        await message.answer(usage)
+        return
+    if len(args) == 3:
+        at += datetime.timedelta(days=1)  # дата без времени - баланс на конец дня
+
+    user_id = await db_manager.find_user_by_identifier(args[1])
+    if not user_id:
+        await message.answer(f"❌ Пользователь <code>{args[1]}</code> не найден.")
+        return
+
+    balance = await db_manager.get_ledger_balance_at(db_manager.ledger_account("user", user_id), at)
+    hold = await db_manager.get_ledger_balance_at(db_manager.ledger_account("hold", user_id), at)
+    await message.answer(
+        f"📒 <b>Баланс <code>{user_id}</code> на {at:%Y-%m-%d %H:%M} UTC</b>\n\n"
+        f"Основной: <code>{balance:.2f} ⭐</code>\n"
+        f"В холде: <code>{hold:.2f} ⭐</code>",
+        reply_markup=inline.get_close_post_keyboard()
+    )
+
 @router.message(Command("campaigns"), IsSuperAdmin())
 async def list_campaigns(message: Message):
     """Показывает список кампаний для просмотра статистики."""
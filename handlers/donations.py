@@ -72,7 +72,9 @@ async def process_donation_amount(message: Message, state: FSMContext, bot: Bot)
         await message.answer("❌ Недостаточно средств на балансе!")
         return
         
-    await db_manager.process_donation(message.from_user.id, amount)
+    if not await db_manager.process_donation(message.from_user.id, amount):
+        await message.answer("❌ Недостаточно средств на балансе!")
+        return
     
     await message.answer(f"💖 Спасибо за ваше пожертвование в {amount:.2f} ⭐! Ваша помощь очень ценна для новичков.")
     
@@ -34,6 +34,8 @@ from logic.user_notifications import (
 from utils.tester_filter import IsTester
 from logic import admin_roles
 from logic.notification_manager import send_notification_to_admins
+from logic.admin_routing import route_task, queue_tracker
+from logic.screenshot_index import get_duplicate_warning
 from logic.notification_logic import notify_subscribers
 
 router = Router()
@@ -678,6 +680,11 @@ async def process_google_review_screenshot(message: Message, state: FSMContext,
         if not review_id:
             raise Exception("Failed to create or update review draft in DB.")
 
+        duplicate_warning = await get_duplicate_warning(bot, review_id, user_id, photo_file_id)
+        if duplicate_warning:
+            caption += f"\n\n{duplicate_warning}"
+
+        await db_manager.enqueue_moderation_task(review_id, "google_final_verdict")
         sent_message_list = await send_notification_to_admins(
             bot,
             text=caption,
@@ -689,8 +696,9 @@ async def process_google_review_screenshot(message: Message, state: FSMContext,
             original_user_id=message.from_user.id
         )
         
-        if sent_message_list:
-            await db_manager.db_update_review_admin_message_id(review_id, sent_message_list[0].message_id)
+        first_sent = next((sent_msg for sent_msg in sent_message_list or [] if sent_msg), None)
+        if first_sent:
+            await db_manager.db_update_review_admin_message_id(review_id, first_sent.message_id)
         else:
             logger.warning(f"No admin received notification for review {review_id}. Admin message ID not updated.")
 
@@ -1128,9 +1136,14 @@ async def process_yandex_review_screenshot(message: Message, state: FSMContext,
 
         if not review_id:
             raise Exception("Failed to create or update review draft in DB.")
+
+        duplicate_warning = await get_duplicate_warning(bot, review_id, user_id, photo_file_id)
+        if duplicate_warning:
+            caption += f"\n\n{duplicate_warning}"
         
         task_type = "yandex_with_text_final_verdict" if review_type == "with_text" else "yandex_without_text_final_verdict"
 
+        await db_manager.enqueue_moderation_task(review_id, task_type)
         sent_message_list = await send_notification_to_admins(
             bot,
             text=caption,
@@ -1142,8 +1155,9 @@ async def process_yandex_review_screenshot(message: Message, state: FSMContext,
             original_user_id=message.from_user.id
         )
         
-        if sent_message_list:
-            await db_manager.db_update_review_admin_message_id(review_id, sent_message_list[0].message_id)
+        first_sent = next((sent_msg for sent_msg in sent_message_list or [] if sent_msg), None)
+        if first_sent:
+            await db_manager.db_update_review_admin_message_id(review_id, first_sent.message_id)
         else:
             logger.warning(f"No admin received notification for review {review_id}. Admin message ID not updated.")
 
@@ -1204,6 +1218,7 @@ async def process_confirmation_screenshot(message: Message, state: FSMContext, b
     
     new_screenshot_file_id = message.photo[-1].file_id
     await db_manager.save_confirmation_screenshot(review_id, new_screenshot_file_id)
+    await db_manager.enqueue_moderation_task(review_id, "other_hold_check")
     
     admin_text = (
         f"🚨 <b>Подтверждение отзыва</b> 🚨\n\n"
@@ -1211,6 +1226,9 @@ async def process_confirmation_screenshot(message: Message, state: FSMContext, b
         f"<b>Ссылка на место:</b> <a href='{review.link.url if review.link else ''}'>Перейти</a>\n\n"
         "Пожалуйста, сравните два скриншота (старый и новый) и примите решение."
     )
+    duplicate_warning = await get_duplicate_warning(bot, review_id, message.from_user.id, new_screenshot_file_id, kind='confirmation')
+    if duplicate_warning:
+        admin_text += f"\n\n{duplicate_warning}"
 
     media_group = [
         InputMediaPhoto(media=new_screenshot_file_id, caption=admin_text),
@@ -1218,10 +1236,9 @@ async def process_confirmation_screenshot(message: Message, state: FSMContext, b
     ]
 
     try:
-        admin_id = await admin_roles.get_other_hold_admin()
+        admin_id = await route_task("other_hold_check")
         
-        admin_obj = await db_manager.get_user(admin_id)
-        if admin_obj and not admin_obj.dnd_enabled:
+        if admin_id:
             sent_messages = await bot.send_media_group(
                 chat_id=admin_id,
                 media=media_group
@@ -1234,13 +1251,14 @@ async def process_confirmation_screenshot(message: Message, state: FSMContext, b
                         message_id=sent_messages[0].message_id,
                         reply_markup=inline.get_admin_final_verification_keyboard(review_id)
                     )
+                    queue_tracker.assign(admin_id, sent_messages[0].message_id)
                 except TelegramBadRequest as e:
                     if "message is not modified" not in str(e).lower():
                         raise e
                     else:
                         logger.warning("Ignored 'message is not modified' error when adding keyboard to media group.")
         else:
-            logger.warning(f"Admin {admin_id} is in DND mode. Notification for confirmation screenshot for review {review_id} not sent.")
+            logger.warning(f"All admins for hold review check are in DND mode. Notification for confirmation screenshot for review {review_id} not sent.")
 
     except Exception as e:
         logger.error(f"Не удалось отправить файлы для финальной проверки отзыва {review_id} админу: {e}")
@@ -1,21 +1,42 @@
 # file: handlers/games/coinflip.py
 
 import logging
+import math
 import random
 import asyncio
+import time
 from aiogram import Router, F, Bot
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 from aiogram.exceptions import TelegramBadRequest
-from typing import Union
+from typing import Optional, Set, Union
 
+from config import COINFLIP_MIN_BET
 from states.user_states import CoinflipStates
 from keyboards import inline
 from database import db_manager
+from utils import metrics
+from utils.money import Stars
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+COINFLIP_ANIMATION_SECONDS = 1.5
+# Пользователи, чья монетка сейчас в воздухе: двойное нажатие не должно разыграть ставку дважды
+_flips_in_progress: Set[int] = set()
+
+
+def _parse_bet(raw: str) -> Optional[float]:
+    """Сумма ставки из текста или кнопки, округленная до сотых; None, если это не число или меньше минимума."""
+    try:
+        amount = float(raw.replace(",", "."))
+    except ValueError:
+        return None
+    # nan и inf проходят сравнение с нулем, но не влезут в NUMERIC при расчете
+    if not math.isfinite(amount) or Stars(amount) < COINFLIP_MIN_BET:
+        return None
+    return float(Stars(amount))
+
 # --- Обработчики игры "Орёл и Решка" ---
 
 @router.message(F.text == '🎲 Игры')
@@ -34,22 +55,21 @@ async def back_to_games_menu(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "start_coinflip")
 async def start_coinflip(callback: CallbackQuery, state: FSMContext):
     await state.set_state(CoinflipStates.waiting_for_bet)
-    user = await db_manager.get_user(callback.from_user.id)
-    win_streak_text = f"\n\n🔥 Ваша серия побед: {user.win_streak}" if user and user.win_streak > 0 else ""
-    
-    balance, _ = await db_manager.get_user_balance(callback.from_user.id)
+    balance, win_streak = await db_manager.get_balance_and_streak(callback.from_user.id) or (0.0, 0)
+    win_streak_text = f"\n\n🔥 Ваша серия побед: {win_streak}" if win_streak > 0 else ""
     
     await callback.message.edit_text(
         f"Добро пожаловать в 'Орёл и Решка'!\nВаш баланс: **{balance:.2f} ⭐**\n\n"
         "Какую сумму вы хотите поставить? "
         "Учтите, что выигрыш удваивается." + win_streak_text,
-        reply_markup=inline.get_coinflip_bet_keyboard(win_streak=user.win_streak if user else 0)
+        reply_markup=inline.get_coinflip_bet_keyboard(win_streak=win_streak)
     )
 
 async def process_bet(message: Message, state: FSMContext, amount: float):
     user_id = message.chat.id
-    user = await db_manager.get_user(user_id)
-    if not user or user.balance < amount:
+    # Предварительная проверка только для подсказки: окончательно баланс проверяется при расчете ставки
+    balance, _ = await db_manager.get_balance_and_streak(user_id) or (0.0, 0)
+    if balance < amount:
         await message.answer("❌ Недостаточно средств на балансе!")
         # Имитируем callback, чтобы вернуться в меню ставок
         dummy_callback = CallbackQuery(id="dummy", from_user=message.from_user, chat_instance="", message=message)
@@ -66,7 +86,10 @@ async def process_bet(message: Message, state: FSMContext, amount: float):
 
 @router.callback_query(F.data.startswith("bet_"), CoinflipStates.waiting_for_bet)
 async def handle_fixed_bet(callback: CallbackQuery, state: FSMContext):
-    amount = float(callback.data.split("_")[1])
+    amount = _parse_bet(callback.data.split("_")[1])
+    if amount is None:
+        await callback.answer("Ошибка: некорректная ставка.", show_alert=True)
+        return
     await process_bet(callback.message, state, amount)
 
 @router.callback_query(F.data == "custom_bet", CoinflipStates.waiting_for_bet)
@@ -80,11 +103,9 @@ async def handle_custom_bet_input(message: Message, state: FSMContext, bot: Bot)
     data = await state.get_data()
     prompt_id = data.get("prompt_message_id")
 
-    try:
-        amount = float(message.text.replace(",", "."))
-        if amount <= 0: raise ValueError
-    except ValueError:
-        await message.answer("❌ Некорректная сумма. Пожалуйста, введите положительное число.")
+    amount = _parse_bet(message.text or "")
+    if amount is None:
+        await message.answer(f"❌ Некорректная сумма. Введите число не меньше {COINFLIP_MIN_BET:.2f}.")
         await message.delete()
         return
 
@@ -105,48 +126,46 @@ async def handle_custom_bet_input(message: Message, state: FSMContext, bot: Bot)
         await process_bet(new_msg, state, amount)
 
 
-@router.callback_query(F.data.startswith("choice_"), CoinflipStates.waiting_for_choice)
-async def handle_coinflip_choice(callback: CallbackQuery, state: FSMContext, bot: Bot):
-    user_choice = "Орёл" if callback.data == "choice_eagle" else "Решка"
-    data = await state.get_data()
-    bet_amount = data.get("current_bet_amount")
-
-    if not bet_amount:
-        await callback.answer("Ошибка: не найдена сумма ставки. Начните заново.", show_alert=True)
-        await state.clear()
-        await start_coinflip(callback, state)
+async def play_coinflip(callback: CallbackQuery, state: FSMContext, bet_amount: float, choice: str):
+    """
+    Разыгрывает ставку. Ставка рассчитывается до анимации одним запросом к БД;
+    пока монетка в воздухе, повторные нажатия этого пользователя отклоняются.
+    """
+    user_id = callback.from_user.id
+    if user_id in _flips_in_progress:
+        await callback.answer("Монетка еще в воздухе!")
         return
+    _flips_in_progress.add(user_id)
+    try:
+        user_choice = "Орёл" if choice == "eagle" else "Решка"
+        is_win = random.choice([True, False])
+        final_side = user_choice if is_win else ("Решка" if user_choice == "Орёл" else "Орёл")
+
+        started = time.perf_counter()
+        settlement = await db_manager.settle_coinflip(user_id, bet_amount, is_win)
+        metrics.observe("coinflip.settle_seconds", time.perf_counter() - started)
+        if settlement is None:
+            await state.set_state(CoinflipStates.waiting_for_bet)
+            await callback.message.edit_text(
+                "❌ Недостаточно средств для этой ставки.",
+                reply_markup=inline.get_coinflip_bet_keyboard(play_again=True)
+            )
+            return
+        metrics.increment("coinflip.flips")
+        new_balance, new_win_streak = settlement
+        await state.set_state(CoinflipStates.waiting_for_bet)
+
+        await callback.message.edit_text("Монетка в воздухе...")
+        await asyncio.sleep(COINFLIP_ANIMATION_SECONDS)
+    finally:
+        _flips_in_progress.discard(user_id)
 
-    user = await db_manager.get_user(callback.from_user.id)
-    win_streak = user.win_streak if user else 0
-
-    is_win = random.choice([True, False])
-    
-    final_side = user_choice if is_win else ("Решка" if user_choice == "Орёл" else "Орёл")
-    await callback.message.edit_text("Монетка в воздухе...")
-    await asyncio.sleep(1.5)
-
-    result_text = ""
     if is_win:
-        new_win_streak = win_streak + 1
-        win_amount = bet_amount 
-        
-        await db_manager.update_user_balance_and_streak(user.id, win_amount, new_win_streak)
-        new_balance = user.balance + win_amount
-
         result_text = f"Выпал **{final_side}**! Вы победили!\n"
-        result_text += f"Ваш выигрыш: **{win_amount:.2f} ⭐**\nНовая серия побед: **{new_win_streak}**"
-
+        result_text += f"Ваш выигрыш: **{bet_amount:.2f} ⭐**\nНовая серия побед: **{new_win_streak}**"
     else:
-        new_win_streak = 0
-        loss_amount = -bet_amount
-        await db_manager.update_user_balance_and_streak(user.id, loss_amount, new_win_streak)
-        new_balance = user.balance + loss_amount
-
         result_text = f"Выпал **{final_side}**! Вы проиграли **{bet_amount:.2f} ⭐**...\nВаша серия побед сброшена."
 
-    await state.set_state(CoinflipStates.waiting_for_bet)
-    
     win_streak_text = f"\n\n🔥 Ваша серия побед: **{new_win_streak}**" if new_win_streak > 0 else ""
     balance_text = f"\nВаш баланс: **{new_balance:.2f} ⭐**"
     
@@ -154,5 +173,33 @@ async def handle_coinflip_choice(callback: CallbackQuery, state: FSMContext, bot
     
     await callback.message.edit_text(
         result_text, 
-        reply_markup=inline.get_coinflip_bet_keyboard(play_again=True, win_streak=new_win_streak)
-    )
\ No newline at end of file
+        reply_markup=inline.get_coinflip_bet_keyboard(play_again=True, win_streak=new_win_streak, last_bet=bet_amount, last_choice=choice)
+    )
+
+
+@router.callback_query(F.data.startswith("choice_"), CoinflipStates.waiting_for_choice)
+async def handle_coinflip_choice(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    bet_amount = data.get("current_bet_amount")
+
+    if not bet_amount:
+        await callback.answer("Ошибка: не найдена сумма ставки. Начните заново.", show_alert=True)
+        await state.clear()
+        await start_coinflip(callback, state)
+        return
+
+    await play_coinflip(callback, state, bet_amount, callback.data.split("_")[1])
+
+
+@router.callback_query(F.data.startswith("coinflip_repeat:"), CoinflipStates.waiting_for_bet)
+async def handle_coinflip_repeat(callback: CallbackQuery, state: FSMContext):
+    """Повтор последней ставки: сумма и сторона берутся из кнопки, расчет - один запрос к БД."""
+    try:
+        _, choice, raw_amount = callback.data.split(":")
+    except ValueError:
+        choice, raw_amount = None, ""
+    amount = _parse_bet(raw_amount)
+    if amount is None or choice not in ("eagle", "tails"):
+        await callback.answer("Ошибка: некорректная ставка. Начните заново.", show_alert=True)
+        return
+    await play_coinflip(callback, state, amount, choice)
@@ -14,7 +14,7 @@ from states.user_states import UserState, AdminState
 from keyboards import inline, reply
 from database import db_manager
 from config import Rewards, Durations
-from logic.user_notifications import format_timedelta, send_cooldown_expired_notification
+from logic.user_notifications import format_timedelta
 from logic.promo_logic import check_and_apply_promo_reward
 from logic.gmail_logic import parse_gmail_data
 from logic import admin_roles
@@ -362,9 +362,8 @@ async def process_admin_gmail_data(message: Message, state: FSMContext, bot: Bot
 async def admin_confirm_gmail_account(callback: CallbackQuery, bot: Bot, scheduler: AsyncIOScheduler):
     user_id = int(callback.data.split(':')[1])
     
-    responsible_admin = await admin_roles.get_gmail_final_admin()
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not await admin_roles.is_role_admin(callback.from_user.id, admin_roles.GMAIL_FINAL_CHECK_ADMIN):
+        admin_name = await admin_roles.get_role_admin_names(bot, admin_roles.GMAIL_FINAL_CHECK_ADMIN)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
         
@@ -381,7 +380,7 @@ async def admin_confirm_gmail_account(callback: CallbackQuery, bot: Bot, schedul
         if referrer and referrer.referral_path == 'gmail':
             referral_reward_amount = Rewards.GMAIL_FOR_REFERRAL_USER * (Rewards.REFERRAL_REWARD_PERCENT / 100.0) # Calculate percentage reward
             reward_amount = Rewards.GMAIL_FOR_REFERRAL_USER
-            await db_manager.add_referral_earning(referrer.id, referral_reward_amount) # Add to referrer's earnings
+            await db_manager.add_referral_earning(referrer.id, user.id, referral_reward_amount) # Add to referrer's earnings
             try:
                 await bot.send_message(
                     referrer.id,
@@ -393,14 +392,7 @@ async def admin_confirm_gmail_account(callback: CallbackQuery, bot: Bot, schedul
 
     await db_manager.update_balance(user_id, reward_amount, op_type="PROMO_ACTIVATED", description="Создание Gmail аккаунта")
     
-    cooldown_end_time = await db_manager.set_platform_cooldown(user_id, "gmail", Durations.COOLDOWN_GMAIL_HOURS)
-    if cooldown_end_time:
-        scheduler.add_job(
-            send_cooldown_expired_notification, 
-            'date', 
-            run_date=cooldown_end_time, 
-            args=[bot, user_id, "gmail"]
-        )
+    await db_manager.set_platform_cooldown(user_id, "gmail", Durations.COOLDOWN_GMAIL_HOURS)
     
     await check_and_apply_promo_reward(user_id, "gmail_account", bot)
     
@@ -421,20 +413,12 @@ async def admin_confirm_gmail_account(callback: CallbackQuery, bot: Bot, schedul
 async def admin_reject_gmail_account(callback: CallbackQuery, state: FSMContext, bot: Bot, scheduler: AsyncIOScheduler):
     user_id = int(callback.data.split(':')[1])
     
-    responsible_admin = await admin_roles.get_gmail_final_admin()
-    if callback.from_user.id != responsible_admin:
-        admin_name = await admin_roles.get_admin_username(bot, responsible_admin)
+    if not await admin_roles.is_role_admin(callback.from_user.id, admin_roles.GMAIL_FINAL_CHECK_ADMIN):
+        admin_name = await admin_roles.get_role_admin_names(bot, admin_roles.GMAIL_FINAL_CHECK_ADMIN)
         await callback.answer(f"Эту проверку выполняет {admin_name}", show_alert=True)
         return
 
-    cooldown_end_time = await db_manager.set_platform_cooldown(user_id, "gmail", Durations.COOLDOWN_GMAIL_HOURS)
-    if cooldown_end_time:
-        scheduler.add_job(
-            send_cooldown_expired_notification, 
-            'date', 
-            run_date=cooldown_end_time, 
-            args=[bot, user_id, "gmail"]
-        )
+    await db_manager.set_platform_cooldown(user_id, "gmail", Durations.COOLDOWN_GMAIL_HOURS)
     
     try:
         await callback.answer("Устанавливаю кулдаун пользователю... Введите причину.", show_alert=True)
@@ -2,10 +2,12 @@
 
 import logging
 import json
+import os
+from typing import Optional, Set
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, User, InputMediaPhoto, InputMediaVideo, InputMediaAnimation
+from aiogram.types import Message, CallbackQuery, User, InputMediaPhoto, InputMediaVideo, InputMediaAnimation, FSInputFile
 from aiogram.exceptions import TelegramBadRequest
 
 from states.user_states import UserState
@@ -13,10 +15,15 @@ from keyboards import inline, reply
 from database import db_manager
 from config import WITHDRAWAL_CHANNEL_ID, Limits, TRANSFER_COMMISSION_PERCENT, SUPER_ADMIN_ID
 from logic.user_notifications import format_timedelta
+from logic import operation_history
+from utils.money import Stars
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Пользователи, для которых сейчас готовится выгрузка истории
+_history_exports_in_progress: Set[int] = set()
+
 async def delete_prompt_message(message: Message, state: FSMContext):
     """Удаляет только предыдущее сообщение-приглашение от бота."""
     data = await state.get_data()
@@ -86,44 +93,49 @@ async def go_profile_handler(callback: CallbackQuery, state: FSMContext, bot: Bo
 
 @router.callback_query(F.data == 'profile_history')
 async def show_operation_history(callback: CallbackQuery):
-    """Показывает последние операции пользователя за 24 часа."""
+    """Показывает последние операции пользователя; более ранние листаются по кнопке."""
     await callback.answer()
-    user_id = callback.from_user.id
-    operations = await db_manager.get_operation_history(user_id)
+    await show_operation_history_page(callback, before=None)
 
-    text = "📜 **История операций за последние 24 часа:**\n\n"
-    if not operations:
-        text += "Операций не найдено."
-    else:
-        for op in operations:
-            time_str = op.created_at.strftime('%H:%M:%S UTC')
-            amount_str = f"{op.amount:+.2f} ⭐" if op.amount > 0 else f"{op.amount:.2f} ⭐"
-            
-            op_map = {
-                "REVIEW_APPROVED": "✅ Одобрен отзыв", "PROMO_ACTIVATED": "🎁 Активация промокода",
-                "WITHDRAWAL": "📤 Запрос на вывод", "FINE": "💸 Штраф",
-                "TRANSFER_SENT": "➡️ Перевод звезд", "TRANSFER_RECEIVED": "⬅️ Получение звезд",
-                "TOP_REWARD": "🏆 Награда", "DEPOSIT_OPEN": "🏦 Открыт депозит",
-                "DEPOSIT_CLOSE": "💰 Закрыт депозит", "DONATION": "💖 Пожертвование",
-                "HELP_RECEIVED": "🎁 Помощь новичку"
-            }
-            op_description = op_map.get(op.operation_type, "Неизвестная операция")
-            
-            description_suffix = ""
-            if op.operation_type == "TRANSFER_SENT":
-                description_suffix = f" ({op.description})"
-                if op.comment: description_suffix += " (с комм.)"
-                if op.media_json and op.media_json != '[]': description_suffix += " (с медиа)"
-            elif op.operation_type == "TRANSFER_RECEIVED":
-                sender_info = "Аноним" if op.is_anonymous else (f"от @{op.sender.username}" if op.sender and op.sender.username else f"от ID: {op.sender_id}")
-                description_suffix = f" ({sender_info})"
-            elif op.description:
-                description_suffix = f" ({op.description})"
-
-            text += f"`{time_str}`: {op_description} {amount_str}{description_suffix}\n"
-    
+@router.callback_query(F.data.startswith('history:older:'))
+async def show_older_operations(callback: CallbackQuery):
+    before = operation_history.decode_cursor(callback.data.split(':', 2)[2])
+    await callback.answer()
+    await show_operation_history_page(callback, before=before)
+
+async def show_operation_history_page(callback: CallbackQuery, before: Optional[db_manager.HistoryCursor]):
+    operations, usernames, has_more = await db_manager.get_operation_history_page(callback.from_user.id, before=before)
+    text = operation_history.format_history_page(operations, usernames, is_first_page=before is None)
+    older_cursor = operation_history.encode_cursor(operations[-1]) if has_more else None
     if callback.message:
-        await callback.message.edit_text(text, reply_markup=inline.get_operation_history_keyboard(), parse_mode="HTML")
+        await callback.message.edit_text(
+            text,
+            reply_markup=inline.get_operation_history_keyboard(older_cursor=older_cursor, show_latest=before is not None),
+            parse_mode="HTML"
+        )
+
+@router.callback_query(F.data == 'history:export')
+async def export_operation_history(callback: CallbackQuery):
+    user_id = callback.from_user.id
+    if user_id in _history_exports_in_progress:
+        await callback.answer("Выгрузка уже готовится, подождите.", show_alert=True)
+        return
+    await callback.answer("Готовлю файл с историей...")
+    _history_exports_in_progress.add(user_id)
+    try:
+        path, rows = await operation_history.export_history_csv(user_id)
+        try:
+            if rows:
+                await callback.message.answer_document(
+                    FSInputFile(path, filename="history.csv"),
+                    caption=f"📜 Ваша история операций: {rows} записей."
+                )
+            else:
+                await callback.message.answer("Операций не найдено.")
+        finally:
+            os.remove(path)
+    finally:
+        _history_exports_in_progress.discard(user_id)
 
 # --- Новая логика переводов ---
 
@@ -156,8 +168,8 @@ async def transfer_amount_input(message: Message, state: FSMContext):
         return
     
     balance, _ = await db_manager.get_user_balance(message.from_user.id)
-    commission = amount * (TRANSFER_COMMISSION_PERCENT / 100)
-    total_deduction = amount + commission
+    commission = Stars(amount).percent(TRANSFER_COMMISSION_PERCENT)
+    total_deduction = commission + amount
     if total_deduction > float(balance):
         await delete_prompt_message(message, state)
         await message.delete()
@@ -282,8 +294,8 @@ async def ask_for_transfer_confirmation(message: Message, state: FSMContext):
     amount, recipient_id = data['transfer_amount'], data['recipient_id']
     recipient_user = await db_manager.get_user(recipient_id)
     recipient_info = f"@{recipient_user.username}" if recipient_user and recipient_user.username else f"ID: {recipient_id}"
-    commission = amount * (TRANSFER_COMMISSION_PERCENT / 100)
-    total_to_deduct = amount + commission
+    commission = Stars(amount).percent(TRANSFER_COMMISSION_PERCENT)
+    total_to_deduct = commission + amount
 
     confirmation_text = (
         f"**Подтверждение перевода**\n\n"
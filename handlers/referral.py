@@ -1,5 +1,6 @@
 # file: handlers/referral.py
 
+import datetime
 import logging
 from aiogram import Router, F, Bot
 from aiogram.filters import StateFilter
@@ -10,7 +11,7 @@ from aiogram.exceptions import TelegramBadRequest
 from states.user_states import UserState
 from keyboards import inline
 from database import db_manager
-from config import Rewards
+from config import Referrals, Rewards
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -21,6 +22,7 @@ async def show_selected_referral_path(message_or_callback: Message | CallbackQue
     bot_info = await bot.get_me()
     referral_link = f"https://t.me/{bot_info.username}?start={user_id}"
     referral_earnings = await db_manager.get_referral_earnings(user_id)
+    referrals_count, total_earned, active_count = await db_manager.get_referral_stats(user_id)
 
     path_description = (
         "Приглашайте друзей и получайте **10%** от их заработка за каждый успешно выполненный отзыв на Google и Яндекс картах!"
@@ -32,6 +34,8 @@ async def show_selected_referral_path(message_or_callback: Message | CallbackQue
         f"🔗 **Ссылка для приглашений:**\n"
         f"<code>{referral_link}</code>\n"
         f"(Нажмите на ссылку выше, чтобы скопировать её)\n\n"
+        f"👥 Приглашено: **{referrals_count}** (активных за {Referrals.ACTIVE_DAYS} дн.: **{active_count}**)\n"
+        f"📈 Заработано всего: **{total_earned:.2f} ⭐**\n"
         f"💰 Накоплено в копилке: **{referral_earnings:.2f} ⭐**"
     )
 
@@ -68,26 +72,55 @@ async def referral_entry_point(callback: CallbackQuery, state: FSMContext, bot:
 
 @router.callback_query(F.data == 'profile_referrals_list')
 async def show_referrals_list(callback: CallbackQuery):
-    """Показывает пользователю список его рефералов."""
-    referrals = await db_manager.get_referrals(callback.from_user.id)
-    
+    """Показывает первую страницу рефералов пользователя."""
+    await callback.answer()
+    await show_referrals_page(callback, after_id=None)
+
+@router.callback_query(F.data.startswith('referrals:page:'))
+async def show_next_referrals(callback: CallbackQuery):
+    try:
+        after_id = int(callback.data.split(':', 2)[2])
+    except ValueError:
+        await callback.answer()
+        return
+    await callback.answer()
+    await show_referrals_page(callback, after_id=after_id)
+
+async def show_referrals_page(callback: CallbackQuery, after_id: int | None):
+    referrals, has_more = await db_manager.get_referrals_page(callback.from_user.id, after_id=after_id)
+
     if not referrals:
-        text = "У вас пока нет приглашенных пользователей."
+        text = "У вас пока нет приглашенных пользователей." if after_id is None else "Больше рефералов нет."
     else:
-        text = "👥 **Ваши рефералы:**\n\n" + "\n".join([f"- @{username}" for username in referrals if username])
-        
+        active_since = datetime.datetime.utcnow() - datetime.timedelta(days=Referrals.ACTIVE_DAYS)
+        lines = [
+            f"{'🟢' if active_at and active_at >= active_since else '⚪️'} "
+            + (f"@{username}" if username else f"ID: {referral_id}")
+            for referral_id, username, active_at in referrals
+        ]
+        text = (
+            "👥 **Ваши рефералы:**\n"
+            f"🟢 - принес награду за последние {Referrals.ACTIVE_DAYS} дн.\n\n" + "\n".join(lines)
+        )
+
+    next_after_id = referrals[-1][0] if has_more else None
     if callback.message:
-        await callback.message.edit_text(text, reply_markup=inline.get_back_to_referral_menu_keyboard())
-    await callback.answer()
+        try:
+            await callback.message.edit_text(
+                text,
+                reply_markup=inline.get_referrals_list_keyboard(next_after_id=next_after_id, show_first=after_id is not None)
+            )
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.warning(f"Error editing referrals list: {e}")
 
 @router.callback_query(F.data == 'profile_claim_referral_stars')
 async def claim_referral_stars(callback: CallbackQuery, bot: Bot):
     """Переводит накопленные звезды на основной баланс."""
     user_id = callback.from_user.id
-    earnings = await db_manager.get_referral_earnings(user_id)
+    earnings = await db_manager.claim_referral_earnings(user_id)
     
     if earnings > 0:
-        await db_manager.claim_referral_earnings(user_id)
         await callback.answer(f"{earnings:.2f} ⭐ переведены на ваш основной баланс!", show_alert=True)
     else:
         await callback.answer("Ваша реферальная копилка пуста.", show_alert=True)
@@ -43,8 +43,17 @@ def get_profile_keyboard(first_task_completed: bool) -> InlineKeyboardMarkup:
     builder.adjust(2, 2, 2, 2)
     return builder.as_markup()
 
-def get_operation_history_keyboard() -> InlineKeyboardMarkup:
-    buttons = [[InlineKeyboardButton(text='⬅️ Назад в профиль', callback_data='go_profile')]]
+def get_operation_history_keyboard(older_cursor: Optional[str] = None, show_latest: bool = False) -> InlineKeyboardMarkup:
+    buttons = []
+    navigation = []
+    if show_latest:
+        navigation.append(InlineKeyboardButton(text='⏮ К последним', callback_data='profile_history'))
+    if older_cursor:
+        navigation.append(InlineKeyboardButton(text='Ранее ▶️', callback_data=f'history:older:{older_cursor}'))
+    if navigation:
+        buttons.append(navigation)
+    buttons.append([InlineKeyboardButton(text='📥 Выгрузить всю историю', callback_data='history:export')])
+    buttons.append([InlineKeyboardButton(text='⬅️ Назад в профиль', callback_data='go_profile')])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def get_cancel_to_profile_keyboard() -> InlineKeyboardMarkup:
@@ -137,6 +146,18 @@ def get_back_to_referral_menu_keyboard() -> InlineKeyboardMarkup:
     buttons = [[InlineKeyboardButton(text='⬅️ Назад', callback_data='profile_referral')]]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+def get_referrals_list_keyboard(next_after_id: Optional[int] = None, show_first: bool = False) -> InlineKeyboardMarkup:
+    buttons = []
+    navigation = []
+    if show_first:
+        navigation.append(InlineKeyboardButton(text='⏮ В начало', callback_data='profile_referrals_list'))
+    if next_after_id is not None:
+        navigation.append(InlineKeyboardButton(text='Далее ▶️', callback_data=f'referrals:page:{next_after_id}'))
+    if navigation:
+        buttons.append(navigation)
+    buttons.append([InlineKeyboardButton(text='⬅️ Назад', callback_data='profile_referral')])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
 # --- Раздел "Заработок" ---
 
 def get_earning_keyboard() -> InlineKeyboardMarkup:
@@ -316,6 +337,8 @@ def get_admin_provide_text_keyboard(platform: str, user_id: int, link_id: int, r
     photo_required_str = 'true' if requires_photo else 'false'
     builder.button(text='✍️ Ввести вручную (сценарий)', callback_data=f'admin_text_manual_start:{platform}:{user_id}:{link_id}:{photo_required_str}')
     builder.button(text='🤖 Сгенерировать с ИИ', callback_data=f'admin_ai_generate_start:{platform}:{user_id}:{link_id}:{photo_required_str}')
+    if not requires_photo:
+        builder.button(text='⚡ Готовый текст из пула', callback_data=f'admin_pool_text:{platform}:{user_id}:{link_id}')
     builder.adjust(1)
     return builder.as_markup()
 
@@ -399,7 +422,8 @@ def get_campaign_tag_keyboard() -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
-def get_link_list_control_keyboard(platform: str, current_page: int, total_pages: int, filter_type: str, reward_filter: float = None, gender_filter: str = None, sort_by_tag: bool = False) -> InlineKeyboardMarkup:
+def get_link_list_control_keyboard(platform: str, current_page: int, total_pages: int, filter_type: str, reward_filter: float = None, gender_filter: str = None, sort_by_tag: bool = False,
+                                   first_key: tuple = None, last_key: tuple = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     
     type_filters = [("Все", "all"), ("🚀", "fast"), ("📸", "photo"), ("📄", "regular")]
@@ -424,12 +448,13 @@ def get_link_list_control_keyboard(platform: str, current_page: int, total_pages
         builder.row(InlineKeyboardButton(text="🔄 Сбросить фильтры", callback_data=f"admin_refs:reset_filters:{platform}"))
 
     pagination_row = []
-    if current_page > 1:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"links_page:{platform}:{current_page-1}"))
+    # В callback передается ключ крайней ссылки страницы (есть ли тег, ID) для keyset-пагинации
+    if current_page > 1 and first_key:
+        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"links_page:{platform}:p:{current_page-1}:{int(first_key[0])}:{first_key[1]}"))
     if total_pages > 1:
         pagination_row.append(InlineKeyboardButton(text=f"{current_page}/{total_pages}", callback_data="noop"))
-    if current_page < total_pages:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"links_page:{platform}:{current_page+1}"))
+    if current_page < total_pages and last_key:
+        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"links_page:{platform}:n:{current_page+1}:{int(last_key[0])}:{last_key[1]}"))
     if pagination_row:
         builder.row(*pagination_row)
         
@@ -617,8 +642,7 @@ async def get_task_switching_keyboard(bot: Bot, category: str, subcategory: str
     
     for task_key in tasks:
         description = admin_roles.ROLE_DESCRIPTIONS.get(task_key, task_key)
-        admin_id = await admin_roles.get_responsible_admin(task_key)
-        admin_name = await admin_roles.get_admin_username(bot, admin_id)
+        admin_name = await admin_roles.get_role_admin_names(bot, task_key)
         builder.button(text=f"{description}: {admin_name}", callback_data=f"roles_switch:{task_key}")
     
     back_callback = "roles_back:main" if category != "yandex" else "roles_back:yandex"
@@ -626,21 +650,29 @@ async def get_task_switching_keyboard(bot: Bot, category: str, subcategory: str
     builder.adjust(1)
     return builder.as_markup()
 
-async def get_admin_selection_keyboard(admins: List[Administrator], role_key: str, current_admin_id: int, bot: Bot) -> InlineKeyboardMarkup:
+async def get_admin_selection_keyboard(admins: List[Administrator], role_key: str, role_admins: Dict[int, int], strategy: str, bot: Bot) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
+    rows = []
     for admin in admins:
-        prefix = "✅ " if admin.user_id == current_admin_id else ""
+        is_member = admin.user_id in role_admins
+        prefix = "✅ " if is_member else ""
         try:
             chat = await bot.get_chat(admin.user_id)
             username = f"@{chat.username}" if chat.username else f"ID {admin.user_id}"
         except Exception:
             username = f"ID {admin.user_id}"
         builder.button(text=f"{prefix}{username}", callback_data=f"roles_set_admin:{role_key}:{admin.user_id}")
-    
+        if is_member and strategy == admin_roles.ROUTING_WEIGHTED:
+            builder.button(text=f"⚖️ Вес: {role_admins[admin.user_id]}", callback_data=f"roles_weight:{role_key}:{admin.user_id}")
+            rows.append(2)
+        else:
+            rows.append(1)
+
+    builder.button(text=f"🔀 Распределение: {admin_roles.ROUTING_STRATEGIES[strategy]}", callback_data=f"roles_strategy:{role_key}")
     category, subcategory = admin_roles.get_category_from_role_key(role_key)
     back_callback = f"roles_subcat:{category}_{subcategory}" if subcategory else f"roles_cat:{category}"
     builder.button(text="⬅️ Назад", callback_data=back_callback)
-    builder.adjust(1)
+    builder.adjust(*rows, 1, 1)
     return builder.as_markup()
 
 def get_current_settings_keyboard() -> InlineKeyboardMarkup:
@@ -673,10 +705,20 @@ def get_promo_management_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.button(text="✨ Создать", callback_data="panel:create_promo")
     builder.button(text="📝 Список", callback_data="panel:promo_list")
+    builder.button(text="📦 Массовая генерация", callback_data="panel:generate_promos")
+    builder.button(text="📊 Пачки", callback_data="panel:promo_batches")
     builder.button(text="⬅️ Назад", callback_data="panel:back_to_panel")
     builder.adjust(1)
     return builder.as_markup()
 
+def get_promo_batches_keyboard(batch_tags: List[str]) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for batch_tag in batch_tags:
+        builder.button(text=f"📥 Выгрузить {batch_tag}", callback_data=f"promo_batch_export:{batch_tag}")
+    builder.button(text="⬅️ Назад", callback_data="panel:manage_promos")
+    builder.adjust(1)
+    return builder.as_markup()
+
 def get_promo_list_keyboard(current_page: int, total_pages: int) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     pagination_markup = get_pagination_keyboard("promolist:page", current_page, total_pages, show_close=False, back_callback="panel:manage_promos")
@@ -911,18 +953,21 @@ def get_games_menu_keyboard() -> InlineKeyboardMarkup:
     builder.adjust(1)
     return builder.as_markup()
 
-def get_coinflip_bet_keyboard(play_again: bool = False, win_streak: int = 0) -> InlineKeyboardMarkup:
+def get_coinflip_bet_keyboard(play_again: bool = False, win_streak: int = 0, last_bet: float = None, last_choice: str = None) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     bets = [1, 5, 10, 25]
     for bet in bets:
         builder.button(text=f"{bet} ⭐", callback_data=f"bet_{bet}")
     builder.button(text="Другая сумма", callback_data="custom_bet")
+    if last_bet and last_choice:
+        side = "🦅 Орёл" if last_choice == "eagle" else "🪙 Решка"
+        builder.button(text=f"🔁 Повторить: {last_bet:.2f} ⭐, {side}", callback_data=f"coinflip_repeat:{last_choice}:{last_bet:.2f}")
     
     back_text = "⬅️ Меню игр" if not play_again else "⏹️ Закончить"
     back_cb = "back_to_games_menu" if not play_again else "go_profile"
 
     builder.button(text=back_text, callback_data=back_cb)
-    builder.adjust(4, 1, 1)
+    builder.adjust(4, 1, 1, 1)
     return builder.as_markup()
 
 def get_coinflip_choice_keyboard() -> InlineKeyboardMarkup:
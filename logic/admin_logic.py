@@ -3,6 +3,7 @@
 import logging
 import datetime
 import asyncio
+import time
 from math import ceil
 from typing import Union, Tuple, List
 
@@ -19,48 +20,41 @@ from states.user_states import UserState, AdminState
 from keyboards import inline, reply
 from references import reference_manager
 from logic.promo_logic import check_and_apply_promo_reward
-from logic.user_notifications import send_confirmation_button, handle_task_timeout, send_cooldown_expired_notification
+from logic import link_import, text_similarity
+from logic.user_notifications import send_confirmation_button, handle_task_timeout
 from config import Rewards, Durations, Limits, TESTER_IDS, PAYMENT_PROVIDER_TOKEN, PAID_UNBAN_COST_STARS, SUPER_ADMIN_ID
 
 logger = logging.getLogger(__name__)
 
 
 # --- ЛОГИКА: Добавление ссылок ---
-async def process_add_links_logic(links_text: str, platform: str, is_fast_track: bool, requires_photo: bool, reward_amount: float, gender_requirement: str, campaign_tag: str | None) -> str:
+async def process_add_links_logic(links_text: str, platform: str, is_fast_track: bool, requires_photo: bool, reward_amount: float, gender_requirement: str, campaign_tag: str | None,
+                                  is_csv: bool = False, progress: link_import.ProgressCallback | None = None) -> str:
     """
-    Обрабатывает текст со ссылками, добавляет их в базу данных
+    Импортирует ссылки из текста или содержимого .txt/.csv файла
     и возвращает отформатированную строку с результатом.
     """
-    if not links_text:
+    if not links_text or not links_text.strip():
         return "Текст со ссылками не может быть пустым."
 
-    links = links_text.strip().split('\n')
-    added_count, skipped_count = 0, 0
-
-    for link in links:
-        stripped_link = link.strip()
-        if stripped_link and (stripped_link.startswith("http://") or stripped_link.startswith("https://")):
-            try:
-                if await db_manager.db_add_reference(
-                    url=stripped_link, 
-                    platform=platform, 
-                    is_fast_track=is_fast_track,
-                    requires_photo=requires_photo,
-                    reward_amount=reward_amount, 
-                    gender_requirement=gender_requirement, 
-                    campaign_tag=campaign_tag
-                ):
-                    added_count += 1
-                else:
-                    skipped_count += 1
-            except Exception as e:
-                logger.error(f"!!! ОШИБКА ДОБАВЛЕНИЯ В БД: Не удалось добавить ссылку '{stripped_link}': {e}")
-                skipped_count += 1
-        elif stripped_link:
-            logger.warning(f"Skipping invalid link format: {stripped_link}")
-            skipped_count += 1
-
-    return f"Готово!\n✅ Добавлено: {added_count}\n⏭️ Пропущено (дубликаты или неверный формат): {skipped_count}"
+    started = time.perf_counter()
+    added_link_ids, duplicates, invalid = await link_import.import_links(
+        links_text,
+        platform=platform,
+        is_fast_track=is_fast_track,
+        requires_photo=requires_photo,
+        reward_amount=reward_amount,
+        gender_requirement=gender_requirement,
+        campaign_tag=campaign_tag,
+        is_csv=is_csv,
+        progress=progress
+    )
+    return (
+        f"Готово за {time.perf_counter() - started:.1f} с!\n"
+        f"✅ Добавлено: {len(added_link_ids)}\n"
+        f"⏭️ Пропущено дубликатов: {duplicates}\n"
+        f"⚠️ Пропущено строк неверного формата: {invalid}"
+    )
 
 
 # --- ЛОГИКА ДЛЯ ПРЕДУПРЕЖДЕНИЙ И ОТКЛОНЕНИЙ ---
@@ -202,6 +196,8 @@ async def send_review_text_to_user_logic(bot: Bot, dp: Dispatcher, scheduler: As
     confirm_job = scheduler.add_job(send_confirmation_button, 'date', run_date=run_date_confirm, args=[bot, user_id, platform])
     timeout_job = scheduler.add_job(handle_task_timeout, 'date', run_date=run_date_timeout, args=[bot, dp.storage, user_id, platform, 'основное задание', scheduler])
     await user_state.update_data(confirm_job_id=confirm_job.id, timeout_job_id=timeout_job.id)
+
+    await text_similarity.register_text(review_text, 'issued', link_id=link_id)
     
     return True, f"Текст успешно отправлен пользователю @{user_info.username} (ID: {user_id})."
 
@@ -214,7 +210,7 @@ async def apply_fine_to_user(user_id: int, admin_id: int, amount: float, reason:
     if not user:
         return f"❌ Пользователь с ID <code>{user_id}</code> не найден."
 
-    await db_manager.update_balance(user_id, -amount, op_type="FINE", description=f"Админ {admin_id}: {reason}")
+    await db_manager.update_balance(user_id, -amount, op_type="FINE", description=f"Админ {admin_id}: {reason}", allow_negative=True)
     
     user_notification_text = (
         f"❗️ <b>Вам был выдан штраф администратором.</b>\n\n"
@@ -229,7 +225,7 @@ async def apply_fine_to_user(user_id: int, admin_id: int, amount: float, reason:
         return f"✅ Штраф успешно применен к пользователю <b>{username}</b>."
     except Exception as e:
         logger.error(f"Failed to notify user {user_id} about the fine: {e}")
-        await db_manager.update_balance(user_id, amount) # Возвращаем деньги, если не удалось уведомить
+        await db_manager.update_balance(user_id, amount, op_type="FINE", description="Отмена штрафа") # Возвращаем деньги, если не удалось уведомить
         return f"❌ Не удалось уведомить пользователя {user_id} о штрафе. Штраф был отменен. Ошибка: {e}"
 
 
@@ -278,14 +274,7 @@ async def approve_review_to_hold_logic(review_id: int, bot: Bot, scheduler: Asyn
     platform_for_cooldown = review.platform.replace('_maps', '')
 
     
-    cooldown_end_time = await db_manager.set_platform_cooldown(review.user_id, platform_for_cooldown, cooldown_hours)
-    if cooldown_end_time:
-        scheduler.add_job(
-            send_cooldown_expired_notification, 
-            'date', 
-            run_date=cooldown_end_time, 
-            args=[bot, review.user_id, platform_for_cooldown]
-        )
+    await db_manager.set_platform_cooldown(review.user_id, platform_for_cooldown, cooldown_hours)
     
     await reference_manager.release_reference_from_user(review.user_id, 'used')
     
@@ -316,14 +305,7 @@ async def reject_initial_review_logic(review_id: int, bot: Bot, scheduler: Async
     cooldown_hours = cooldown_hours_map.get(rejected_review.platform, 24)
     platform_for_cooldown = rejected_review.platform.replace('_maps', '')
 
-    cooldown_end_time = await db_manager.set_platform_cooldown(rejected_review.user_id, platform_for_cooldown, cooldown_hours)
-    if cooldown_end_time:
-        scheduler.add_job(
-            send_cooldown_expired_notification, 
-            'date', 
-            run_date=cooldown_end_time, 
-            args=[bot, rejected_review.user_id, platform_for_cooldown]
-        )
+    await db_manager.set_platform_cooldown(rejected_review.user_id, platform_for_cooldown, cooldown_hours)
     
     await reference_manager.release_reference_from_user(rejected_review.user_id, 'available')
     
@@ -361,7 +343,7 @@ async def approve_final_review_logic(review_id: int, bot: Bot) -> tuple[bool, st
             # Награда берется из amount отзыва, которое равно reward_amount ссылки
             referral_reward = approved_review.amount * 0.10 # 10%
             if referral_reward > 0:
-                await db_manager.add_referral_earning(user.id, referral_reward)
+                await db_manager.add_referral_earning(referrer.id, user.id, referral_reward)
                 try:
                     await bot.send_message(
                         referrer.id,
@@ -542,8 +524,16 @@ async def format_complaints_page(complaints: list, page: int, total_pages: int)
     text = "<b>🚨 Жалобы на переводы:</b>\n\n"
     for complaint in complaints:
         transfer = complaint.transfer
-        sender_info = "Аноним" if transfer.is_anonymous else (f"@{transfer.sender.username}" if (transfer.sender and transfer.sender.username) else f"ID {transfer.sender_id}")
         complainant_info = f"@{complaint.complainant.username}" if complaint.complainant and complaint.complainant.username else f"ID {complaint.complainant_id}"
+        if not transfer:
+            # Перевод ушел в архив истории операций
+            text += (
+                f"<b>Жалоба #{complaint.id}</b> на перевод #{complaint.transfer_id} (в архиве)\n"
+                f" • <b>Получатель (подал жалобу):</b> {complainant_info}\n"
+                f" • <b>Причина:</b> <i>{complaint.reason}</i>\n\n"
+            )
+            continue
+        sender_info = "Аноним" if transfer.is_anonymous else (f"@{transfer.sender.username}" if (transfer.sender and transfer.sender.username) else f"ID {transfer.sender_id}")
         
         text += (
             f"<b>Жалоба #{complaint.id}</b> на перевод #{transfer.id}\n"
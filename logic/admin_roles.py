@@ -1,7 +1,7 @@
 # file: logic/admin_roles.py
 
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 import asyncio
 
 from aiogram import Bot
@@ -82,10 +82,73 @@ async def get_admin_username(bot: Bot, admin_id: int) -> str:
         logger.warning(f"Could not get username for admin_id {admin_id}: {e}")
         return f"ID: {admin_id}"
 
+# --- Наборы админов на роль ---
+# Значение роли в SystemSetting: "id[:вес],id[:вес]". Старое значение из одного id тоже поддерживается.
+
+ROUTING_LEAST_OUTSTANDING = "least_outstanding"
+ROUTING_ROUND_ROBIN = "round_robin"
+ROUTING_WEIGHTED = "weighted"
+ROUTING_STRATEGIES = {
+    ROUTING_LEAST_OUTSTANDING: "наименьшая очередь",
+    ROUTING_ROUND_ROBIN: "по кругу",
+    ROUTING_WEIGHTED: "по весам",
+}
+DEFAULT_ROUTING_STRATEGY = ROUTING_LEAST_OUTSTANDING
+
+FINAL_CHECK_ROLES = {YANDEX_TEXT_FINAL_CHECK_ADMIN, YANDEX_NO_TEXT_FINAL_CHECK_ADMIN, GOOGLE_FINAL_CHECK_ADMIN, GMAIL_FINAL_CHECK_ADMIN}
+
+
+def get_default_admin(role_key: str) -> int:
+    return ADMIN_ID_2 if role_key in FINAL_CHECK_ROLES and ADMIN_ID_2 else ADMIN_ID_1
+
+def get_routing_setting_key(role_key: str) -> str:
+    return f"{role_key}_routing"
+
+def parse_role_admins(value: Optional[str]) -> Dict[int, int]:
+    """Разбирает значение роли в {admin_id: вес}, сохраняя порядок назначения."""
+    admins = {}
+    for part in (value or "").split(","):
+        admin_id_str, _, weight_str = part.strip().partition(":")
+        if not admin_id_str.isdigit():
+            continue
+        admins[int(admin_id_str)] = max(int(weight_str), 1) if weight_str.isdigit() else 1
+    return admins
+
+def format_role_admins(admins: Dict[int, int]) -> str:
+    return ",".join(f"{admin_id}:{weight}" if weight != 1 else str(admin_id) for admin_id, weight in admins.items())
+
+async def get_role_config(role_key: str) -> Tuple[Dict[int, int], str]:
+    """Возвращает ({admin_id: вес}, стратегия распределения) для роли одним запросом."""
+    routing_key = get_routing_setting_key(role_key)
+    settings = {s.key: s.value for s in await db_manager.get_system_settings_batch([role_key, routing_key])}
+    admins = parse_role_admins(settings.get(role_key)) or {get_default_admin(role_key): 1}
+    strategy = settings.get(routing_key)
+    return admins, strategy if strategy in ROUTING_STRATEGIES else DEFAULT_ROUTING_STRATEGY
+
+async def get_role_admins(role_key: str) -> List[int]:
+    admins, _ = await get_role_config(role_key)
+    return list(admins)
+
+async def is_role_admin(user_id: int, role_key: str) -> bool:
+    """Проверяет, входит ли админ в набор ответственных за роль."""
+    return user_id in await get_role_admins(role_key)
+
+async def set_role_admins(role_key: str, admins: Dict[int, int]):
+    await db_manager.set_system_setting(role_key, format_role_admins(admins))
+
+async def set_role_strategy(role_key: str, strategy: str):
+    await db_manager.set_system_setting(get_routing_setting_key(role_key), strategy)
+
+async def get_role_admin_names(bot: Bot, role_key: str) -> str:
+    """Имена всех админов роли через запятую - для сообщений о том, кто выполняет задачу."""
+    names = [await get_admin_username(bot, admin_id) for admin_id in await get_role_admins(role_key)]
+    return ", ".join(names)
+
 async def get_responsible_admin(role_key: str, default_admin_id: int = ADMIN_ID_1) -> int:
-    """Получает ID ответственного админа из БД или возвращает ID по умолчанию."""
+    """Возвращает основного (первого назначенного) админа роли или ID по умолчанию."""
     admin_id_str = await db_manager.get_system_setting(role_key)
-    return int(admin_id_str) if admin_id_str else default_admin_id
+    admins = parse_role_admins(admin_id_str)
+    return next(iter(admins)) if admins else default_admin_id
 
 async def get_yandex_text_profile_admin() -> int:
     return await get_responsible_admin(YANDEX_TEXT_PROFILE_CHECK_ADMIN, ADMIN_ID_1)
@@ -126,9 +189,10 @@ async def get_gmail_final_admin() -> int:
 async def get_other_hold_admin() -> int:
     return await get_responsible_admin(OTHER_HOLD_REVIEW_ADMIN, ADMIN_ID_1)
 
-async def get_all_roles_readable_optimized(bot: Bot) -> str:
+async def get_all_roles_readable_optimized(bot: Bot, queue_depths: Optional[Dict[int, int]] = None) -> str:
     """
     Оптимизированная версия: собирает информацию обо всех ролях, минимизируя запросы.
+    queue_depths - текущая глубина очереди по админам, если нужно ее показать.
     """
     roles_data_structure = {
         "**📍 Яндекс (с текстом):**": [
@@ -148,13 +212,14 @@ async def get_all_roles_readable_optimized(bot: Bot) -> str:
         ]
     }
     
-    # 1. Получаем все настройки ролей из БД одним запросом
+    # 1. Получаем все настройки ролей и стратегий из БД одним запросом
     all_role_keys = [key for sublist in roles_data_structure.values() for key in sublist]
-    all_settings = await db_manager.get_system_settings_batch(all_role_keys)
+    all_settings = await db_manager.get_system_settings_batch(all_role_keys + [get_routing_setting_key(key) for key in all_role_keys])
+    settings_map = {setting.key: setting.value for setting in all_settings}
+    roles_admins = {key: parse_role_admins(settings_map.get(key)) or {get_default_admin(key): 1} for key in all_role_keys}
     
     # 2. Собираем все уникальные ID админов, которые реально назначены
-    admin_ids = {int(setting.value) for setting in all_settings if setting.value and setting.value.isdigit()}
-    admin_ids.update([ADMIN_ID_1, ADMIN_ID_2]) # Добавляем дефолтных
+    admin_ids = {admin_id for admins in roles_admins.values() for admin_id in admins}
     
     # 3. Получаем информацию (username) для этих ID
     admins_info = await db_manager.get_administrators_details(list(admin_ids))
@@ -165,49 +230,68 @@ async def get_all_roles_readable_optimized(bot: Bot) -> str:
     for category, keys in roles_data_structure.items():
         full_text += f"{category}\n"
         for key in keys:
-            # Находим настройку для текущего ключа
-            admin_id_str = next((s.value for s in all_settings if s.key == key), None)
-            
-            # Определяем ID админа (с учетом дефолтного значения)
-            if key in [YANDEX_TEXT_FINAL_CHECK_ADMIN, YANDEX_NO_TEXT_FINAL_CHECK_ADMIN, GOOGLE_FINAL_CHECK_ADMIN, GMAIL_FINAL_CHECK_ADMIN]:
-                admin_id = int(admin_id_str) if admin_id_str else ADMIN_ID_2
-            else:
-                admin_id = int(admin_id_str) if admin_id_str else ADMIN_ID_1
-            
+            admins = roles_admins[key]
+            strategy = settings_map.get(get_routing_setting_key(key))
+            strategy_text = ROUTING_STRATEGIES.get(strategy, ROUTING_STRATEGIES[DEFAULT_ROUTING_STRATEGY])
+
+            admin_names = []
+            for admin_id, weight in admins.items():
+                admin_name = admins_map.get(admin_id, f"ID: {admin_id}") # Берем имя из кэша
+                if weight != 1:
+                    admin_name += f" ×{weight}"
+                if queue_depths is not None:
+                    admin_name += f" [{queue_depths.get(admin_id, 0)}]"
+                admin_names.append(admin_name)
+
             description = ROLE_DESCRIPTIONS.get(key, key)
-            admin_name = admins_map.get(admin_id, f"ID: {admin_id}") # Берем имя из кэша
-            full_text += f"  - *{description}:* {admin_name}\n"
+            full_text += f"  - *{description}:* {', '.join(admin_names)}"
+            full_text += f" _({strategy_text})_\n" if len(admins) > 1 else "\n"
         full_text += "\n"
+
+    if queue_depths is not None:
+        full_text += "_В квадратных скобках - задачи, ожидающие админа прямо сейчас._\n"
         
     return full_text
 
 
+# Соответствие типа задачи и роли, которая ее выполняет
+TASK_ROLES = {
+    "google_profile": GOOGLE_PROFILE_CHECK_ADMIN,
+    "google_last_reviews": GOOGLE_LAST_REVIEWS_CHECK_ADMIN,
+    "google_issue_text": GOOGLE_ISSUE_TEXT_ADMIN,
+    "google_final_verdict": GOOGLE_FINAL_CHECK_ADMIN,
+    "yandex_with_text_profile_screenshot": YANDEX_TEXT_PROFILE_CHECK_ADMIN,
+    "yandex_with_text_issue_text": YANDEX_TEXT_ISSUE_TEXT_ADMIN,
+    "yandex_with_text_final_verdict": YANDEX_TEXT_FINAL_CHECK_ADMIN,
+    "yandex_without_text_profile_screenshot": YANDEX_NO_TEXT_PROFILE_CHECK_ADMIN,
+    "yandex_without_text_final_verdict": YANDEX_NO_TEXT_FINAL_CHECK_ADMIN,
+    "gmail_device_model": GMAIL_DEVICE_MODEL_CHECK_ADMIN,
+    "gmail_issue_data": GMAIL_ISSUE_DATA_ADMIN,
+    "gmail_final_check": GMAIL_FINAL_CHECK_ADMIN,
+    "other_hold_check": OTHER_HOLD_REVIEW_ADMIN,
+}
+
+# Роли финальной проверки по платформе отзыва
+FINAL_CHECK_ROLE_BY_PLATFORM = {
+    'google': GOOGLE_FINAL_CHECK_ADMIN,
+    'yandex_with_text': YANDEX_TEXT_FINAL_CHECK_ADMIN,
+    'yandex_without_text': YANDEX_NO_TEXT_FINAL_CHECK_ADMIN,
+}
+
+# Роли выдачи текста по платформе
+ISSUE_TEXT_ROLE_BY_PLATFORM = {
+    'google': GOOGLE_ISSUE_TEXT_ADMIN,
+    'yandex_with_text': YANDEX_TEXT_ISSUE_TEXT_ADMIN,
+}
+
+
 async def get_admins_for_task(task_type: str) -> List[int]:
     """
     Возвращает список ID администраторов, ответственных за данный тип задачи.
     """
-    task_map = {
-        "google_profile": get_google_profile_admin,
-        "google_last_reviews": get_google_reviews_admin,
-        "google_issue_text": get_google_issue_admin,
-        "google_final_verdict": get_google_final_admin,
-        "yandex_with_text_profile_screenshot": get_yandex_text_profile_admin,
-        "yandex_with_text_issue_text": get_yandex_text_issue_admin,
-        "yandex_with_text_final_verdict": get_yandex_text_final_admin,
-        "yandex_without_text_profile_screenshot": get_yandex_no_text_profile_admin,
-        "yandex_without_text_final_verdict": get_yandex_no_text_final_admin,
-        "gmail_device_model": get_gmail_device_admin,
-        "gmail_issue_data": get_gmail_data_admin,
-        "gmail_final_check": get_gmail_final_admin,
-        "other_hold_check": get_other_hold_admin,
-    }
-
-    get_admin_func = task_map.get(task_type)
-
-    if get_admin_func:
-        admin_id = await get_admin_func()
-        return [admin_id] if admin_id else []
-    else:
-        logger.warning(f"No specific admin found for task type '{task_type}'. Defaulting to all admins.")
-        all_admins = await db_manager.get_all_administrators_by_role()
-        return [admin.user_id for admin in all_admins]
\ No newline at end of file
+    role_key = TASK_ROLES.get(task_type)
+    if role_key:
+        return await get_role_admins(role_key)
+    logger.warning(f"No specific admin found for task type '{task_type}'. Defaulting to all admins.")
+    all_admins = await db_manager.get_all_administrators_by_role()
+    return [admin.user_id for admin in all_admins]
@@ -0,0 +1,114 @@
+# file: logic/admin_routing.py
+
+import logging
+import time
+from typing import Dict, List, Optional
+
+from config import AdminRouting
+from database import db_manager
+from logic import admin_roles
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdminQueueTracker:
+    """
+    Живая глубина очереди по админам: задачи, отправленные админу и еще не взятые в работу.
+    Задача закрывается первым нажатием кнопки на ее сообщении или по истечении TTL.
+    """
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._outstanding: Dict[int, Dict[int, float]] = {}  # admin_id -> {message_id: время отправки}
+
+    def _expire(self, admin_id: int):
+        tasks = self._outstanding.get(admin_id)
+        if not tasks:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        for message_id in [m for m, sent_at in tasks.items() if sent_at < deadline]:
+            del tasks[message_id]
+            metrics.increment("admin_queue.expired")
+
+    def _update_gauge(self, admin_id: int):
+        metrics.set_gauge(f"admin_queue.depth.{admin_id}", len(self._outstanding.get(admin_id, ())))
+
+    def assign(self, admin_id: int, message_id: int):
+        self._outstanding.setdefault(admin_id, {})[message_id] = time.monotonic()
+        metrics.increment("admin_queue.assigned")
+        self._update_gauge(admin_id)
+
+    def complete(self, admin_id: int, message_id: int) -> bool:
+        tasks = self._outstanding.get(admin_id)
+        if not tasks or tasks.pop(message_id, None) is None:
+            return False
+        metrics.increment("admin_queue.completed")
+        self._update_gauge(admin_id)
+        return True
+
+    def depth(self, admin_id: int) -> int:
+        self._expire(admin_id)
+        return len(self._outstanding.get(admin_id, ()))
+
+    def snapshot(self) -> Dict[int, int]:
+        return {admin_id: self.depth(admin_id) for admin_id in list(self._outstanding)}
+
+
+queue_tracker = AdminQueueTracker(AdminRouting.TASK_TTL_MINUTES * 60)
+# Состояние стратегий по ролям: позиция для "по кругу" и текущие веса для "по весам"
+_round_robin_positions: Dict[str, int] = {}
+_weighted_state: Dict[str, Dict[int, int]] = {}
+
+
+def _pick_round_robin(role_key: str, candidates: List[int]) -> int:
+    position = _round_robin_positions.get(role_key, 0)
+    _round_robin_positions[role_key] = position + 1
+    return candidates[position % len(candidates)]
+
+
+def _pick_weighted(role_key: str, candidates: List[int], weights: Dict[int, int]) -> int:
+    """Плавный взвешенный round-robin: админы чередуются пропорционально весам."""
+    current = _weighted_state.setdefault(role_key, {})
+    total = 0
+    for admin_id in candidates:
+        weight = weights.get(admin_id, 1)
+        current[admin_id] = current.get(admin_id, 0) + weight
+        total += weight
+    chosen = max(candidates, key=lambda admin_id: current[admin_id])
+    current[chosen] -= total
+    return chosen
+
+
+def _pick_least_outstanding(role_key: str, candidates: List[int]) -> int:
+    depths = {admin_id: queue_tracker.depth(admin_id) for admin_id in candidates}
+    least = min(depths.values())
+    # При равной очереди чередуем, чтобы не нагружать всегда первого
+    return _pick_round_robin(role_key, [admin_id for admin_id in candidates if depths[admin_id] == least])
+
+
+def pick_admin(role_key: str, candidates: List[int], weights: Dict[int, int], strategy: str) -> int:
+    if len(candidates) == 1:
+        return candidates[0]
+    if strategy == admin_roles.ROUTING_ROUND_ROBIN:
+        return _pick_round_robin(role_key, candidates)
+    if strategy == admin_roles.ROUTING_WEIGHTED:
+        return _pick_weighted(role_key, candidates, weights)
+    return _pick_least_outstanding(role_key, candidates)
+
+
+async def route_task(task_type: str) -> Optional[int]:
+    """
+    Выбирает одного админа из набора роли для задачи: без DND, по стратегии роли.
+    Возвращает None, если все админы роли недоступны.
+    """
+    role_key = admin_roles.TASK_ROLES.get(task_type)
+    if not role_key:
+        return None
+    weights, strategy = await admin_roles.get_role_config(role_key)
+    active = set(await db_manager.get_active_admins(list(weights)))
+    candidates = [admin_id for admin_id in weights if admin_id in active]
+    if not candidates:
+        return None
+    admin_id = pick_admin(role_key, candidates, weights, strategy)
+    logger.info(f"Task '{task_type}' routed to admin {admin_id} ({strategy}, {len(candidates)} available).")
+    return admin_id
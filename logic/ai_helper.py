@@ -1,13 +1,25 @@
 # file: logic/ai_helper.py
 
 import os
+import time
 import asyncio
 import logging
 import json
-from groq import Groq, APIError
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import httpx
+from groq import AsyncGroq, APIError
 
 from duckduckgo_search import DDGS
-from config import GROQ_MODEL_NAME
+from config import (GROQ_MODEL_NAME, AI_MAX_CONCURRENCY, AI_REQUEST_TIMEOUT_SECONDS, AI_EXECUTOR_WORKERS,
+                    AI_WEB_SEARCH_CACHE_TTL_SECONDS, TextSimilarity)
+from logic import text_similarity
+from utils import metrics
+from utils.url_normalizer import company_key
+from utils.redis_client import get_redis
 
 # Инициализируем логгер
 logger = logging.getLogger(__name__)
@@ -15,6 +27,45 @@ logger = logging.getLogger(__name__)
 # Загружаем ключ API Groq из переменных окружения
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Отдельный пул только для оставшихся блокирующих вызовов (поиск DuckDuckGo),
+# чтобы генерация не занимала общий executor event loop'а.
+_ai_executor = ThreadPoolExecutor(max_workers=AI_EXECUTOR_WORKERS, thread_name_prefix="ai")
+_generation_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+_client: Optional[AsyncGroq] = None
+# Поиски, которые выполняются прямо сейчас: ключ кэша -> future с результатом
+_search_inflight: Dict[str, asyncio.Future] = {}
+# Нагрузка для метрик считается вручную, без приватных полей пула и семафора:
+# поиски в пуле, генерации под семафором и генерации, ждущие семафор
+_load = {"searches": 0, "generations": 0, "queued": 0}
+
+
+def get_groq_client() -> AsyncGroq:
+    """Возвращает долгоживущий асинхронный клиент Groq с keep-alive соединениями."""
+    global _client
+    if _client is None:
+        timeout = httpx.Timeout(AI_REQUEST_TIMEOUT_SECONDS, connect=5.0)
+        http_client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=AI_MAX_CONCURRENCY * 2, max_keepalive_connections=AI_MAX_CONCURRENCY, keepalive_expiry=60.0),
+        )
+        _client = AsyncGroq(api_key=GROQ_API_KEY, timeout=timeout, max_retries=2, http_client=http_client)
+    return _client
+
+
+async def close_ai_client():
+    """Закрывает HTTP-соединения клиента и пул потоков. Вызывается при остановке бота."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    _ai_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _update_executor_metrics():
+    metrics.set_gauge("ai.web_searches_in_flight", _load["searches"])
+    metrics.set_gauge("ai.generations_in_flight", _load["generations"])
+    metrics.set_gauge("ai.generations_queued", _load["queued"])
+
 def perform_web_search(query: str):
     """
     Выполняет поиск в интернете по заданному запросу, чтобы найти актуальную информацию.
@@ -32,11 +83,84 @@ def perform_web_search(query: str):
         logger.error(f"DuckDuckGo search failed: {e}")
         return f"Ошибка при поиске: {e}"
 
-def generate_review_sync(client: Groq, model: str, system_prompt: str, user_prompt: str, tools: list = None) -> str:
+def _normalize_search_text(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _search_cache_key(query: str, company: str) -> str:
+    # company - обычно ссылка на карты; разные ссылки на одну компанию должны делить кэш
+    company_id = company_key(company) or _normalize_search_text(company)
+    normalized = f"{company_id}|{_normalize_search_text(query)}"
+    return "ai:web_search:" + hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+async def _search_and_store(cache_key: str, query: str) -> str:
+    loop = asyncio.get_running_loop()
+    search_started = time.perf_counter()
+    _load["searches"] += 1
+    _update_executor_metrics()
+    try:
+        result = await loop.run_in_executor(_ai_executor, perform_web_search, query)
+    finally:
+        _load["searches"] -= 1
+        _update_executor_metrics()
+    metrics.observe("ai.web_search_seconds", time.perf_counter() - search_started)
+    metrics.increment("ai.web_search_calls")
+
+    # Ошибки поиска не кэшируем, иначе они залипнут на весь TTL
+    if not result.startswith("Ошибка при поиске"):
+        try:
+            await get_redis().set(cache_key, result, ex=AI_WEB_SEARCH_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning(f"Failed to store web search result in Redis: {e}")
+    return result
+
+
+async def cached_web_search(query: str, company: str = "") -> str:
     """
-    Синхронная обертка для вызова API Groq, которая умеет работать с инструментами.
+    Поиск с кэшем в Redis по нормализованным запросу и компании.
+    Одновременные генерации для одной компании ждут один и тот же поиск.
     """
-    response = client.chat.completions.create(
+    cache_key = _search_cache_key(query, company)
+    try:
+        cached = await get_redis().get(cache_key)
+    except Exception as e:
+        logger.warning(f"Web search cache is unavailable: {e}")
+        cached = None
+    if cached is not None:
+        metrics.increment("ai.web_search_cache_hits")
+        return cached
+
+    if cache_key in _search_inflight:
+        metrics.increment("ai.web_search_coalesced")
+        return await asyncio.shield(_search_inflight[cache_key])
+
+    metrics.increment("ai.web_search_cache_misses")
+    future = asyncio.get_running_loop().create_future()
+    _search_inflight[cache_key] = future
+    try:
+        result = await _search_and_store(cache_key, query)
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # помечаем исключение как полученное, если никто не ждал
+        raise
+    finally:
+        _search_inflight.pop(cache_key, None)
+
+def is_generation_error(text: str) -> bool:
+    """generate_review_text возвращает ошибки текстом, распознаем их по маркерам."""
+    lowered = text.lower()
+    return "ошибка" in lowered or "ai-сервис" in lowered or "ai-модель" in lowered
+
+
+async def generate_review_async(client: AsyncGroq, model: str, system_prompt: str, user_prompt: str, tools: list = None, company: str = "") -> str:
+    """
+    Асинхронный вызов API Groq, который умеет работать с инструментами.
+    company используется как часть ключа кэша веб-поиска.
+    """
+    response = await client.chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -56,24 +180,19 @@ def generate_review_sync(client: Groq, model: str, system_prompt: str, user_prom
 
     logger.info(f"AI requested tool call: {tool_calls[0].function.name}")
     
-    available_tools = {
-        "perform_web_search": perform_web_search,
-    }
-    
     function_name = tool_calls[0].function.name
-    function_to_call = available_tools.get(function_name)
-    
-    if not function_to_call:
+    if function_name != "perform_web_search":
         return f"Ошибка: модель запросила несуществующий инструмент '{function_name}'."
 
     try:
         function_args = json.loads(tool_calls[0].function.arguments)
-    except json.JSONDecodeError:
+        query = str(function_args["query"])
+    except (json.JSONDecodeError, KeyError, TypeError):
         return "Ошибка: модель вернула некорректные аргументы для инструмента."
-        
-    function_response = function_to_call(**function_args)
 
-    second_response = client.chat.completions.create(
+    function_response = await cached_web_search(query, company)
+
+    second_response = await client.chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -103,7 +222,7 @@ async def generate_review_text(
         logger.critical("Groq API key not found in .env file! AI generation is disabled.")
         return "Ошибка: AI-сервис не настроен. Отсутствует GROQ_API_KEY."
 
-    client = Groq(api_key=GROQ_API_KEY)
+    client = get_groq_client()
 
     search_tool = {
         "type": "function",
@@ -135,25 +254,47 @@ async def generate_review_text(
     НЕ используй шаблонные фразы вроде "рекомендую это место", "обязательно вернусь", "лучший в городе".
     """
 
+    started = time.perf_counter()
     try:
-        loop = asyncio.get_running_loop()
-        
-        model_to_use = GROQ_MODEL_NAME
-        
-        generated_text = await loop.run_in_executor(
-            None,
-            generate_review_sync,
-            client,
-            model_to_use, 
-            system_prompt,
-            user_prompt,
-            [search_tool]
-        )
+        _load["queued"] += 1
+        _update_executor_metrics()
+        try:
+            await _generation_semaphore.acquire()
+        finally:
+            _load["queued"] -= 1
+        _load["generations"] += 1
+        try:
+            _update_executor_metrics()
+            # Почти дословные повторы уже выданных текстов площадки удаляют, такие кандидаты отбрасываем
+            for _ in range(TextSimilarity.MAX_REGENERATIONS + 1):
+                generated_text = await generate_review_async(
+                    client,
+                    GROQ_MODEL_NAME,
+                    system_prompt,
+                    user_prompt,
+                    [search_tool],
+                    company=company_info
+                )
+                if is_generation_error(generated_text) or not text_similarity.find_similar(generated_text):
+                    break
+                metrics.increment("ai.near_duplicate_rejections")
+                logger.info(f"Generated text for '{company_info}' is a near-duplicate, regenerating.")
+            else:
+                return "Ошибка: AI-модель выдает тексты, слишком похожие на уже выданные. Измените сценарий или напишите текст вручную."
+        finally:
+            _load["generations"] -= 1
+            _generation_semaphore.release()
+        metrics.increment("ai.generations")
         return generated_text
 
     except APIError as e:
+        metrics.increment("ai.generation_errors")
         logger.error(f"Groq API Error: {e}")
         return f"Ошибка AI-сервиса: {e.message}"
     except Exception as e:
+        metrics.increment("ai.generation_errors")
         logger.exception("An unknown error occurred during AI text generation!")
-        return "Произошла неизвестная ошибка при генерации текста. Администратор уже уведомлен через логи."
\ No newline at end of file
+        return "Произошла неизвестная ошибка при генерации текста. Администратор уже уведомлен через логи."
+    finally:
+        metrics.observe("ai.generation_seconds", time.perf_counter() - started)
+        _update_executor_metrics()
\ No newline at end of file
@@ -1,7 +1,12 @@
 # file: logic/cleanup_logic.py
 
-import logging
+import csv
 import datetime
+import gzip
+import logging
+import os
+import re
+import time
 from aiogram import Bot
 from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from aiogram.fsm.context import FSMContext
@@ -11,7 +16,9 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from database import db_manager
 from keyboards import reply, inline
 from states.user_states import UserState
-from config import Durations
+from config import BalanceReconciliation, Durations, OperationHistoryArchiving
+from utils import metrics
+from utils.money import Stars
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +62,144 @@ async def check_and_expire_links(bot: Bot, storage: BaseStorage):
         logger.exception("An error occurred during the check_and_expire_links job.")
 
 
+async def reconcile_link_counters():
+    """Сверяет счетчики пула ссылок с таблицей links. Запускается по расписанию."""
+    try:
+        drift = await db_manager.reconcile_link_counters()
+        if drift:
+            logger.warning(f"Link counters drifted by {drift} and were corrected.")
+            metrics.increment("link_counters.drift_corrected", drift)
+    except Exception:
+        logger.exception("An error occurred during the reconcile_link_counters job.")
+
+
+async def reconcile_user_balances():
+    """
+    Сверяет баланс каждого пользователя с суммой его операций. Пользователи идут
+    порциями по возрастанию id, так что в памяти не больше одной порции.
+    Расхождения только сообщаются: исправлять их нужно разбором конкретных операций.
+    """
+    try:
+        started = time.perf_counter()
+        after_user_id, checked, mismatched = 0, 0, 0
+        total_drift = Stars()
+        examples = []
+        while True:
+            rows = await db_manager.get_balance_reconciliation_chunk(after_user_id, BalanceReconciliation.CHUNK_SIZE)
+            if not rows:
+                break
+            for user_id, balance, operations_total in rows:
+                drift = Stars(balance) - Stars(operations_total)
+                if not drift:
+                    continue
+                mismatched += 1
+                total_drift += abs(drift)
+                if len(examples) < BalanceReconciliation.MAX_REPORTED:
+                    examples.append(f"{user_id}: баланс {Stars(balance)}, по операциям {Stars(operations_total)}")
+            checked += len(rows)
+            after_user_id = rows[-1][0]
+
+        metrics.set_gauge("balances.mismatched_users", mismatched)
+        metrics.set_gauge("balances.total_drift", float(total_drift))
+        elapsed = time.perf_counter() - started
+        if mismatched:
+            logger.warning(
+                f"Balance reconciliation: {mismatched}/{checked} users mismatch operation history "
+                f"(total drift {total_drift}) in {elapsed:.1f}s.\n" + "\n".join(examples)
+            )
+        else:
+            logger.info(f"Balance reconciliation: {checked} users match operation history ({elapsed:.1f}s).")
+    except Exception:
+        logger.exception("An error occurred during the reconcile_user_balances job.")
+
+
+_HISTORY_PARTITION_NAME = re.compile(r"^operation_history_p(\d{4})(\d{2})$")
+
+
+def _add_months(month_start: datetime.date, months: int) -> datetime.date:
+    index = month_start.year * 12 + month_start.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+async def _export_history_archive(name: str) -> str:
+    """Выгружает отсоединенную секцию в сжатый CSV. Файл появляется под итоговым именем только целиком."""
+    os.makedirs(OperationHistoryArchiving.ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(OperationHistoryArchiving.ARCHIVE_DIR, f"{name}.csv.gz")
+    tmp_path = path + ".tmp"
+    try:
+        with gzip.open(tmp_path, "wt", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(db_manager.HISTORY_ARCHIVE_COLUMNS)
+            async for partition in db_manager.stream_history_archive(name, OperationHistoryArchiving.EXPORT_BATCH):
+                writer.writerows(partition)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+async def maintain_operation_history():
+    """
+    Обслуживание секций operation_history: заранее создает секции на ближайшие месяцы
+    и отсоединяет в архив секции старше OperationHistoryArchiving.ARCHIVE_AFTER_MONTHS,
+    чтобы запросы и VACUUM работали только со свежими данными. В режиме "file"
+    отсоединенные секции выгружаются в сжатый CSV и удаляются из БД.
+    Запускается по расписанию и при старте.
+    """
+    try:
+        this_month = datetime.datetime.utcnow().date().replace(day=1)
+        partitions = set(await db_manager.get_operation_history_partitions())
+
+        for offset in range(OperationHistoryArchiving.PREMAKE_MONTHS + 1):
+            month_start = _add_months(this_month, offset)
+            name = f"operation_history_p{month_start:%Y%m}"
+            if name not in partitions:
+                moved = await db_manager.create_operation_history_partition(name, month_start, _add_months(month_start, 1))
+                logger.info(f"Operation history partition {name} created ({moved} rows moved from default partition).")
+
+        if OperationHistoryArchiving.ARCHIVE_AFTER_MONTHS > 0:
+            cutoff = _add_months(this_month, -OperationHistoryArchiving.ARCHIVE_AFTER_MONTHS)
+            for name in sorted(partitions):
+                match = _HISTORY_PARTITION_NAME.match(name)
+                if not match:
+                    continue
+                month_start = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+                month_end = _add_months(month_start, 1)
+                if month_end <= cutoff:
+                    rows = await db_manager.archive_operation_history_partition(
+                        name, month_start, month_end, OperationHistoryArchiving.LOCK_TIMEOUT_SECONDS
+                    )
+                    logger.info(f"Operation history partition {name} detached to archive ({rows} rows).")
+
+        if OperationHistoryArchiving.ARCHIVE_MODE == "file":
+            for name in await db_manager.get_history_archives_in_db():
+                path = await _export_history_archive(name)
+                await db_manager.drop_history_archive_table(name, path)
+                logger.info(f"Archived operation history partition {name} exported to {path}.")
+    except Exception:
+        logger.exception("An error occurred during the maintain_operation_history job.")
+
+
+async def verify_ledger_book():
+    """Полная проверка книги проводок. Запускается по расписанию."""
+    try:
+        started = time.perf_counter()
+        report = await db_manager.verify_ledger()
+        metrics.set_gauge("ledger.mismatches", report["mismatched"])
+        summary = (
+            f"{report['entries']} entries, {report['accounts']} accounts, "
+            f"{report['snapshots']} snapshots in {time.perf_counter() - started:.1f}s"
+        )
+        if report["mismatched"]:
+            logger.warning(f"Ledger verification: {report['mismatched']} mismatches ({summary}).\n" + "\n".join(report["examples"]))
+        else:
+            logger.info(f"Ledger verification passed: {summary}.")
+    except Exception:
+        logger.exception("An error occurred during the verify_ledger_book job.")
+
+
 async def handle_screenshot_timeout(bot: Bot, user_id: int, state: FSMContext):
     """Срабатывает, если пользователь не прислал скриншот вовремя."""
     user_data = await state.get_data()
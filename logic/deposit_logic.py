@@ -6,6 +6,7 @@ from math import floor
 from aiogram import Bot
 from database import db_manager
 from config import DEPOSIT_PLANS
+from utils.money import Stars
 
 logger = logging.getLogger(__name__)
 
@@ -32,13 +33,14 @@ async def process_deposits(bot: Bot):
             intervals_passed = floor(time_since_last_accrual / period_duration)
             
             if intervals_passed > 0:
-                new_balance = deposit.current_balance
+                # Проценты округляются до сотых на каждом периоде, как при начислении на реальный счет
+                new_balance = Stars(deposit.current_balance)
                 for _ in range(intervals_passed):
-                    new_balance *= (1 + plan['rate_percent'] / 100.0)
+                    new_balance += new_balance.percent(plan['rate_percent'])
                 
                 new_last_accrual_at = deposit.last_accrual_at + (intervals_passed * period_duration)
                 
-                await db_manager.update_deposit_balance(deposit.id, new_balance, new_last_accrual_at)
+                await db_manager.update_deposit_balance(deposit.id, float(new_balance), new_last_accrual_at)
                 logger.info(f"Accrued interest for deposit {deposit.id} ({intervals_passed} intervals). New balance: {new_balance:.2f}")
 
         # --- 2. Закрытие депозитов ---
@@ -54,13 +56,12 @@ async def process_deposits(bot: Bot):
             period_duration = datetime.timedelta(hours=plan['period_hours'])
             remaining_intervals = floor(remaining_time / period_duration) if remaining_time.total_seconds() > 0 else 0
 
-            final_balance = deposit.current_balance
-            if remaining_intervals > 0:
-                for _ in range(remaining_intervals):
-                    final_balance *= (1 + plan['rate_percent'] / 100.0)
+            final_balance = Stars(deposit.current_balance)
+            for _ in range(remaining_intervals):
+                final_balance += final_balance.percent(plan['rate_percent'])
 
             # Закрываем депозит
-            await db_manager.close_deposit(deposit.id, final_balance)
+            await db_manager.close_deposit(deposit.id, float(final_balance))
             
             try:
                 await bot.send_message(
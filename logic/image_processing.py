@@ -0,0 +1,109 @@
+# file: logic/image_processing.py
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Optional, Sequence, Tuple
+
+from PIL import Image, ImageOps
+from aiogram.types import PhotoSize
+
+from config import ImageProcessing
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Лениво создает пул процессов для обработки изображений."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=ImageProcessing.WORKERS)
+    return _executor
+
+
+def shutdown_image_executor():
+    """Останавливает пул процессов. Вызывается при остановке бота."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def get_max_edge_for_task(task: str) -> int:
+    return ImageProcessing.MAX_EDGE_BY_TASK.get(task, ImageProcessing.DEFAULT_MAX_EDGE)
+
+
+def _prepare_image_sync(data: bytes, max_edge: int, quality: int, crop_box: Optional[Tuple[float, float, float, float]]) -> bytes:
+    """
+    Выполняется в отдельном процессе: обрезает, уменьшает и пережимает изображение в JPEG.
+    Метаданные (EXIF и пр.) не переносятся в результат.
+    """
+    with Image.open(BytesIO(data)) as source:
+        img = ImageOps.exif_transpose(source)
+        if crop_box:
+            width, height = img.size
+            left, top, right, bottom = crop_box
+            img = img.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        output = BytesIO()
+        img.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+
+async def prepare_image_for_ocr(data: bytes, task: str, max_edge: Optional[int] = None) -> bytes:
+    """
+    Готовит скриншот к отправке в OCR, не блокируя event loop.
+    max_edge переопределяет размер из настроек задачи (нужно для замеров в ocr_benchmark.py).
+    При ошибке обработки возвращает исходные байты.
+    """
+    max_edge = max_edge or get_max_edge_for_task(task)
+    crop_box = ImageProcessing.CROP_BY_TASK.get(task)
+    loop = asyncio.get_running_loop()
+    try:
+        prepared = await loop.run_in_executor(
+            _get_executor(), _prepare_image_sync, data, max_edge, ImageProcessing.JPEG_QUALITY, crop_box
+        )
+        logger.info(f"Image for task '{task}' prepared: {len(data)} -> {len(prepared)} bytes (max edge {max_edge}).")
+        return prepared
+    except Exception as e:
+        logger.warning(f"Failed to preprocess image for task '{task}', sending original: {e}")
+        return data
+
+
+def _dhash_sync(data: bytes, hash_size: int = 8) -> int:
+    """Выполняется в отдельном процессе: считает 64-битный difference hash изображения."""
+    with Image.open(BytesIO(data)) as source:
+        img = ImageOps.exif_transpose(source).convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(img.getdata())
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+async def compute_dhash(data: bytes) -> int:
+    """Считает перцептивный хэш изображения в пуле процессов."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _dhash_sync, data)
+
+
+def pick_photo_size(photos: Sequence[PhotoSize], task: str) -> PhotoSize:
+    """
+    Выбирает наименьший PhotoSize, который не меньше нужного для задачи размера,
+    чтобы не скачивать оригинал без необходимости.
+    """
+    max_edge = get_max_edge_for_task(task)
+    for photo in sorted(photos, key=lambda p: max(p.width, p.height)):
+        if max(photo.width, photo.height) >= max_edge:
+            return photo
+    return photos[-1]
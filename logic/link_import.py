@@ -0,0 +1,136 @@
+# file: logic/link_import.py
+
+import csv
+import io
+import logging
+import time
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from config import LinkImport
+from database import db_manager
+from logic import review_text_pool
+from utils.url_normalizer import normalize_url, url_hash
+
+logger = logging.getLogger(__name__)
+
+# Колбэк прогресса: (обработано ссылок, всего ссылок)
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+# Курсор бэкфилла хэшей по id ссылок
+_backfill_cursor = {"link_id": 0}
+
+
+def iter_raw_links(content: str, is_csv: bool = False) -> Iterator[str]:
+    """Достает ссылки из текста: по одной на строку, для CSV - из каждой ячейки."""
+    if is_csv:
+        sample = content[:4096]
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(io.StringIO(content), dialect):
+            cells = [cell.strip() for cell in row if cell.strip()]
+            links = [cell for cell in cells if "://" in cell]
+            # Строка без ссылок (например, заголовок CSV) учитывается как одна неверная запись
+            yield from links or cells[:1]
+    else:
+        for line in content.splitlines():
+            if line.strip():
+                yield line.strip()
+
+
+def decode_document(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+async def import_links(
+    content: str,
+    platform: str,
+    is_fast_track: bool,
+    requires_photo: bool,
+    reward_amount: float,
+    gender_requirement: str,
+    campaign_tag: Optional[str],
+    is_csv: bool = False,
+    progress: Optional[ProgressCallback] = None
+) -> Tuple[List[int], int, int]:
+    """
+    Импортирует ссылки порциями по LinkImport.CHUNK_SIZE: каждая порция - один многострочный
+    INSERT ... ON CONFLICT DO NOTHING. Дубликаты отсекаются по хэшу нормализованного URL
+    как внутри файла, так и среди уже добавленных ссылок.
+    Возвращает (ID добавленных ссылок, количество дубликатов, количество неверных строк).
+    """
+    started = time.perf_counter()
+    added_link_ids: List[int] = []
+    duplicates, invalid = 0, 0
+    rows, seen_hashes = [], set()
+    for raw_url in iter_raw_links(content, is_csv):
+        normalized_url = normalize_url(raw_url)
+        if not normalized_url:
+            invalid += 1
+            continue
+        hash_value = url_hash(normalized_url)
+        if hash_value in seen_hashes:
+            duplicates += 1
+            continue
+        seen_hashes.add(hash_value)
+        rows.append({
+            "url": raw_url,
+            "platform": platform,
+            "is_fast_track": is_fast_track,
+            "requires_photo": requires_photo,
+            "reward_amount": reward_amount,
+            "gender_requirement": gender_requirement,
+            "campaign_tag": campaign_tag,
+            "url_hash": hash_value,
+        })
+
+    total = len(rows)
+    for start in range(0, total, LinkImport.CHUNK_SIZE):
+        chunk = rows[start:start + LinkImport.CHUNK_SIZE]
+        added_ids = await db_manager.bulk_insert_links(chunk)
+        added_link_ids.extend(added_ids)
+        duplicates += len(chunk) - len(added_ids)
+        if progress:
+            await progress(start + len(chunk), total)
+
+    logger.info(
+        f"Link import for {platform}: {len(added_link_ids)} added, {duplicates} duplicates, "
+        f"{invalid} invalid in {time.perf_counter() - started:.2f}s."
+    )
+
+    # Тексты для заданий с фото выдаются вручную, для остальных греем пул заранее
+    if not requires_photo:
+        review_text_pool.schedule_warming(added_link_ids, platform)
+    return added_link_ids, duplicates, invalid
+
+
+async def backfill_link_url_hashes():
+    """
+    Досчитывает хэши URL для ссылок, добавленных до появления проверки дубликатов.
+    Запускается по расписанию, пока есть ссылки без хэша.
+    """
+    rows = await db_manager.get_links_without_url_hash(after_id=_backfill_cursor["link_id"], limit=LinkImport.BACKFILL_BATCH)
+    if not rows:
+        _backfill_cursor["link_id"] = 0
+        return
+    _backfill_cursor["link_id"] = rows[-1][0]
+
+    hashes, seen = [], set()
+    for link_id, platform, url in rows:
+        normalized_url = normalize_url(url)
+        if not normalized_url:
+            continue
+        key = (platform, url_hash(normalized_url))
+        # Старые дубликаты внутри порции: хэш получает только первая ссылка
+        if key in seen:
+            continue
+        seen.add(key)
+        hashes.append((link_id, platform, key[1]))
+
+    updated = await db_manager.set_link_url_hashes(hashes)
+    logger.info(f"Link url_hash backfill: {updated}/{len(rows)} links hashed.")
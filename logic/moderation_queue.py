@@ -0,0 +1,138 @@
+# file: logic/moderation_queue.py
+
+import datetime
+import logging
+from typing import List, Optional
+
+from aiogram import Bot
+
+from config import ModerationQueue
+from database import db_manager
+from logic import admin_roles
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Типы задач, которые проходят через очередь модерации
+QUEUED_TASK_TYPES = (
+    "google_final_verdict",
+    "yandex_with_text_final_verdict",
+    "yandex_without_text_final_verdict",
+    "other_hold_check",
+)
+# В каких статусах должен быть отзыв, чтобы задача по нему была актуальна
+EXPECTED_REVIEW_STATUSES = {
+    "google_final_verdict": ("pending",),
+    "yandex_with_text_final_verdict": ("pending",),
+    "yandex_without_text_final_verdict": ("pending",),
+    "other_hold_check": ("on_hold", "awaiting_confirmation"),
+}
+TASK_TYPE_NAMES = {
+    "google_final_verdict": "Google: финальная проверка",
+    "yandex_with_text_final_verdict": "Yandex (с текстом): финальная проверка",
+    "yandex_without_text_final_verdict": "Yandex (без текста): финальная проверка",
+    "other_hold_check": "Проверка после холда",
+}
+
+
+def get_lease_seconds() -> int:
+    return ModerationQueue.LEASE_MINUTES * 60
+
+
+async def claim_review(bot: Bot, review_id: int, admin_id: int) -> Optional[str]:
+    """
+    Закрепляет отзыв за админом перед вынесением решения.
+    Возвращает текст для алерта, если отзыв уже взят другим админом или обработан, иначе None.
+    """
+    result, holder_id = await db_manager.claim_moderation_task(review_id, admin_id, get_lease_seconds())
+    if result == 'busy':
+        metrics.increment("moderation_queue.claim_conflicts")
+        holder_name = await admin_roles.get_admin_username(bot, holder_id) if holder_id else "другой админ"
+        return f"Отзыв уже обрабатывает {holder_name}."
+    if result == 'done':
+        return "Этот отзыв уже обработан."
+    if result == 'untracked':
+        metrics.increment("moderation_queue.untracked")
+        logger.warning(f"Review {review_id} is not in the moderation queue; admin {admin_id} acts without a lease.")
+    return None
+
+
+async def complete_review(review_id: int, admin_id: int) -> Optional[str]:
+    """
+    Закрывает задачу перед применением решения, проверяя аренду в момент действия.
+    Возвращает текст для алерта, если аренда истекла или задачу взял другой админ, иначе None.
+    Если решение затем не применилось, задачу нужно вернуть release_moderation_task.
+    """
+    if await db_manager.complete_moderation_task(review_id, admin_id):
+        return None
+    metrics.increment("moderation_queue.lease_lost")
+    return "Время на проверку истекло, задачу мог взять другой админ. Решение не применено, откройте отзыв заново."
+
+
+async def get_admin_task_types(admin_id: int) -> List[str]:
+    """Типы задач из очереди, за которые отвечает админ."""
+    role_keys = {admin_roles.TASK_ROLES[task_type] for task_type in QUEUED_TASK_TYPES}
+    settings = {s.key: s.value for s in await db_manager.get_system_settings_batch(list(role_keys))}
+    task_types = []
+    for task_type in QUEUED_TASK_TYPES:
+        role_key = admin_roles.TASK_ROLES[task_type]
+        admins = admin_roles.parse_role_admins(settings.get(role_key)) or {admin_roles.get_default_admin(role_key): 1}
+        if admin_id in admins:
+            task_types.append(task_type)
+    return task_types
+
+
+async def claim_next_review(admin_id: int, task_types: List[str]):
+    """
+    Берет следующую задачу из очереди. Задачи по уже обработанным отзывам
+    (решение вынесли в обход очереди) закрываются и пропускаются.
+    Возвращает (задача, отзыв) или (None, None).
+    """
+    while True:
+        item = await db_manager.claim_next_moderation_task(admin_id, task_types, get_lease_seconds())
+        if not item:
+            return None, None
+        review = await db_manager.get_review_by_id(item.review_id)
+        if review and review.status in EXPECTED_REVIEW_STATUSES.get(item.task_type, ()):
+            metrics.increment("moderation_queue.pulled")
+            return item, review
+        await db_manager.complete_moderation_task(item.review_id, admin_id)
+        metrics.increment("moderation_queue.stale_skipped")
+
+
+async def requeue_expired_leases():
+    """Возвращает в очередь задачи с истекшей арендой. Запускается по расписанию."""
+    count = await db_manager.requeue_expired_moderation_leases()
+    if count:
+        metrics.increment("moderation_queue.requeued", count)
+        logger.info(f"Moderation queue: {count} expired leases returned to the queue.")
+
+
+def _format_age(created_at: datetime.datetime) -> str:
+    minutes = int((datetime.datetime.utcnow() - created_at).total_seconds() // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    return f"{minutes // 60} ч {minutes % 60} мин"
+
+
+async def format_queue_stats() -> str:
+    """Текущая глубина очереди и возраст самой старой задачи по типам."""
+    stats = await db_manager.get_moderation_queue_stats()
+    if not stats:
+        return "📥 <b>Очередь модерации пуста.</b>"
+
+    by_type = {}
+    for task_type, status, count, oldest in stats:
+        entry = by_type.setdefault(task_type, {"queued": 0, "claimed": 0, "oldest": oldest})
+        entry[status] = count
+        entry["oldest"] = min(entry["oldest"], oldest)
+
+    lines = ["📥 <b>Очередь модерации:</b>"]
+    for task_type, entry in by_type.items():
+        name = TASK_TYPE_NAMES.get(task_type, task_type)
+        metrics.set_gauge(f"moderation_queue.depth.{task_type}", entry["queued"])
+        lines.append(
+            f"• {name}: в очереди {entry['queued']}, в работе {entry['claimed']}, "
+            f"самая старая {_format_age(entry['oldest'])}"
+        )
+    return "\n".join(lines)
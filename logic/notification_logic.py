@@ -1,43 +1,93 @@
-
 # file: logic/notification_logic.py
 
+import asyncio
 import logging
+from typing import Dict, Tuple
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import SubscriberNotifications
 from database import db_manager
+from utils.rate_limiter import RateLimiter
 
 logger = logging.getLogger(__name__)
 
-async def notify_subscribers(platform: str, gender: str, bot: Bot):
-    """
-    Находит подписчиков на определенный тип заданий и уведомляет их.
-    """
-    try:
-        subscribers = await db_manager.find_subscribers(platform, gender)
-        if not subscribers:
-            return
+# Общий лимитер для всех рассылок подписчикам
+_rate_limiter = RateLimiter(SubscriberNotifications.RATE_PER_SECOND)
+# Запланированные и идущие рассылки по (платформа, пол)
+_pending_notifications: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+def _build_message_text(platform: str, gender: str) -> str:
+    gender_map = {'male': 'мужских', 'female': 'женских', 'any': 'любых'}
+    platform_map = {'google_maps': 'Google', 'yandex_with_text': 'Yandex (с текстом)', 'yandex_without_text': 'Yandex (без текста)'}
 
-        gender_map = {'male': 'мужских', 'female': 'женских', 'any': 'любых'}
-        platform_map = {'google_maps': 'Google', 'yandex_with_text': 'Yandex (с текстом)', 'yandex_without_text': 'Yandex (без текста)'}
-        
-        gender_text = gender_map.get(gender, 'неопределенных')
-        platform_text = platform_map.get(platform, platform)
+    gender_text = gender_map.get(gender, 'неопределенных')
+    platform_text = platform_map.get(platform, platform)
 
-        message_text = (
-            f"🎉 Появились новые задания для **{gender_text}** аккаунтов на платформе **{platform_text}**, на которые вы подписывались! "
-            "Заходите в раздел 'Заработок', чтобы взять задание."
-        )
+    return (
+        f"🎉 Появились новые задания для **{gender_text}** аккаунтов на платформе **{platform_text}**, на которые вы подписывались! "
+        "Заходите в раздел 'Заработок', чтобы взять задание."
+    )
 
-        user_ids_to_notify = [sub.user_id for sub in subscribers]
 
-        for user_id in user_ids_to_notify:
+async def _send_to_subscriber(bot: Bot, user_id: int, message_text: str, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        for attempt in range(2):
+            await _rate_limiter.wait()
             try:
                 await bot.send_message(user_id, message_text)
+                return True
+            except TelegramRetryAfter as e:
+                if attempt:
+                    logger.warning(f"Failed to send task notification to subscriber {user_id}: flood control.")
+                    return False
+                await asyncio.sleep(e.retry_after)
             except Exception as e:
                 logger.warning(f"Failed to send task notification to subscriber {user_id}: {e}")
-        
-        # Удаляем подписки после уведомления
-        await db_manager.delete_subscriptions(user_ids_to_notify, platform, gender)
-        logger.info(f"Notified and unsubscribed {len(user_ids_to_notify)} users for {platform}/{gender} tasks.")
+                return False
+    return False
+
+
+async def _notify_subscribers_now(platform: str, gender: str, bot: Bot):
+    """
+    Рассылает уведомления порциями: каждая порция подписок сначала удаляется из БД,
+    затем отправляется. При падении процесса теряется не больше одной порции, повторных уведомлений нет.
+    """
+    message_text = _build_message_text(platform, gender)
+    semaphore = asyncio.Semaphore(SubscriberNotifications.CONCURRENCY)
+    notified, total = 0, 0
+
+    while True:
+        user_ids = await db_manager.claim_subscribers_chunk(platform, gender, SubscriberNotifications.CHUNK_SIZE)
+        if not user_ids:
+            break
+        results = await asyncio.gather(*(_send_to_subscriber(bot, user_id, message_text, semaphore) for user_id in user_ids))
+        notified += sum(results)
+        total += len(user_ids)
 
+    if total:
+        logger.info(f"Notified {notified}/{total} unsubscribed users for {platform}/{gender} tasks.")
+
+
+async def _run_coalesced(platform: str, gender: str, bot: Bot):
+    try:
+        await asyncio.sleep(SubscriberNotifications.COALESCE_SECONDS)
+        await _notify_subscribers_now(platform, gender, bot)
     except Exception as e:
-        logger.exception(f"An error occurred in notify_subscribers for {platform}/{gender}: {e}")
\ No newline at end of file
+        logger.exception(f"An error occurred in notify_subscribers for {platform}/{gender}: {e}")
+    finally:
+        _pending_notifications.pop((platform, gender), None)
+
+
+async def notify_subscribers(platform: str, gender: str, bot: Bot):
+    """
+    Уведомляет подписчиков на определенный тип заданий в фоне.
+    Повторные вызовы, пока рассылка запланирована или идет, объединяются с ней:
+    подписки, появившиеся за это время, попадут в следующие порции той же рассылки.
+    """
+    key = (platform, gender)
+    if key in _pending_notifications:
+        return
+    _pending_notifications[key] = asyncio.create_task(_run_coalesced(platform, gender, bot))
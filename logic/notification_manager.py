@@ -1,5 +1,6 @@
 # file: logic/notification_manager.py
 
+import asyncio
 import logging
 import re
 from typing import List, Optional
@@ -11,8 +12,9 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from database import db_manager
 from logic import admin_roles 
+from logic.admin_routing import route_task, queue_tracker
 from keyboards import inline 
-from config import Durations, SUPER_ADMIN_ID
+from config import AdminRouting, Durations, SUPER_ADMIN_ID
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +27,10 @@ async def send_notification_to_admins(
     keyboard: Optional[InlineKeyboardMarkup] = None,
     return_sent_messages: bool = False,
     original_user_id: Optional[int] = None # ID пользователя, который отправил задачу
-) -> Optional[List[Message]]:
+) -> Optional[List[Optional[Message]]]:
     """
     Отправляет уведомление ответственным администраторам или свободному стажеру, учитывая DND режим.
+    При return_sent_messages возвращает сообщения в порядке получателей, None - если доставка не удалась.
     """
     
     # 1. Попытка найти свободного стажера для подходящих задач
@@ -45,11 +48,9 @@ async def send_notification_to_admins(
         task_platform_family = next((v for k, v in platform_map.items() if k in task_type), None)
 
         if task_platform_family:
-            intern = await db_manager.find_available_intern(task_platform_family)
-            if intern and original_user_id:
-                logger.info(f"Task '{task_type}' is being routed to available intern ID: {intern.id}")
-                
-                await db_manager.set_intern_busy_status(intern.id, is_busy=True)
+            intern_id = await db_manager.claim_available_intern(task_platform_family) if original_user_id else None
+            if intern_id:
+                logger.info(f"Task '{task_type}' is being routed to available intern ID: {intern_id}")
                 
                 context_map = {
                     "yandex_with_text_profile_screenshot": "yandex_profile_check",
@@ -65,21 +66,24 @@ async def send_notification_to_admins(
                 
                 try:
                     if photo_id:
-                        sent_msg = await bot.send_photo(chat_id=intern.id, photo=photo_id, caption=text, reply_markup=intern_keyboard)
+                        sent_msg = await bot.send_photo(chat_id=intern_id, photo=photo_id, caption=text, reply_markup=intern_keyboard)
                     else:
-                        sent_msg = await bot.send_message(chat_id=intern.id, text=text, reply_markup=intern_keyboard)
+                        sent_msg = await bot.send_message(chat_id=intern_id, text=text, reply_markup=intern_keyboard)
 
                     return [sent_msg] if return_sent_messages else None
                 except Exception as e:
-                    logger.error(f"Failed to send task to intern {intern.id}, rerouting to admins. Error: {e}")
-                    await db_manager.set_intern_busy_status(intern.id, is_busy=False)
+                    logger.error(f"Failed to send task to intern {intern_id}, rerouting to admins. Error: {e}")
+                    await db_manager.set_intern_busy_status(intern_id, is_busy=False)
 
-    # 2. Если стажер не найден или задача не для него, отправляем админам
-    admin_ids = await admin_roles.get_admins_for_task(task_type)
-    active_admins = await db_manager.get_active_admins(admin_ids)
+    # 2. Если стажер не найден или задача не для него, отправляем админам.
+    # Задачи ролей получает один админ из набора роли, выбранный по стратегии распределения.
+    if task_type in admin_roles.TASK_ROLES:
+        routed_admin = await route_task(task_type)
+        active_admins = [routed_admin] if routed_admin else []
+    else:
+        admin_ids = await admin_roles.get_admins_for_task(task_type)
+        active_admins = await db_manager.get_active_admins(admin_ids)
     
-    sent_messages = []
-
     if not active_admins:
         logger.warning(f"No active admins found for task type '{task_type}'. Notification not sent.")
         try:
@@ -87,17 +91,40 @@ async def send_notification_to_admins(
         except: pass
         return None
 
-    for admin_id in active_admins:
+    semaphore = asyncio.Semaphore(AdminRouting.NOTIFY_CONCURRENCY)
+    results = await asyncio.gather(*(
+        _send_to_admin(bot, admin_id, text, photo_id, keyboard, semaphore) for admin_id in active_admins
+    ))
+    # gather сохраняет порядок админов; недоставленные остаются None, чтобы индексы совпадали с active_admins
+    return list(results) if return_sent_messages else None
+
+
+async def _send_to_admin(
+    bot: Bot,
+    admin_id: int,
+    text: str,
+    photo_id: Optional[str],
+    keyboard: Optional[InlineKeyboardMarkup],
+    semaphore: asyncio.Semaphore
+) -> Optional[Message]:
+    """Отправляет уведомление одному админу. Медленный админ не задерживает остальных дольше таймаута."""
+    async with semaphore:
         try:
             if photo_id:
-                sent_msg = await bot.send_photo(chat_id=admin_id, photo=photo_id, caption=text, reply_markup=keyboard)
+                send = bot.send_photo(chat_id=admin_id, photo=photo_id, caption=text, reply_markup=keyboard)
             else:
-                sent_msg = await bot.send_message(chat_id=admin_id, text=text, reply_markup=keyboard, disable_web_page_preview=True)
-            if return_sent_messages:
-                sent_messages.append(sent_msg)
+                send = bot.send_message(chat_id=admin_id, text=text, reply_markup=keyboard, disable_web_page_preview=True)
+            sent_msg = await asyncio.wait_for(send, timeout=AdminRouting.NOTIFY_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out sending notification to admin {admin_id}.")
+            return None
         except TelegramBadRequest as e:
             logger.error(f"TelegramBadRequest when sending notification to admin {admin_id}: {e}")
+            return None
         except Exception as e:
             logger.error(f"Failed to send notification to admin {admin_id}: {e}")
+            return None
 
-    return sent_messages if return_sent_messages else None
\ No newline at end of file
+    if keyboard:
+        queue_tracker.assign(admin_id, sent_msg.message_id)
+    return sent_msg
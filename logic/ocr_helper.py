@@ -4,7 +4,6 @@ import logging
 import datetime
 import re
 import json
-from io import BytesIO
 from itertools import cycle
 from typing import Literal, Dict, Any, List, Optional
 
@@ -14,6 +13,8 @@ from google.api_core import exceptions as google_exceptions
 from aiogram import Bot
 
 from config import GOOGLE_API_KEYS, ADMIN_ID_1
+from logic.image_processing import prepare_image_for_ocr
+from utils.file_cache import file_cache
 
 logger = logging.getLogger(__name__)
 
@@ -51,15 +52,10 @@ class GeminiKeyManager:
 key_manager = GeminiKeyManager(GOOGLE_API_KEYS)
 
 
-async def _get_image_from_telegram(bot: Bot, file_id: str) -> BytesIO | None:
-    """Скачивает файл по file_id и возвращает его в виде BytesIO."""
+async def _get_image_from_telegram(bot: Bot, file_id: str) -> bytes | None:
+    """Получает файл по file_id через дисковый кэш (скачивает из Telegram только при промахе)."""
     try:
-        file_info = await bot.get_file(file_id)
-        if not file_info.file_path:
-            return None
-        
-        image_bytes = await bot.download_file(file_info.file_path)
-        return image_bytes
+        return await file_cache.get(bot, file_id)
     except Exception as e:
         logger.error(f"Failed to download image with file_id {file_id}: {e}")
         return None
@@ -76,7 +72,18 @@ async def analyze_screenshot(bot: Bot, file_id: str, task: AnalysisTask) -> Dict
     if not image_bytes:
         return {"status": "error", "message": "Failed to download image from Telegram."}
 
-    image_for_api = {'mime_type': 'image/jpeg', 'data': image_bytes.getvalue()}
+    prepared_image = await prepare_image_for_ocr(image_bytes, task)
+    return await analyze_image(prepared_image, task, bot)
+
+
+async def analyze_image(image_bytes: bytes, task: AnalysisTask, bot: Optional[Bot] = None) -> Dict[str, Any]:
+    """
+    Отправляет уже подготовленный JPEG в Gemini. bot нужен только для уведомлений
+    админа об исчерпанных ключах; без него (замеры в ocr_benchmark.py) уведомления не шлются.
+    """
+    if not GOOGLE_API_KEYS:
+        return {"status": "error", "message": "OCR service is not configured."}
+    image_for_api = {'mime_type': 'image/jpeg', 'data': image_bytes}
     
     today_in_almaty = datetime.datetime.now(pytz.timezone('Asia/Almaty')).date()
     today_str = today_in_almaty.strftime('%d.%m.%Y')
@@ -179,7 +186,8 @@ async def analyze_screenshot(bot: Bot, file_id: str, task: AnalysisTask) -> Dict
         api_key = key_manager.get_next_key()
         if not api_key:
             try:
-                await bot.send_message(ADMIN_ID_1, "🚨 ВНИМАНИЕ! Все API ключи для распознавания изображений (Google Gemini) исчерпали свой дневной лимит. Автопроверка скриншотов отключена до следующего дня.")
+                if bot:
+                    await bot.send_message(ADMIN_ID_1, "🚨 ВНИМАНИЕ! Все API ключи для распознавания изображений (Google Gemini) исчерпали свой дневной лимит. Автопроверка скриншотов отключена до следующего дня.")
             except Exception as e:
                 logger.error(f"Failed to notify admin about exhausted keys: {e}")
             return {"status": "error", "message": "All API keys are exhausted."}
@@ -210,7 +218,8 @@ async def analyze_screenshot(bot: Bot, file_id: str, task: AnalysisTask) -> Dict
             logger.warning(f"Quota exhausted for Google API key ...{api_key[-4:]}. Trying next key.")
             key_manager.mark_key_as_exhausted(api_key)
             try:
-                await bot.send_message(ADMIN_ID_1, f"🔔 API ключ Google Gemini (заканчивается на ...{api_key[-4:]}) исчерпал свой дневной лимит. Бот автоматически переключился на следующий.")
+                if bot:
+                    await bot.send_message(ADMIN_ID_1, f"🔔 API ключ Google Gemini (заканчивается на ...{api_key[-4:]}) исчерпал свой дневной лимит. Бот автоматически переключился на следующий.")
             except Exception as admin_notify_error:
                 logger.error(f"Failed to notify admin about exhausted key: {admin_notify_error}")
             continue
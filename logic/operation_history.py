@@ -0,0 +1,93 @@
+# file: logic/operation_history.py
+
+import csv
+import datetime
+import html
+import logging
+import os
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from database import db_manager
+from database.models import OperationHistory
+
+logger = logging.getLogger(__name__)
+
+OPERATION_TITLES = {
+    "REVIEW_APPROVED": "✅ Одобрен отзыв", "PROMO_ACTIVATED": "🎁 Активация промокода",
+    "WITHDRAWAL": "📤 Запрос на вывод", "FINE": "💸 Штраф",
+    "TRANSFER_SENT": "➡️ Перевод звезд", "TRANSFER_RECEIVED": "⬅️ Получение звезд",
+    "TOP_REWARD": "🏆 Награда", "DEPOSIT_OPEN": "🏦 Открыт депозит",
+    "DEPOSIT_CLOSE": "💰 Закрыт депозит", "DONATION": "💖 Пожертвование",
+    "HELP_RECEIVED": "🎁 Помощь новичку", "STAKE_HOLD": "🔒 Залог",
+    "STAKE_RETURN": "🔓 Возврат залога", "COINFLIP": "🪙 Орёл и Решка",
+    "BALANCE_OPENING": "📒 Входящий остаток"
+}
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode_cursor(op: OperationHistory) -> str:
+    """Позиция операции для callback_data: микросекунды created_at и id."""
+    micros = (op.created_at - _EPOCH) // datetime.timedelta(microseconds=1)
+    return f"{micros}:{op.id}"
+
+
+def decode_cursor(value: str) -> Optional[db_manager.HistoryCursor]:
+    try:
+        micros, op_id = value.split(":")
+        return _EPOCH + datetime.timedelta(microseconds=int(micros)), int(op_id)
+    except ValueError:
+        return None
+
+
+def format_history_page(operations: List[OperationHistory], usernames: Dict[int, str], is_first_page: bool) -> str:
+    text = "📜 <b>История операций</b>\n\n"
+    if not operations:
+        return text + ("Операций не найдено." if is_first_page else "Более ранних операций нет.")
+
+    for op in operations:
+        time_str = op.created_at.strftime('%d.%m.%Y %H:%M UTC')
+        amount_str = f"{op.amount:+.2f} ⭐" if op.amount > 0 else f"{op.amount:.2f} ⭐"
+        op_description = OPERATION_TITLES.get(op.operation_type, "Неизвестная операция")
+
+        description_suffix = ""
+        if op.operation_type == "TRANSFER_SENT":
+            description_suffix = f" ({html.escape(op.description or '')})"
+            if op.comment: description_suffix += " (с комм.)"
+            if op.media_json and op.media_json != '[]': description_suffix += " (с медиа)"
+        elif op.operation_type == "TRANSFER_RECEIVED":
+            username = usernames.get(op.sender_id)
+            sender_info = "Аноним" if op.is_anonymous else (f"от @{username}" if username else f"от ID: {op.sender_id}")
+            description_suffix = f" ({sender_info})"
+        elif op.description:
+            description_suffix = f" ({html.escape(op.description)})"
+
+        text += f"<code>{time_str}</code>: {op_description} {amount_str}{description_suffix}\n"
+    return text
+
+
+async def export_history_csv(user_id: int) -> Tuple[str, int]:
+    """
+    Выгружает всю историю пользователя во временный CSV-файл, записывая строки порциями
+    прямо из серверного курсора. Возвращает (путь к файлу, число операций);
+    файл удаляет вызывающий код.
+    """
+    fd, path = tempfile.mkstemp(prefix=f"history_{user_id}_", suffix=".csv")
+    rows = 0
+    try:
+        # BOM, чтобы Excel открыл кириллицу
+        with os.fdopen(fd, "w", encoding="utf-8-sig", newline="") as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow(["created_at_utc", "operation", "amount", "description", "sender"])
+            async for partition in db_manager.stream_operation_history(user_id):
+                writer.writerows(
+                    (created_at.strftime('%Y-%m-%d %H:%M:%S'), OPERATION_TITLES.get(op_type, op_type), f"{amount:.2f}", description or "", sender or "")
+                    for created_at, op_type, amount, description, sender in partition
+                )
+                rows += len(partition)
+    except Exception:
+        os.remove(path)
+        raise
+    logger.info(f"Operation history export for user {user_id}: {rows} rows.")
+    return path, rows
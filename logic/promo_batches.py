@@ -0,0 +1,107 @@
+# file: logic/promo_batches.py
+
+import csv
+import datetime
+import io
+import logging
+import re
+import secrets
+import time
+from typing import List, Optional, Set, Tuple
+
+from config import PromoCodes
+from database import db_manager
+from utils import promo_cache
+
+logger = logging.getLogger(__name__)
+
+# Без похожих друг на друга символов (0/O, 1/I/L), чтобы код легко переписать с картинки
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+BATCH_TAG_PATTERN = re.compile(r"^[A-Z0-9_]{1,16}$")
+# Сколько последних пачек показывать в админке
+BATCHES_SHOWN = 20
+
+# Метки пачек, которые генерируются прямо сейчас: в БД пачка видна только после первой вставки
+_batches_in_progress: Set[str] = set()
+
+
+def generate_code(batch_tag: str, length: int = PromoCodes.BATCH_CODE_LENGTH) -> str:
+    """Случайный код вида TAG-XXXXXXXX из криптографически стойкого генератора."""
+    return f"{batch_tag}-" + "".join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def _new_candidates(batch_tag: str, count: int, taken: Set[str]) -> List[str]:
+    candidates: Set[str] = set()
+    while len(candidates) < count:
+        code = generate_code(batch_tag)
+        if code not in taken:
+            candidates.add(code)
+    return list(candidates)
+
+
+async def generate_promo_batch(batch_tag: str, count: int, reward: float, condition: str = "no_condition") -> Optional[List[str]]:
+    """
+    Генерирует count одноразовых кодов пачки. Повторы внутри пачки отсекаются до вставки,
+    совпадения с уже существующими кодами - через ON CONFLICT DO NOTHING: вместо
+    не вставленных кодов генерируются новые, пока не наберется нужное количество.
+    Метка должна быть новой: коды, дописанные в существующую пачку, смешали бы ее статистику.
+    Возвращает созданные коды или None, если пачка с такой меткой уже есть.
+    """
+    if batch_tag in _batches_in_progress:
+        return None
+    _batches_in_progress.add(batch_tag)
+    try:
+        if await db_manager.promo_batch_exists(batch_tag):
+            return None
+        return await _generate_codes(batch_tag, count, reward, condition)
+    finally:
+        _batches_in_progress.discard(batch_tag)
+
+
+async def _generate_codes(batch_tag: str, count: int, reward: float, condition: str) -> List[str]:
+    started = time.perf_counter()
+    created: List[str] = []
+    taken: Set[str] = set()
+    attempts = 0
+    while len(created) < count and attempts < PromoCodes.BATCH_INSERT_ATTEMPTS:
+        attempts += 1
+        candidates = _new_candidates(batch_tag, count - len(created), taken)
+        taken.update(candidates)
+        for start in range(0, len(candidates), PromoCodes.BATCH_CHUNK_SIZE):
+            chunk = candidates[start:start + PromoCodes.BATCH_CHUNK_SIZE]
+            rows = [
+                {"code": code, "condition": condition, "reward": reward, "total_uses": 1, "current_uses": 0, "batch_tag": batch_tag}
+                for code in chunk
+            ]
+            inserted = await db_manager.bulk_insert_promo_codes(rows)
+            created.extend(inserted)
+            await promo_cache.forget(*inserted)
+
+    if len(created) < count:
+        logger.error(f"Promo batch {batch_tag}: only {len(created)}/{count} codes created after {attempts} attempts.")
+    logger.info(f"Promo batch {batch_tag}: {len(created)} codes created in {time.perf_counter() - started:.2f}s.")
+    return created
+
+
+async def export_batch_csv(batch_tag: str) -> bytes:
+    """Выгрузка кодов пачки в CSV (с BOM, чтобы Excel открыл кириллицу)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+    writer.writerow(["code", "reward", "used", "total_uses"])
+    for code, reward, current_uses, total_uses in await db_manager.get_promo_batch_codes(batch_tag):
+        writer.writerow([code, f"{reward:.2f}", current_uses, total_uses])
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def format_batch_stats(stats: List[Tuple[str, int, int, float, datetime.datetime]]) -> str:
+    if not stats:
+        return "📦 <b>Пачки промокодов</b>\n\nСгенерированных пачек пока нет."
+
+    lines = ["📦 <b>Пачки промокодов</b>\n"]
+    for batch_tag, total, used, paid, created_at in stats:
+        created = created_at.strftime('%d.%m.%Y %H:%M') if created_at else 'N/A'
+        lines.append(
+            f"• <code>{batch_tag}</code>: активировано {used}/{total} "
+            f"({used / total:.0%}), выплачено {paid:.2f} ⭐, создана {created} UTC"
+        )
+    return "\n".join(lines)
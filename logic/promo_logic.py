@@ -1,7 +1,8 @@
 # file: logic/promo_logic.py
 
 from database import db_manager, models
-from sqlalchemy.exc import IntegrityError
+from config import PromoCodes
+from utils import metrics, promo_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,62 +12,46 @@ async def activate_promo_code_logic(user_id: int, code: str) -> tuple[str, model
     Основная логика активации промокода.
     Возвращает кортеж: (статус_сообщения, объект_промокода_или_None).
     """
-    # 0. Проверить, нет ли у пользователя уже активного промокода с условием
-    any_pending_activation = await db_manager.find_pending_promo_activation(user_id)
-    if any_pending_activation:
+    # Несуществующие коды отсекаются до БД: перебор кодов не нагружает Postgres
+    if len(code) > PromoCodes.MAX_CODE_LENGTH or await promo_cache.is_unknown(code):
+        metrics.increment("promo.negative_cache_hits")
+        return "❌ Промокод не найден. Проверьте правильность ввода.", None
+
+    result, promo = await db_manager.claim_promo_code(user_id, code)
+
+    if result == 'pending_exists':
         message = (
             "❌ У вас уже есть активный промокод, требующий выполнения задания. "
             "Вы не можете активировать новый, пока не выполните или не отмените текущее задание."
         )
         return message, None
-
-    # 1. Найти промокод в базе с блокировкой строки для предотвращения гонки состояний
-    promo = await db_manager.get_promo_by_code(code, for_update=True)
-    if not promo:
+    if result == 'not_found':
+        await promo_cache.remember_unknown(code)
         return "❌ Промокод не найден. Проверьте правильность ввода.", None
-
-    # 2. Проверить, не закончились ли активации
-    if promo.current_uses >= promo.total_uses:
+    if result == 'exhausted':
         return "😔 К сожалению, лимит активаций для этого промокода исчерпан.", None
-
-    # 3. Проверить, не активировал ли этот пользователь его ранее
-    existing_activation = await db_manager.get_user_promo_activation(user_id, promo.id)
-    if existing_activation:
+    if result == 'already_used':
         return "❗️ Вы уже активировали этот промокод.", None
-        
-    # 4. Обработка условий
-    # Если условие не требуется
-    if promo.condition == "no_condition":
-        try:
-            # --- ИЗМЕНЕНИЕ: Логика вынесена в db_manager для атомарности ---
-            await db_manager.create_promo_activation(user_id, promo.id, status='completed')
-            await db_manager.update_balance(user_id, promo.reward)
-            logger.info(f"User {user_id} activated promo '{promo.code}' with no condition. Rewarded {promo.reward} stars.")
-            return f"✅ Промокод успешно активирован! Вам начислено {promo.reward} ⭐.", promo
-        except IntegrityError:
-            # Этот блок сработает, если, например, промокод был удален прямо перед активацией
-            logger.error(f"Integrity error on activating no-condition promo for user {user_id} and promo {promo.code}")
-            return "❌ Произошла ошибка базы данных при активации промокода. Попробуйте снова.", None
 
-    # Если условие требуется
-    else:
-        # --- ИЗМЕНЕНИЕ: Передаем promo.id вместо всего объекта ---
-        await db_manager.create_promo_activation(user_id, promo.id, status='pending_condition')
-        logger.info(f"User {user_id} activated promo '{promo.code}'. Pending condition: {promo.condition}.")
-        
-        condition_map = {
-            "google_review": "написать и получить одобрение на отзыв в Google Картах",
-            "yandex_review": "написать и получить одобрение на отзыв в Yandex Картах",
-            "gmail_account": "создать и получить одобрение на аккаунт Gmail"
-        }
-        condition_text = condition_map.get(promo.condition, "неизвестное условие")
-        
-        message = (
-            f"✅ Промокод <code>{promo.code}</code> принят!\n\n"
-            f"💰 Для получения <b>{promo.reward} ⭐</b> вам необходимо <b>{condition_text}</b>.\n\n"
-            f"Вы готовы приступить к выполнению задания?"
-        )
-        return message, promo
+    if result == 'activated':
+        logger.info(f"User {user_id} activated promo '{promo.code}' with no condition. Rewarded {promo.reward} stars.")
+        return f"✅ Промокод успешно активирован! Вам начислено {promo.reward} ⭐.", promo
+
+    # Промокод с условием: награда придет после выполнения задания
+    logger.info(f"User {user_id} activated promo '{promo.code}'. Pending condition: {promo.condition}.")
+    condition_map = {
+        "google_review": "написать и получить одобрение на отзыв в Google Картах",
+        "yandex_review": "написать и получить одобрение на отзыв в Yandex Картах",
+        "gmail_account": "создать и получить одобрение на аккаунт Gmail"
+    }
+    condition_text = condition_map.get(promo.condition, "неизвестное условие")
+
+    message = (
+        f"✅ Промокод <code>{promo.code}</code> принят!\n\n"
+        f"💰 Для получения <b>{promo.reward} ⭐</b> вам необходимо <b>{condition_text}</b>.\n\n"
+        f"Вы готовы приступить к выполнению задания?"
+    )
+    return message, promo
 
 async def check_and_apply_promo_reward(user_id: int, condition_completed: str, bot):
     """
@@ -76,13 +61,10 @@ async def check_and_apply_promo_reward(user_id: int, condition_completed: str, b
     activation = await db_manager.find_pending_promo_activation(user_id, condition_completed)
     
     if activation:
-        # Пытаемся завершить активацию. Эта функция вернет False, если лимит исчерпан.
-        success = await db_manager.complete_promo_activation(activation.id)
+        # Завершение активации и начисление награды - одна транзакция; None, если лимит исчерпан
+        promo = await db_manager.complete_promo_activation(activation.id)
         
-        if success:
-            promo = activation.promo_code
-            await db_manager.update_balance(user_id, promo.reward)
-            
+        if promo:
             try:
                 await bot.send_message(
                     user_id,
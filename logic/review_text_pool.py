@@ -0,0 +1,100 @@
+# file: logic/review_text_pool.py
+
+import asyncio
+import datetime
+import logging
+from typing import List, Optional, Set
+
+from config import ReviewTextPool
+from database import db_manager
+from database.models import ReviewTextPoolItem
+from logic.ai_helper import generate_review_text, is_generation_error
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_warm_semaphore = asyncio.Semaphore(ReviewTextPool.CONCURRENCY)
+_warming_links: Set[int] = set()
+_background_tasks: Set[asyncio.Task] = set()
+_budget = {"date": None, "used": 0}
+
+
+def _take_budget() -> bool:
+    """Учитывает дневной лимит фоновых генераций, чтобы не сжечь квоту AI-сервиса."""
+    today = datetime.datetime.utcnow().date()
+    if _budget["date"] != today:
+        _budget["date"] = today
+        _budget["used"] = 0
+    if _budget["used"] >= ReviewTextPool.DAILY_BUDGET:
+        return False
+    _budget["used"] += 1
+    metrics.set_gauge("review_pool.budget_used_today", _budget["used"])
+    return True
+
+
+async def _warm_link(link_id: int, missing: int):
+    link = await db_manager.db_get_link_by_id(link_id)
+    if not link:
+        return
+    scenarios = await db_manager.get_random_ai_scenarios(missing)
+    if not scenarios:
+        logger.info("Review text pool: scenario bank is empty, nothing to warm.")
+        return
+
+    items = []
+    for scenario in scenarios:
+        if not _take_budget():
+            logger.warning("Review text pool: daily generation budget exhausted.")
+            metrics.increment("review_pool.budget_rejections")
+            break
+        text = await generate_review_text(company_info=link.url, scenario=scenario.text)
+        if is_generation_error(text):
+            metrics.increment("review_pool.generation_errors")
+            continue
+        items.append((scenario.id, scenario.text, text))
+
+    await db_manager.add_pool_texts(link_id, items)
+    metrics.increment("review_pool.texts_generated", len(items))
+    logger.info(f"Review text pool: generated {len(items)} texts for link {link_id}.")
+
+
+async def _warm_link_bounded(link_id: int, missing: int):
+    async with _warm_semaphore:
+        await _warm_link(link_id, missing)
+
+
+async def warm_links(link_ids: List[int]):
+    """Догенерирует недостающие тексты для указанных ссылок."""
+    link_ids = [link_id for link_id in link_ids if link_id not in _warming_links]
+    if not link_ids:
+        return
+    _warming_links.update(link_ids)
+    try:
+        ready_counts = await db_manager.count_ready_pool_texts(link_ids)
+        jobs = []
+        for link_id in link_ids:
+            missing = ReviewTextPool.TEXTS_PER_LINK - ready_counts.get(link_id, 0)
+            if missing > 0:
+                jobs.append(_warm_link_bounded(link_id, missing))
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Review text pool warming failed: {result}")
+    finally:
+        _warming_links.difference_update(link_ids)
+
+
+def schedule_warming(link_ids: List[int], platform: str):
+    """Запускает прогрев пула в фоне, не задерживая обработчик."""
+    if platform not in ReviewTextPool.PLATFORMS or not link_ids:
+        return
+    task = asyncio.create_task(warm_links(link_ids))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def take_text(link_id: int) -> Optional[ReviewTextPoolItem]:
+    """Мгновенно выдает готовый текст для ссылки, если он есть."""
+    item = await db_manager.claim_pool_text(link_id)
+    metrics.increment("review_pool.hits" if item else "review_pool.misses")
+    return item
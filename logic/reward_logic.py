@@ -41,7 +41,7 @@ async def distribute_rewards(bot: Bot):
                 place = i + 1
                 if place in rewards_map:
                     reward = rewards_map[place]
-                    await db_manager.update_balance(user_id, reward)
+                    await db_manager.update_balance(user_id, reward, op_type="TOP_REWARD", description=f"{place}-е место в топе")
                     try:
                         await bot.send_message(
                             user_id,
@@ -57,4 +57,14 @@ async def distribute_rewards(bot: Bot):
         logger.info(f"Reward distribution cycle finished. Next cycle scheduled for {datetime.datetime.fromtimestamp(new_next_reward_ts, tz=datetime.timezone.utc)} UTC.")
 
     except Exception as e:
-        logger.exception("An error occurred during the reward distribution cycle.")
\ No newline at end of file
+        logger.exception("An error occurred during the reward distribution cycle.")
+
+
+async def flush_referral_accruals():
+    """Зачисляет накопившиеся реферальные награды в копилки одним пакетом. Запускается по расписанию."""
+    try:
+        accruals, referrers = await db_manager.flush_referral_accruals()
+        if accruals:
+            logger.info(f"Referral accruals flushed: {accruals} rewards for {referrers} referrers.")
+    except Exception:
+        logger.exception("An error occurred during the flush_referral_accruals job.")
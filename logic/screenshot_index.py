@@ -0,0 +1,168 @@
+# file: logic/screenshot_index.py
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from aiogram import Bot
+
+from config import ImageProcessing
+from database import db_manager
+from logic.image_processing import compute_dhash
+from utils.file_cache import file_cache
+
+logger = logging.getLogger(__name__)
+
+# Ссылка на скриншот в индексе: (review_id, user_id)
+Payload = Tuple[int, int]
+
+
+def _to_signed(value: int) -> int:
+    """dHash беззнаковый, а BIGINT в Postgres знаковый."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """BK-дерево по расстоянию Хэмминга для поиска похожих хэшей без полного перебора."""
+    def __init__(self):
+        # Узел: [хэш, список payload, {расстояние: дочерний узел}]
+        self._root: Optional[list] = None
+        self.size = 0
+
+    def add(self, value: int, payload: Payload):
+        self.size += 1
+        if self._root is None:
+            self._root = [value, [payload], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = child
+
+    def remove(self, value: int, payload: Payload):
+        """Убирает payload у хэша; узел остается в дереве, чтобы не перестраивать поддерево."""
+        node = self._root
+        while node is not None:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if payload in node[1]:
+                    node[1].remove(payload)
+                    self.size -= 1
+                return
+            node = node[2].get(distance)
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Payload]]:
+        """Возвращает [(расстояние, payload)] для всех хэшей в радиусе max_distance."""
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                results.extend((distance, payload) for payload in node[1])
+            low, high = distance - max_distance, distance + max_distance
+            stack.extend(child for d, child in node[2].items() if low <= d <= high)
+        results.sort(key=lambda item: item[0])
+        return results
+
+
+screenshot_tree = BKTree()
+# Курсор бэкфилла, чтобы битые файлы не блокировали следующие порции
+_backfill_cursor = {'submission': 0, 'confirmation': 0}
+
+
+async def load_screenshot_index():
+    """Загружает все сохраненные хэши в BK-дерево. Вызывается при старте бота."""
+    rows = await db_manager.get_all_screenshot_hashes()
+    for dhash, review_id, user_id in rows:
+        screenshot_tree.add(_to_unsigned(dhash), (review_id, user_id))
+    logger.info(f"Screenshot index loaded: {screenshot_tree.size} hashes.")
+
+
+async def index_screenshot(bot: Bot, review_id: int, user_id: int, file_id: str, kind: str = 'submission') -> List[Tuple[int, Payload]]:
+    """
+    Считает хэш скриншота, ищет похожие скриншоты других отзывов и добавляет его в индекс.
+    Возвращает найденные совпадения [(расстояние, (review_id, user_id))].
+    """
+    data = await file_cache.get(bot, file_id)
+    if not data:
+        return []
+    dhash = await compute_dhash(data)
+
+    matches = [
+        (distance, payload) for distance, payload in screenshot_tree.search(dhash, ImageProcessing.DUPLICATE_MAX_DISTANCE)
+        if payload[0] != review_id
+    ]
+
+    changed, previous = await db_manager.add_screenshot_hash(review_id, user_id, kind, file_id, _to_signed(dhash))
+    if changed:
+        if previous is not None:
+            screenshot_tree.remove(_to_unsigned(previous), (review_id, user_id))
+        screenshot_tree.add(dhash, (review_id, user_id))
+    return matches
+
+
+async def format_duplicate_warning(matches: List[Tuple[int, Payload]], limit: int = 3) -> str:
+    """Формирует строку-предупреждение для сообщения админу."""
+    if not matches:
+        return ""
+    top_matches = matches[:limit]
+    usernames = await db_manager.get_usernames_by_ids(list({user_id for _, (_, user_id) in top_matches}))
+    lines = ["⚠️ <b>Похожие скриншоты:</b>"]
+    for distance, (review_id, user_id) in top_matches:
+        username = usernames.get(user_id)
+        user_text = f"@{username}" if username else f"ID <code>{user_id}</code>"
+        lines.append(f"• похоже на отзыв #{review_id} пользователя {user_text} (расстояние {distance})")
+    return "\n".join(lines)
+
+
+async def get_duplicate_warning(bot: Bot, review_id: int, user_id: int, file_id: str, kind: str = 'submission', timeout: float = 5.0) -> str:
+    """Безопасная обертка для обработчиков: никогда не бросает исключений и не ждет дольше timeout."""
+    try:
+        matches = await asyncio.wait_for(index_screenshot(bot, review_id, user_id, file_id, kind), timeout=timeout)
+        return await format_duplicate_warning(matches)
+    except asyncio.TimeoutError:
+        logger.warning(f"Screenshot hashing for review {review_id} timed out.")
+    except Exception as e:
+        logger.error(f"Failed to check screenshot duplicates for review {review_id}: {e}")
+    return ""
+
+
+async def backfill_screenshot_hashes(bot: Bot):
+    """
+    Досчитывает хэши для уже существующих отзывов порциями.
+    Запускается по расписанию, пока есть непроиндексированные скриншоты.
+    """
+    for kind in ('submission', 'confirmation'):
+        rows = await db_manager.get_reviews_without_screenshot_hash(
+            kind, after_id=_backfill_cursor[kind], limit=ImageProcessing.DUPLICATE_BACKFILL_BATCH
+        )
+        if not rows:
+            _backfill_cursor[kind] = 0
+            continue
+        _backfill_cursor[kind] = rows[-1][0]
+        indexed = 0
+        for review_id, user_id, file_id in rows:
+            try:
+                await index_screenshot(bot, review_id, user_id, file_id, kind)
+                indexed += 1
+            except Exception as e:
+                logger.warning(f"Backfill: failed to hash {kind} screenshot of review {review_id}: {e}")
+        logger.info(f"Backfill: indexed {indexed}/{len(rows)} {kind} screenshots.")
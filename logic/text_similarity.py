@@ -0,0 +1,231 @@
+# file: logic/text_similarity.py
+
+import asyncio
+import bisect
+import hashlib
+import heapq
+import logging
+import re
+import time
+from array import array
+from operator import eq
+from typing import Dict, List, Optional, Tuple
+
+from config import TextSimilarity
+from database import db_manager
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[\W_]+")
+# Множитель для заполнения пустых корзин (densification) соседними значениями
+_DENSIFY_STEP = 0x9E3779B1
+
+# Результат поиска: (оценка сходства, link_id найденного текста)
+Match = Tuple[float, Optional[int]]
+
+
+def normalize_text(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def _shingles(text: str) -> set:
+    normalized = normalize_text(text)
+    size = TextSimilarity.SHINGLE_SIZE
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def _shingle_hash(shingle: str) -> int:
+    # Стабильный хэш: подписи хранятся в БД и должны совпадать между перезапусками
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def compute_signature(text: str) -> Optional[bytes]:
+    """
+    Считает MinHash-подпись текста по символьным шинглам (one permutation hashing:
+    один хэш на шингл, минимум в каждой из NUM_PERM корзин).
+    Каждое значение хранится в 16 битах, подпись из 64 значений занимает 128 байт.
+    """
+    shingles = _shingles(text or "")
+    if not shingles:
+        return None
+    n = TextSimilarity.NUM_PERM
+    minimums: List[Optional[int]] = [None] * n
+    for shingle in shingles:
+        h = _shingle_hash(shingle)
+        bucket, value = h % n, h // n
+        current = minimums[bucket]
+        if current is None or value < current:
+            minimums[bucket] = value
+
+    values = array("H")
+    for bucket in range(n):
+        offset = 0
+        while minimums[(bucket + offset) % n] is None:
+            offset += 1
+        values.append((minimums[(bucket + offset) % n] + offset * _DENSIFY_STEP) & 0xFFFF)
+    return values.tobytes()
+
+
+class LSHIndex:
+    """
+    LSH-индекс по MinHash-подписям: подпись режется на полосы, тексты с совпавшей полосой
+    становятся кандидатами, и только для них считается оценка сходства.
+    Полосы хранятся в отсортированных массивах (поиск бинарный), свежие добавления -
+    в словаре, который периодически вливается в массивы.
+    """
+    COMPACT_EVERY = 20_000
+
+    def __init__(self, num_perm: int, bands: int):
+        self.num_perm = num_perm
+        self.bands = bands
+        self._band_bytes = num_perm // bands * 2
+        if self._band_bytes > 8:
+            raise ValueError("LSH band must fit into 64 bits")
+        self._signatures = array("H")
+        self._link_ids = array("q")
+        self._sorted_keys = [array("q") for _ in range(bands)]
+        self._sorted_positions = [array("i") for _ in range(bands)]
+        self._pending: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._pending_count = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._link_ids)
+
+    def _band_keys(self, signature: bytes) -> List[int]:
+        step = self._band_bytes
+        return [int.from_bytes(signature[i:i + step], "little", signed=True) for i in range(0, len(signature), step)]
+
+    def add(self, signature: bytes, link_id: Optional[int] = None):
+        position = self.size
+        self._signatures.frombytes(signature)
+        self._link_ids.append(link_id or 0)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._pending[band].setdefault(key, []).append(position)
+        self._pending_count += 1
+        if self._pending_count >= self.COMPACT_EVERY:
+            self.compact()
+
+    def bulk_load(self, rows: List[Tuple[bytes, Optional[int]]]):
+        """Строит индекс с нуля без промежуточных словарей - для загрузки при старте."""
+        self.__init__(self.num_perm, self.bands)
+        for signature, link_id in rows:
+            self._signatures.frombytes(signature)
+            self._link_ids.append(link_id or 0)
+        step, n = self._band_bytes, self.num_perm * 2
+        raw = self._signatures.tobytes()
+        for band in range(self.bands):
+            offset = band * step
+            keys = array("q", [int.from_bytes(raw[i:i + step], "little", signed=True) for i in range(offset, len(raw), n)])
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._sorted_keys[band] = array("q", [keys[i] for i in order])
+            self._sorted_positions[band] = array("i", order)
+
+    def compact(self):
+        """Вливает накопленные добавления в отсортированные массивы полос."""
+        if not self._pending_count:
+            return
+        for band in range(self.bands):
+            pending = sorted((key, position) for key, positions in self._pending[band].items() for position in positions)
+            keys, positions = array("q"), array("i")
+            for key, position in heapq.merge(zip(self._sorted_keys[band], self._sorted_positions[band]), pending):
+                keys.append(key)
+                positions.append(position)
+            self._sorted_keys[band], self._sorted_positions[band] = keys, positions
+            self._pending[band] = {}
+        self._pending_count = 0
+
+    def _candidates(self, signature: bytes) -> set:
+        candidates = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            keys = self._sorted_keys[band]
+            i = bisect.bisect_left(keys, key)
+            while i < len(keys) and keys[i] == key:
+                candidates.add(self._sorted_positions[band][i])
+                i += 1
+            candidates.update(self._pending[band].get(key, ()))
+        return candidates
+
+    def query(self, signature: bytes, threshold: float) -> List[Match]:
+        """Возвращает [(сходство, link_id)] для текстов со сходством не ниже threshold, по убыванию."""
+        values = array("H", signature)
+        n = self.num_perm
+        matches = []
+        for position in self._candidates(signature):
+            start = position * n
+            similarity = sum(map(eq, values, self._signatures[start:start + n])) / n
+            if similarity >= threshold:
+                matches.append((similarity, self._link_ids[position] or None))
+        matches.sort(key=lambda item: item[0], reverse=True)
+        return matches
+
+
+text_index = LSHIndex(TextSimilarity.NUM_PERM, TextSimilarity.BANDS)
+_SIGNATURE_BYTES = TextSimilarity.NUM_PERM * 2
+# Курсор бэкфилла по id отзывов
+_backfill_cursor = {"review_id": 0}
+
+
+async def load_text_index():
+    """Загружает все сохраненные подписи в LSH-индекс. Вызывается при старте бота."""
+    rows = await db_manager.get_all_text_signatures()
+    text_index.bulk_load([(signature, link_id) for signature, link_id in rows if len(signature) == _SIGNATURE_BYTES])
+    metrics.set_gauge("text_index.size", text_index.size)
+    logger.info(f"Text similarity index loaded: {text_index.size} texts.")
+
+
+def find_similar(text: str, threshold: Optional[float] = None) -> Optional[Match]:
+    """Ищет самый похожий из уже выданных текстов. Возвращает None, если похожих нет."""
+    started = time.perf_counter()
+    signature = compute_signature(text)
+    if signature is None:
+        return None
+    matches = text_index.query(signature, TextSimilarity.THRESHOLD if threshold is None else threshold)
+    metrics.observe("text_index.query_seconds", time.perf_counter() - started)
+    return matches[0] if matches else None
+
+
+def get_duplicate_text_warning(text: str) -> str:
+    """Возвращает текст предупреждения, если отзыв почти совпадает с уже выданным, иначе пустую строку."""
+    match = find_similar(text)
+    if not match:
+        return ""
+    metrics.increment("text_index.rejections")
+    similarity, link_id = match
+    link_text = f" (ссылка #{link_id})" if link_id else ""
+    return f"Текст почти совпадает с уже выданным ранее отзывом{link_text}: сходство ~{similarity:.0%}. Площадки удаляют такие отзывы."
+
+
+async def register_text(text: str, source: str, link_id: Optional[int] = None, review_id: Optional[int] = None):
+    """Добавляет текст в индекс и сохраняет его подпись. Ошибки только логируются."""
+    signature = compute_signature(text)
+    if signature is None:
+        return
+    try:
+        if await db_manager.add_text_signature(signature, source, link_id=link_id, review_id=review_id):
+            text_index.add(signature, link_id)
+            metrics.set_gauge("text_index.size", text_index.size)
+    except Exception as e:
+        logger.error(f"Failed to register review text signature (link {link_id}, review {review_id}): {e}")
+
+
+async def backfill_text_signatures():
+    """
+    Индексирует тексты отправленных отзывов порциями.
+    Запускается по расписанию, пока есть непроиндексированные отзывы.
+    """
+    rows = await db_manager.get_reviews_without_text_signature(
+        after_id=_backfill_cursor["review_id"], limit=TextSimilarity.BACKFILL_BATCH
+    )
+    if not rows:
+        _backfill_cursor["review_id"] = 0
+        return
+    _backfill_cursor["review_id"] = rows[-1][0]
+    for review_id, link_id, review_text in rows:
+        await register_text(review_text, "submitted", link_id=link_id, review_id=review_id)
+        await asyncio.sleep(0)
+    logger.info(f"Text index backfill: processed {len(rows)} reviews.")
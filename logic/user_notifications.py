@@ -7,6 +7,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from aiogram.exceptions import TelegramNetworkError, TelegramBadRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from redis.exceptions import RedisError
 
 from keyboards import inline, reply
 from database import db_manager
@@ -18,7 +19,8 @@ if TYPE_CHECKING:
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from logic.notification_manager import send_notification_to_admins
 from states.user_states import UserState
-from config import Durations
+from config import CooldownIndex, Durations
+from utils import cooldown_index
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +47,32 @@ async def send_cooldown_expired_notification(bot: Bot, user_id: int, platform: s
         logger.error(f"Unknown error sending cooldown notification to {user_id}: {e}")
 
 
+async def notify_expired_cooldowns(bot: Bot):
+    """
+    Рассылает уведомления об окончании кулдаунов из очереди в Redis.
+    Очередь переживает перезапуск бота, в отличие от отдельной задачи планировщика на каждого пользователя.
+    """
+    while True:
+        try:
+            due = await cooldown_index.pop_due(CooldownIndex.NOTIFY_BATCH)
+        except RedisError as e:
+            logger.error(f"Failed to read expired cooldowns from Redis: {e}")
+            return
+        for user_id, platform in due:
+            await send_cooldown_expired_notification(bot, user_id, platform)
+        if len(due) < CooldownIndex.NOTIFY_BATCH:
+            return
+
+
+async def ensure_cooldown_index():
+    """Перестраивает индекс кулдаунов, если он пропал из Redis или был сброшен после ошибки записи."""
+    try:
+        if not await cooldown_index.is_ready():
+            await db_manager.rebuild_cooldown_index()
+    except RedisError as e:
+        logger.error(f"Cooldown index check failed: {e}")
+
+
 def format_timedelta(td: datetime.timedelta) -> str:
     """Форматирует оставшееся время в ЧЧ:ММ:СС."""
     total_seconds = int(td.total_seconds())
@@ -113,14 +141,7 @@ async def handle_task_timeout(bot: Bot, storage: BaseStorage, user_id: int, plat
     
     cooldown_hours = 72
     platform_for_cooldown = platform.replace('_maps', '')
-    cooldown_end_time = await db_manager.set_platform_cooldown(user_id, platform_for_cooldown, cooldown_hours)
-    if cooldown_end_time:
-        scheduler.add_job(
-            send_cooldown_expired_notification, 
-            'date', 
-            run_date=cooldown_end_time, 
-            args=[bot, user_id, platform_for_cooldown]
-        )
+    await db_manager.set_platform_cooldown(user_id, platform_for_cooldown, cooldown_hours)
 
     await state.clear()
     
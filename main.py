@@ -19,7 +19,7 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.fsm.storage.redis import RedisStorage
-from config import BOT_TOKEN, SUPER_ADMIN_ID, ADMIN_ID_1, ADMIN_ID_2, REDIS_HOST, REDIS_PORT
+from config import BOT_TOKEN, SUPER_ADMIN_ID, ADMIN_ID_1, ADMIN_ID_2, REDIS_HOST, REDIS_PORT, CooldownIndex, Referrals
 from aiogram.types import BotCommand, BotCommandScopeChat, ErrorEvent, BotCommandScopeDefault
 from aiogram.exceptions import TelegramBadRequest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
@@ -31,10 +31,19 @@ from handlers import deposits, donations
 
 from database import db_manager
 from utils.ban_middleware import BanMiddleware
+from utils.admin_queue_middleware import AdminQueueMiddleware
 from utils.username_updater import UsernameUpdaterMiddleware
-from logic.reward_logic import distribute_rewards
-from logic.cleanup_logic import check_and_expire_links, process_expired_holds
+from logic.reward_logic import distribute_rewards, flush_referral_accruals
+from logic.cleanup_logic import check_and_expire_links, process_expired_holds, reconcile_link_counters, reconcile_user_balances, verify_ledger_book, maintain_operation_history
 from logic.deposit_logic import process_deposits
+from logic.image_processing import shutdown_image_executor
+from logic.ai_helper import close_ai_client
+from utils.redis_client import close_redis
+from logic.screenshot_index import load_screenshot_index, backfill_screenshot_hashes
+from logic.text_similarity import load_text_index, backfill_text_signatures
+from logic.moderation_queue import requeue_expired_leases
+from logic.link_import import backfill_link_url_hashes
+from logic.user_notifications import ensure_cooldown_index, notify_expired_cooldowns
 
 async def sync_base_admins():
     """
@@ -81,6 +90,7 @@ async def set_bot_commands(bot: Bot):
     admin_commands = user_commands + [
         BotCommand(command="dnd", description="🌙/☀️ Включить/выключить ночной режим"),
         BotCommand(command="pending_tasks", description="📥 Посмотреть задачи в очереди"),
+        BotCommand(command="next_task", description="▶️ Взять следующую задачу"),
     ]
 
     super_admin_commands = admin_commands + [
@@ -93,7 +103,9 @@ async def set_bot_commands(bot: Bot):
         BotCommand(command="stat_rewards", description="🏆 Упр. наградами топа"),
         BotCommand(command="campaigns", description="📊 Статистика по кампаниям"),
         BotCommand(command="stats_admin", description="📈 Бизнес-аналитика"),
-        BotCommand(command="scenarios", description="✍️ Банк сценариев для AI")
+        BotCommand(command="scenarios", description="✍️ Банк сценариев для AI"),
+        BotCommand(command="metrics", description="📊 Метрики процесса"),
+        BotCommand(command="balance_at", description="📒 Баланс пользователя на дату")
     ]
 
     tester_commands = [
@@ -162,6 +174,17 @@ async def main():
 
     await db_manager.init_db()
     await sync_base_admins()
+    await load_screenshot_index()
+    await load_text_index()
+    try:
+        await db_manager.rebuild_intern_index()
+    except Exception as e:
+        logger.error(f"Failed to build intern availability index, it will be rebuilt on first use: {e}")
+    await maintain_operation_history()
+    try:
+        await db_manager.rebuild_cooldown_index()
+    except Exception as e:
+        logger.error(f"Failed to build cooldown index, cooldowns will be read from DB until it is rebuilt: {e}")
 
     storage = RedisStorage.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}/0")
     scheduler = AsyncIOScheduler(timezone="UTC")
@@ -171,6 +194,7 @@ async def main():
 
     dp.update.outer_middleware(BanMiddleware())
     dp.update.outer_middleware(UsernameUpdaterMiddleware())
+    dp.callback_query.outer_middleware(AdminQueueMiddleware())
     
     dp.include_router(start.router)
     dp.include_router(admin_panel.router)
@@ -201,6 +225,17 @@ async def main():
     scheduler.add_job(check_and_expire_links, 'interval', hours=6, args=[bot, dp.storage])
     scheduler.add_job(process_expired_holds, 'interval', minutes=1, args=[bot, dp.storage, scheduler])
     scheduler.add_job(process_deposits, 'interval', minutes=5, args=[bot])
+    scheduler.add_job(backfill_screenshot_hashes, 'interval', minutes=10, args=[bot], max_instances=1)
+    scheduler.add_job(backfill_text_signatures, 'interval', minutes=10, max_instances=1)
+    scheduler.add_job(requeue_expired_leases, 'interval', minutes=1, max_instances=1)
+    scheduler.add_job(backfill_link_url_hashes, 'interval', minutes=10, max_instances=1)
+    scheduler.add_job(reconcile_link_counters, 'interval', hours=1, max_instances=1)
+    scheduler.add_job(reconcile_user_balances, 'interval', hours=24, max_instances=1)
+    scheduler.add_job(verify_ledger_book, 'interval', hours=24, max_instances=1)
+    scheduler.add_job(maintain_operation_history, 'interval', hours=24, max_instances=1)
+    scheduler.add_job(notify_expired_cooldowns, 'interval', minutes=1, args=[bot], max_instances=1)
+    scheduler.add_job(ensure_cooldown_index, 'interval', minutes=CooldownIndex.CHECK_INTERVAL_MINUTES, max_instances=1)
+    scheduler.add_job(flush_referral_accruals, 'interval', seconds=Referrals.FLUSH_INTERVAL_SECONDS, max_instances=1)
 
     try:
         scheduler.start()
@@ -212,6 +247,9 @@ async def main():
         await dp.storage.close()
         await bot.session.close()
         scheduler.shutdown()
+        shutdown_image_executor()
+        await close_ai_client()
+        await close_redis()
         logger.info("--- БОТ ОСТАНОВЛЕН ---")
 
 if __name__ == "__main__":
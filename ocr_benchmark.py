@@ -0,0 +1,98 @@
+# file: ocr_benchmark.py
+
+"""
+Замер задержки и точности OCR при разных размерах скриншотов.
+
+Запуск (в окружении бота, с GOOGLE_API_KEYS):
+    python ocr_benchmark.py <папка> --task google_profile_check --edges 640,1024,1600,0
+
+В папке лежат скриншоты и expected.json с ожидаемыми полями ответа по имени файла:
+    {"ivan.jpg": {"name_check_passed": true}, "qwer.png": {"name_check_passed": false}}
+
+Для каждого размера (0 - исходный файл без предобработки) печатаются средний размер
+отправленного файла, время подготовки и ответа Gemini, p95 полного времени и доля
+ответов, совпавших с ожидаемыми полями. Каждый запрос тратит квоту ключей Gemini.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from logic.image_processing import prepare_image_for_ocr, shutdown_image_executor  # noqa: E402
+from logic.ocr_helper import analyze_image  # noqa: E402
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def _p95(values):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def _matches(result: dict, expected: dict) -> bool:
+    return result.get("status") == "success" and all(result.get(key) == value for key, value in expected.items())
+
+
+async def run_benchmark(folder: Path, task: str, edges: list, repeats: int):
+    expected = json.loads((folder / "expected.json").read_text(encoding="utf-8"))
+    images = [
+        (path.name, path.read_bytes()) for path in sorted(folder.iterdir())
+        if path.suffix.lower() in IMAGE_SUFFIXES and path.name in expected
+    ]
+    if not images:
+        print("Нет скриншотов, описанных в expected.json.")
+        return
+
+    print(f"Задача {task}: {len(images)} скриншотов x {repeats} повтор(ов)\n")
+    print(f"{'край':>6} {'байт':>9} {'подг., мс':>10} {'OCR, мс':>9} {'p95, мс':>9} {'точность':>9}")
+    for edge in edges:
+        sizes, prepare_ms, ocr_ms, total_ms, correct, runs = [], [], [], [], 0, 0
+        for name, data in images:
+            for _ in range(repeats):
+                started = time.perf_counter()
+                prepared = await prepare_image_for_ocr(data, task, max_edge=edge) if edge else data
+                prepared_at = time.perf_counter()
+                result = await analyze_image(prepared, task)
+                finished = time.perf_counter()
+
+                sizes.append(len(prepared))
+                prepare_ms.append((prepared_at - started) * 1000)
+                ocr_ms.append((finished - prepared_at) * 1000)
+                total_ms.append((finished - started) * 1000)
+                runs += 1
+                if _matches(result, expected[name]):
+                    correct += 1
+                else:
+                    logging.warning(f"edge={edge or 'orig'} {name}: {result}")
+        print(
+            f"{edge or 'orig':>6} {statistics.mean(sizes):>9.0f} {statistics.mean(prepare_ms):>10.1f} "
+            f"{statistics.mean(ocr_ms):>9.0f} {_p95(total_ms):>9.0f} {correct / runs:>9.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и точность OCR при разных размерах скриншотов.")
+    parser.add_argument("folder", type=Path)
+    parser.add_argument("--task", required=True, choices=["google_profile_check", "yandex_profile_check", "google_reviews_check"])
+    parser.add_argument("--edges", default="640,1024,1600,0", help="Максимальные стороны через запятую, 0 - исходный файл")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    edges = [int(edge) for edge in args.edges.split(",") if edge.strip()]
+    try:
+        asyncio.run(run_benchmark(args.folder, args.task, edges, args.repeats))
+    finally:
+        shutdown_image_executor()
+
+
+if __name__ == "__main__":
+    main()
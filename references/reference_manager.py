@@ -1,6 +1,5 @@
 # file: references/reference_manager.py
 
-import datetime
 from database import db_manager
 from database.models import Link
 import logging
@@ -12,24 +11,16 @@ active_assignments = {}
 async def assign_reference_to_user(user_id: int, platform: str, dry_run: bool = False) -> Link | None:
     """
     Назначает доступную ссылку пользователю.
-    Если dry_run=True, просто проверяет наличие ссылки, не назначая ее.
+    Если dry_run=True, просто проверяет наличие ссылки, не назначая и не блокируя ее.
     """
-    link = await db_manager.db_get_available_reference(platform, 'any') # 'any' as default for now
-    
-    if not link:
-        return None
-
     if dry_run:
-        return link
+        return await db_manager.db_peek_available_reference(platform, 'any') # 'any' as default for now
 
-    await db_manager.db_update_link_status(link.id, 'assigned', user_id=user_id)
+    link = await db_manager.db_claim_available_reference(platform, 'any', user_id)
+    if not link:
+        return None
 
     active_assignments[user_id] = link.id
-    
-    link.status = 'assigned'
-    link.assigned_to_user_id = user_id
-    link.assigned_at = datetime.datetime.utcnow()
-    
     return link
 
 
@@ -96,5 +87,4 @@ async def force_release_reference(link_id: int) -> tuple[bool, int | None]:
 
 
 async def has_available_references(platform: str) -> bool:
-    link = await db_manager.db_get_available_reference(platform, 'any')
-    return link is not None
\ No newline at end of file
+    return await db_manager.db_has_available_reference(platform, 'any')
\ No newline at end of file
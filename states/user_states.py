@@ -110,6 +110,7 @@ class AdminState(StatesGroup):
     PROMO_CONDITION = State()
     PROMO_REWARD = State()
     PROMO_USES = State()
+    PROMO_BATCH_PARAMS = State()
     
     # Состояния для поддержки
     SUPPORT_AWAITING_ANSWER = State()
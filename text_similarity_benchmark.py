@@ -0,0 +1,96 @@
+# file: text_similarity_benchmark.py
+
+"""
+Скорость и качество поиска похожих текстов отзывов (logic.text_similarity).
+
+Запуск (только в памяти, база и сеть не нужны):
+    python text_similarity_benchmark.py --texts 500000 --queries 1000
+
+Строит N синтетических отзывов из случайных слов, загружает их подписи в LSH-индекс
+через bulk_load и замеряет find_similar. Печатает время подписей и загрузки, p50/p99
+поиска (вместе с подписью запроса), долю найденных текстов с одним замененным словом
+и долю ложных срабатываний на новых текстах.
+"""
+
+import argparse
+import logging
+import random
+import statistics
+import time
+
+from config import TextSimilarity
+from logic import text_similarity
+
+_LETTERS = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def _percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def _make_text(rng: random.Random, vocabulary: list) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(25, 60)))
+
+
+def _edit_one_word(rng: random.Random, text: str, vocabulary: list) -> str:
+    words = text.split()
+    words[rng.randrange(len(words))] = rng.choice(vocabulary)
+    return " ".join(words)
+
+
+def _timed_queries(texts: list, threshold: float) -> tuple:
+    latencies, found = [], 0
+    for text in texts:
+        started = time.perf_counter()
+        match = text_similarity.find_similar(text, threshold)
+        latencies.append(time.perf_counter() - started)
+        if match:
+            found += 1
+    return found, latencies
+
+
+def run_benchmark(count: int, queries: int, vocabulary_size: int, threshold: float, seed: int):
+    rng = random.Random(seed)
+    vocabulary = list({"".join(rng.choice(_LETTERS) for _ in range(rng.randint(3, 10))) for _ in range(vocabulary_size)})
+    texts = [_make_text(rng, vocabulary) for _ in range(count)]
+
+    started = time.perf_counter()
+    rows = [(text_similarity.compute_signature(text), link_id) for link_id, text in enumerate(texts, start=1)]
+    signatures_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    text_similarity.text_index.bulk_load(rows)
+    load_seconds = time.perf_counter() - started
+
+    edited = [_edit_one_word(rng, text, vocabulary) for text in rng.sample(texts, queries)]
+    unrelated = [_make_text(rng, vocabulary) for _ in range(queries)]
+    caught, edited_latencies = _timed_queries(edited, threshold)
+    false_positives, unrelated_latencies = _timed_queries(unrelated, threshold)
+    latencies = edited_latencies + unrelated_latencies
+
+    print(f"{count} текстов, словарь {len(vocabulary)} слов, порог {threshold:.2f}")
+    print(f"подписи: {signatures_seconds:.1f} с, bulk_load: {load_seconds:.1f} с")
+    print(
+        f"find_similar: p50 {_percentile(latencies, 0.5) * 1000:.2f} мс, "
+        f"p99 {_percentile(latencies, 0.99) * 1000:.2f} мс, среднее {statistics.mean(latencies) * 1000:.2f} мс"
+    )
+    print(f"замена одного слова: найдено {caught}/{queries}")
+    print(f"новые тексты: ложных срабатываний {false_positives}/{queries}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость и качество поиска похожих текстов отзывов.")
+    parser.add_argument("--texts", type=int, default=500_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--vocabulary", type=int, default=20_000)
+    parser.add_argument("--threshold", type=float, default=TextSimilarity.THRESHOLD)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    run_benchmark(args.texts, args.queries, args.vocabulary, args.threshold, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# file: utils/admin_queue_middleware.py
+
+from typing import Callable, Dict, Any, Awaitable
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, CallbackQuery
+
+from logic.admin_routing import queue_tracker
+
+
+class AdminQueueMiddleware(BaseMiddleware):
+    """
+    Этот middleware отмечает задачу админа взятой в работу, как только он
+    нажимает любую кнопку на сообщении с задачей. Так очередь админа,
+    по которой распределяются новые задачи, остается актуальной.
+    """
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, CallbackQuery) and event.message:
+            queue_tracker.complete(event.from_user.id, event.message.message_id)
+        return await handler(event, data)
@@ -0,0 +1,137 @@
+# file: utils/cooldown_index.py
+
+import datetime
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Платформы с колонкой {platform}_cooldown_until в users
+COOLDOWN_PLATFORMS = ("google", "yandex_with_text", "yandex_without_text", "gmail")
+
+# Ключ живет ровно до конца кулдауна: остаток - это PTTL, истекший кулдаун Redis удаляет сам
+_COOLDOWN_KEY = "cooldown:{user_id}:{platform}"
+_COOLDOWN_KEY_PATTERN = "cooldown:*"
+_READY_KEY = "cooldowns:index_ready"
+# Очередь уведомлений об окончании кулдауна: score - время окончания, member - "user_id:platform"
+_EXPIRING_KEY = "cooldowns:expiring"
+
+# Забирает наступившие окончания кулдаунов и убирает их из очереди за один шаг,
+# чтобы уведомление не ушло дважды из двух процессов
+_POP_DUE_SCRIPT = """
+local members = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return members
+"""
+_pop_due_script = None
+
+# Строка для перестройки индекса: (id пользователя, платформа, окончание кулдауна в UTC)
+IndexRow = Tuple[int, str, datetime.datetime]
+
+
+def _key(user_id: int, platform: str) -> str:
+    return _COOLDOWN_KEY.format(user_id=user_id, platform=platform)
+
+
+def _to_ms(end_time: datetime.datetime) -> int:
+    return int(end_time.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+def _get_pop_due_script():
+    global _pop_due_script
+    if _pop_due_script is None:
+        _pop_due_script = get_redis().register_script(_POP_DUE_SCRIPT)
+    return _pop_due_script
+
+
+async def _invalidate():
+    """После неудачной записи индексу верить нельзя: чтение уходит в БД до перестройки."""
+    try:
+        await get_redis().delete(_READY_KEY)
+    except RedisError as e:
+        logger.error(f"Failed to invalidate cooldown index: {e}")
+
+
+async def get_remaining(user_id: int, platforms: Iterable[str]) -> Optional[Dict[str, Optional[datetime.timedelta]]]:
+    """
+    Остаток кулдауна по каждой платформе одним конвейером PTTL.
+    None - индекс не построен, ответ нужно брать из БД. Ошибки Redis пробрасываются.
+    """
+    platforms = list(platforms)
+    async with get_redis().pipeline(transaction=False) as pipe:
+        pipe.exists(_READY_KEY)
+        for platform in platforms:
+            pipe.pttl(_key(user_id, platform))
+        ready, *ttls = await pipe.execute()
+    if not ready:
+        return None
+    # PTTL: -2 - ключа нет (кулдауна нет), -1 - ключ без срока (не бывает, считаем отсутствием)
+    return {
+        platform: datetime.timedelta(milliseconds=ttl) if ttl > 0 else None
+        for platform, ttl in zip(platforms, ttls)
+    }
+
+
+async def set_cooldown(user_id: int, platform: str, end_time: datetime.datetime):
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.set(_key(user_id, platform), "1", pxat=_to_ms(end_time))
+            pipe.zadd(_EXPIRING_KEY, {f"{user_id}:{platform}": _to_ms(end_time) / 1000})
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to mirror {platform} cooldown of user {user_id} to Redis: {e}")
+        await _invalidate()
+
+
+async def clear(user_id: int, platforms: Iterable[str] = COOLDOWN_PLATFORMS):
+    platforms = list(platforms)
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.delete(*[_key(user_id, platform) for platform in platforms])
+            pipe.zrem(_EXPIRING_KEY, *[f"{user_id}:{platform}" for platform in platforms])
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to clear cooldowns of user {user_id} in Redis: {e}")
+        await _invalidate()
+
+
+async def is_ready() -> bool:
+    return bool(await get_redis().exists(_READY_KEY))
+
+
+async def rebuild(rows: Iterable[IndexRow]):
+    """
+    Перестраивает индекс по активным кулдаунам из БД. Очередь уведомлений только пополняется:
+    окончания, наступившие, пока бот был выключен, должны дойти до пользователей.
+    """
+    now = datetime.datetime.utcnow()
+    active = {_key(user_id, platform): (user_id, platform, end_time) for user_id, platform, end_time in rows if end_time > now}
+
+    redis = get_redis()
+    stale = [key async for key in redis.scan_iter(match=_COOLDOWN_KEY_PATTERN, count=1000) if key not in active]
+    async with redis.pipeline(transaction=True) as pipe:
+        if stale:
+            pipe.delete(*stale)
+        for key, (user_id, platform, end_time) in active.items():
+            pipe.set(key, "1", pxat=_to_ms(end_time))
+            pipe.zadd(_EXPIRING_KEY, {f"{user_id}:{platform}": _to_ms(end_time) / 1000})
+        pipe.set(_READY_KEY, "1")
+        await pipe.execute()
+    logger.info(f"Cooldown index rebuilt: {len(active)} active cooldowns, {len(stale)} stale keys removed.")
+
+
+async def pop_due(limit: int) -> List[Tuple[int, str]]:
+    """Забирает из очереди до limit наступивших окончаний кулдаунов: [(id пользователя, платформа)]."""
+    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+    members = await _get_pop_due_script()(keys=[_EXPIRING_KEY], args=[now, limit])
+    due = []
+    for member in members:
+        user_id, platform = member.split(":", 1)
+        due.append((int(user_id), platform))
+    return due
@@ -0,0 +1,158 @@
+# file: utils/file_cache.py
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from aiogram import Bot
+from cachetools import LRUCache
+
+from config import FILE_CACHE_DIR, FILE_CACHE_MAX_MB
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramFileCache:
+    """
+    Дисковый LRU-кэш файлов Telegram, ключ - file_unique_id.
+    Один и тот же скриншот скачивается из Telegram только один раз,
+    сколько бы раз его ни запрашивали OCR, хэширование и повторный анализ.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # file_unique_id -> размер
+        self._total_bytes = 0
+        # file_id у одного и того же файла бывает разным, поэтому храним соответствие отдельно
+        self._unique_ids = LRUCache(maxsize=50_000)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    def _load_index(self):
+        """
+        Восстанавливает LRU-порядок по времени последнего доступа к файлам на диске.
+        Индекс строится заново, а не дополняется, так что повторная загрузка не задваивает размер.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        files = [p for p in self.cache_dir.iterdir() if p.is_file() and not p.name.endswith(".tmp")]
+        entries: "OrderedDict[str, int]" = OrderedDict()
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            entries[path.name] = path.stat().st_size
+        self._entries = entries
+        self._total_bytes = sum(entries.values())
+        self._loaded = True
+        self._update_gauges()
+        logger.info(f"File cache loaded: {len(self._entries)} files, {self._total_bytes} bytes.")
+
+    def _path(self, unique_id: str) -> Path:
+        return self.cache_dir / unique_id
+
+    def _update_gauges(self):
+        metrics.set_gauge("file_cache.bytes", self._total_bytes)
+        metrics.set_gauge("file_cache.files", len(self._entries))
+
+    @staticmethod
+    def _read_sync(path: Path) -> bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path, (time.time(), time.time()))
+        return data
+
+    def _write_sync(self, unique_id: str, data: bytes):
+        tmp_path = self._path(f"{unique_id}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(unique_id))
+
+    def _add_entry(self, unique_id: str, size: int):
+        # Файл мог быть уже записан под другим file_id: старый размер не должен учитываться дважды
+        self._total_bytes -= self._entries.pop(unique_id, 0)
+        self._entries[unique_id] = size
+        self._total_bytes += size
+        self._evict()
+        self._update_gauges()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            unique_id, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(unique_id))
+            except FileNotFoundError:
+                pass
+            metrics.increment("file_cache.evictions")
+            metrics.increment("file_cache.evicted_bytes", size)
+            logger.debug(f"File cache evicted {unique_id} ({size} bytes).")
+
+    async def _read_cached(self, unique_id: str) -> Optional[bytes]:
+        if unique_id not in self._entries:
+            return None
+        try:
+            data = await asyncio.to_thread(self._read_sync, self._path(unique_id))
+        except FileNotFoundError:
+            self._total_bytes -= self._entries.pop(unique_id, 0)
+            self._update_gauges()
+            return None
+        self._entries.move_to_end(unique_id)
+        return data
+
+    async def _download(self, bot: Bot, file_id: str) -> Optional[bytes]:
+        file_info = await bot.get_file(file_id)
+        if not file_info.file_path:
+            return None
+        unique_id = file_info.file_unique_id
+        self._unique_ids[file_id] = unique_id
+
+        # Тот же файл мог быть скачан под другим file_id
+        data = await self._read_cached(unique_id)
+        if data is not None:
+            metrics.increment("file_cache.hits")
+            return data
+
+        metrics.increment("file_cache.misses")
+        downloaded = await bot.download_file(file_info.file_path)
+        data = downloaded.getvalue()
+        await asyncio.to_thread(self._write_sync, unique_id, data)
+        self._add_entry(unique_id, len(data))
+        return data
+
+    async def get(self, bot: Bot, file_id: str, file_unique_id: Optional[str] = None) -> Optional[bytes]:
+        """Возвращает содержимое файла из кэша или скачивает его из Telegram."""
+        if not self._loaded:
+            # Первые параллельные запросы ждут одну загрузку индекса
+            async with self._load_lock:
+                if not self._loaded:
+                    await asyncio.to_thread(self._load_index)
+
+        unique_id = file_unique_id or self._unique_ids.get(file_id)
+        if unique_id:
+            data = await self._read_cached(unique_id)
+            if data is not None:
+                metrics.increment("file_cache.hits")
+                return data
+
+        # Параллельные запросы одного и того же файла ждут одно скачивание
+        if file_id in self._inflight:
+            return await asyncio.shield(self._inflight[file_id])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[file_id] = future
+        try:
+            data = await self._download(bot, file_id)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # помечаем исключение как полученное, если никто не ждал
+            raise
+        finally:
+            self._inflight.pop(file_id, None)
+
+
+file_cache = TelegramFileCache(FILE_CACHE_DIR, FILE_CACHE_MAX_MB * 1024 * 1024)
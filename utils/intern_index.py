@@ -0,0 +1,101 @@
+# file: utils/intern_index.py
+
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Семейства платформ, по которым задачи распределяются стажерам
+PLATFORM_FAMILIES = ("google", "yandex", "gmail")
+
+_IDLE_KEY = "interns:idle:{family}"
+_READY_KEY = "interns:index_ready"
+_IDLE_KEYS = [_IDLE_KEY.format(family=family) for family in PLATFORM_FAMILIES]
+
+# Берет самого давно работавшего свободного стажера семейства и убирает его из всех наборов разом,
+# чтобы две параллельные задачи не достались одному стажеру
+_CLAIM_SCRIPT = """
+local member = redis.call('ZRANGE', KEYS[1], 0, 0)[1]
+if not member then
+    return false
+end
+for i = 2, #KEYS do
+    redis.call('ZREM', KEYS[i], member)
+end
+return member
+"""
+_claim_script = None
+
+# Строка для перестройки индекса: (id стажера, платформы из анкеты, время последней задачи)
+IndexRow = Tuple[int, str, Optional[float]]
+
+
+def families_from_platforms(platforms: Optional[str]) -> List[str]:
+    """Семейства платформ по строке из анкеты стажера ("Google, Yandex (с текстом)")."""
+    platforms = (platforms or "").lower()
+    return [family for family in PLATFORM_FAMILIES if family in platforms]
+
+
+def _get_claim_script():
+    global _claim_script
+    if _claim_script is None:
+        _claim_script = get_redis().register_script(_CLAIM_SCRIPT)
+    return _claim_script
+
+
+async def is_ready() -> bool:
+    return bool(await get_redis().exists(_READY_KEY))
+
+
+async def claim(family: str) -> Optional[int]:
+    """Забирает свободного стажера семейства за O(log n). Ошибки Redis пробрасываются."""
+    if family not in PLATFORM_FAMILIES:
+        return None
+    member = await _get_claim_script()(keys=[_IDLE_KEY.format(family=family)] + _IDLE_KEYS)
+    return int(member) if member else None
+
+
+async def mark_idle(intern_id: int, families: Iterable[str], last_task_ts: Optional[float]):
+    """Добавляет стажера в наборы свободных; порядок - по времени последней задачи."""
+    families = [family for family in families if family in PLATFORM_FAMILIES]
+    if not families:
+        return
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            for family in families:
+                pipe.zadd(_IDLE_KEY.format(family=family), {str(intern_id): last_task_ts or 0})
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to mark intern {intern_id} as idle in Redis index: {e}")
+
+
+async def remove(intern_id: int):
+    """Убирает стажера из всех наборов свободных."""
+    try:
+        async with get_redis().pipeline(transaction=True) as pipe:
+            for key in _IDLE_KEYS:
+                pipe.zrem(key, str(intern_id))
+            await pipe.execute()
+    except RedisError as e:
+        logger.error(f"Failed to remove intern {intern_id} from Redis index: {e}")
+
+
+async def rebuild(rows: Iterable[IndexRow]):
+    """Полностью перестраивает индекс по данным из БД одной транзакцией."""
+    members = {key: {} for key in _IDLE_KEYS}
+    for intern_id, platforms, last_task_ts in rows:
+        for family in families_from_platforms(platforms):
+            members[_IDLE_KEY.format(family=family)][str(intern_id)] = last_task_ts or 0
+
+    async with get_redis().pipeline(transaction=True) as pipe:
+        pipe.delete(*_IDLE_KEYS)
+        for key, mapping in members.items():
+            if mapping:
+                pipe.zadd(key, mapping)
+        pipe.set(_READY_KEY, "1")
+        await pipe.execute()
+    logger.info(f"Intern availability index rebuilt: {sum(len(m) for m in members.values())} entries.")
@@ -0,0 +1,63 @@
+# file: utils/metrics.py
+
+import threading
+from collections import defaultdict
+from typing import Dict, Any
+
+# Простейший реестр метрик внутри процесса: счетчики, текущие значения и тайминги.
+# Снимок доступен супер-админу через /metrics.
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_gauges: Dict[str, float] = {}
+_timings: Dict[str, Dict[str, float]] = {}
+
+
+def increment(name: str, value: float = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, seconds: float):
+    """Регистрирует длительность операции (count/sum/max)."""
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["sum"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "timings": {name: dict(values) for name, values in _timings.items()},
+        }
+
+
+def format_snapshot() -> str:
+    """Форматирует снимок метрик в текст для Telegram (HTML)."""
+    data = snapshot()
+    lines = ["📊 <b>Метрики процесса</b>\n"]
+
+    if data["counters"]:
+        lines.append("<b>Счетчики:</b>")
+        lines.extend(f" • <code>{name}</code>: {value:g}" for name, value in sorted(data["counters"].items()))
+    if data["gauges"]:
+        lines.append("\n<b>Текущие значения:</b>")
+        lines.extend(f" • <code>{name}</code>: {value:g}" for name, value in sorted(data["gauges"].items()))
+    if data["timings"]:
+        lines.append("\n<b>Тайминги (avg / max, сек):</b>")
+        for name, t in sorted(data["timings"].items()):
+            avg = t["sum"] / t["count"] if t["count"] else 0.0
+            lines.append(f" • <code>{name}</code>: {avg:.3f} / {t['max']:.3f} (n={int(t['count'])})")
+
+    if len(lines) == 1:
+        lines.append("Данных пока нет.")
+    return "\n".join(lines)
@@ -0,0 +1,102 @@
+# file: utils/money.py
+
+import functools
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Union
+
+# Суммы хранятся с точностью до сотых звезды (NUMERIC(18, 2) в БД)
+STARS_SCALE = 2
+STARS_PRECISION = 18
+_ONE = Decimal(1)
+
+Number = Union[int, float, str, Decimal, "Stars"]
+
+
+def _to_decimal(value: Number) -> Decimal:
+    if isinstance(value, Stars):
+        return value.to_decimal()
+    if isinstance(value, float):
+        # repr дает кратчайшую запись (0.1, а не 0.1000000000000000055...)
+        return Decimal(repr(value))
+    return Decimal(value)
+
+
+@functools.total_ordering
+class Stars:
+    """
+    Сумма в звездах, хранимая целым числом сотых. Сложение и вычитание точные,
+    умножение и проценты округляются до сотых по правилу half-up.
+    """
+    __slots__ = ("minor",)
+
+    def __init__(self, value: Number = 0):
+        if isinstance(value, Stars):
+            minor = value.minor
+        else:
+            minor = int(_to_decimal(value).scaleb(STARS_SCALE).quantize(_ONE, rounding=ROUND_HALF_UP))
+        object.__setattr__(self, "minor", minor)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Stars is immutable")
+
+    @classmethod
+    def from_minor(cls, minor: int) -> "Stars":
+        stars = cls()
+        object.__setattr__(stars, "minor", int(minor))
+        return stars
+
+    def to_decimal(self) -> Decimal:
+        return Decimal(self.minor).scaleb(-STARS_SCALE)
+
+    def percent(self, rate_percent: Number) -> "Stars":
+        """rate_percent процентов от суммы, округленные до сотых."""
+        return Stars(self.to_decimal() * _to_decimal(rate_percent) / 100)
+
+    def __add__(self, other: Number) -> "Stars":
+        return Stars.from_minor(self.minor + Stars(other).minor)
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Number) -> "Stars":
+        return Stars.from_minor(self.minor - Stars(other).minor)
+
+    def __rsub__(self, other: Number) -> "Stars":
+        return Stars.from_minor(Stars(other).minor - self.minor)
+
+    def __mul__(self, factor: Union[int, float, str, Decimal]) -> "Stars":
+        return Stars(self.to_decimal() * _to_decimal(factor))
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "Stars":
+        return Stars.from_minor(-self.minor)
+
+    def __abs__(self) -> "Stars":
+        return Stars.from_minor(abs(self.minor))
+
+    def __bool__(self) -> bool:
+        return self.minor != 0
+
+    def __eq__(self, other) -> bool:
+        try:
+            return self.minor == Stars(other).minor
+        except (TypeError, ArithmeticError, ValueError):
+            return NotImplemented
+
+    def __lt__(self, other: Number) -> bool:
+        return self.minor < Stars(other).minor
+
+    def __hash__(self) -> int:
+        return hash(self.minor)
+
+    def __float__(self) -> float:
+        return float(self.to_decimal())
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self.to_decimal(), format_spec or f".{STARS_SCALE}f")
+
+    def __str__(self) -> str:
+        return format(self)
+
+    def __repr__(self) -> str:
+        return f"Stars('{self}')"
@@ -0,0 +1,55 @@
+# file: utils/promo_cache.py
+
+import logging
+
+from cachetools import TTLCache
+from redis.exceptions import RedisError
+
+from config import PromoCodes
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Негативный кэш: несуществующие коды не доходят до БД при переборе.
+# Локальный слой короткий, чтобы новый код, созданный в другом процессе, быстро стал доступен.
+_UNKNOWN_KEY = "promo:unknown:{code}"
+_local_unknown = TTLCache(maxsize=PromoCodes.NEGATIVE_CACHE_SIZE, ttl=PromoCodes.LOCAL_NEGATIVE_CACHE_TTL_SECONDS)
+
+
+def normalize_code(code: str) -> str:
+    return (code or "").strip().upper()
+
+
+async def is_unknown(code: str) -> bool:
+    code = normalize_code(code)
+    if code in _local_unknown:
+        return True
+    try:
+        if await get_redis().exists(_UNKNOWN_KEY.format(code=code)):
+            _local_unknown[code] = True
+            return True
+    except RedisError as e:
+        logger.warning(f"Promo negative cache lookup failed: {e}")
+    return False
+
+
+async def remember_unknown(code: str):
+    code = normalize_code(code)
+    _local_unknown[code] = True
+    try:
+        await get_redis().set(_UNKNOWN_KEY.format(code=code), "1", ex=PromoCodes.NEGATIVE_CACHE_TTL_SECONDS)
+    except RedisError as e:
+        logger.warning(f"Failed to cache unknown promo code: {e}")
+
+
+async def forget(*codes: str):
+    """Убирает коды из негативного кэша. Вызывается при создании промокодов."""
+    codes = [normalize_code(code) for code in codes]
+    for code in codes:
+        _local_unknown.pop(code, None)
+    if not codes:
+        return
+    try:
+        await get_redis().delete(*[_UNKNOWN_KEY.format(code=code) for code in codes])
+    except RedisError as e:
+        logger.error(f"Failed to clear promo negative cache: {e}")
@@ -0,0 +1,19 @@
+# file: utils/rate_limiter.py
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Равномерно распределяет вызовы во времени: не больше rate_per_second запусков в секунду."""
+    def __init__(self, rate_per_second: float):
+        self._interval = 1.0 / rate_per_second
+        self._next_slot = 0.0
+
+    async def wait(self):
+        # Слот занимается синхронно, поэтому конкурентные вызовы не получат один и тот же
+        now = time.monotonic()
+        slot = max(self._next_slot, now)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
@@ -0,0 +1,31 @@
+# file: utils/redis_client.py
+
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from config import REDIS_HOST, REDIS_PORT
+
+# Общий клиент Redis для кэшей и счетчиков (FSM-хранилище aiogram держит свое соединение)
+_redis: Optional[Redis] = None
+
+
+def get_redis() -> Redis:
+    """Лениво создает общий асинхронный клиент Redis."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(
+            f"redis://{REDIS_HOST}:{REDIS_PORT}/0",
+            decode_responses=True,
+            socket_timeout=2.0,
+            socket_connect_timeout=2.0,
+        )
+    return _redis
+
+
+async def close_redis():
+    """Закрывает соединения общего клиента. Вызывается при остановке бота."""
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,83 @@
+# file: utils/url_normalizer.py
+
+import hashlib
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, unquote_plus, urlencode, urlsplit, urlunsplit
+
+# Параметры, которые не меняют место назначения ссылки
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "ysclid", "_ga", "ref", "from", "si"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# Идентификаторы мест в ссылках карт: /maps/org/<название>/<id>, /firm/<id>, /maps/place/<название>
+_YANDEX_ORG_RE = re.compile(r"/maps/org/(?:[^/]+/)?(\d+)")
+_TWOGIS_FIRM_RE = re.compile(r"/firm/(\d+)")
+_GOOGLE_PLACE_RE = re.compile(r"/maps/place/([^/@]+)")
+_MAP_HOST_MARKERS = ("yandex.", "google.", "goo.gl", "2gis.")
+
+
+def normalize_url(url: str) -> Optional[str]:
+    """
+    Приводит ссылку к каноническому виду, чтобы одинаковые ссылки совпадали:
+    https-схема, хост в нижнем регистре без www и стандартного порта, без якоря,
+    без UTM и прочих меток, с отсортированными параметрами и без завершающего слэша.
+    Возвращает None, если это не http(s)-ссылка.
+    """
+    url = (url or "").strip().strip("<>\"'")
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in _DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if port and port != _DEFAULT_PORTS[parts.scheme.lower()]:
+        host = f"{host}:{port}"
+
+    path = parts.path.rstrip("/")
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+def url_hash(normalized_url: str) -> str:
+    return hashlib.sha1(normalized_url.encode("utf-8")).hexdigest()
+
+
+def company_key(url: str) -> Optional[str]:
+    """
+    Идентичность компании по ссылке, чтобы разные ссылки на одно место совпадали:
+    id организации в Яндекс Картах и 2ГИС, cid или название места в Google Картах,
+    для сайтов компаний - домен. Ссылка карт без распознанного места остается
+    нормализованной ссылкой без параметров: домен карт объединил бы все компании.
+    Возвращает None, если это не http(s)-ссылка.
+    """
+    normalized = normalize_url(url)
+    if not normalized:
+        return None
+    parts = urlsplit(normalized)
+    host, query = parts.hostname or "", dict(parse_qsl(parts.query))
+
+    if "yandex." in host:
+        match = _YANDEX_ORG_RE.search(parts.path)
+        if match or query.get("oid"):
+            return f"yandex:{match.group(1) if match else query['oid']}"
+    elif "2gis." in host:
+        match = _TWOGIS_FIRM_RE.search(parts.path)
+        if match:
+            return f"2gis:{match.group(1)}"
+    elif "google." in host:
+        if query.get("cid"):
+            return f"google:cid:{query['cid']}"
+        match = _GOOGLE_PLACE_RE.search(parts.path)
+        if match:
+            return f"google:{unquote_plus(match.group(1)).lower()}"
+
+    if any(marker in host for marker in _MAP_HOST_MARKERS):
+        return f"{host}{parts.path}"
+    return host
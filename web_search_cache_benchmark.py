@@ -0,0 +1,115 @@
+# file: web_search_cache_benchmark.py
+
+"""
+Проверка кэша веб-поиска для генерации отзывов (ai_helper.cached_web_search).
+
+Запуск (без сети и Redis: поиск и Redis подменяются в памяти):
+    python web_search_cache_benchmark.py --lookups 200 --search-ms 300
+
+Для каждой компании берется несколько разных ссылок на нее (вкладка отзывов, параметры
+карты, oid вместо пути), и все поиски запускаются одновременно. Первая волна проверяет,
+что одновременные поиски одной компании склеиваются в один внешний вызов, вторая - что
+результат берется из кэша. В конце печатается время волн и число внешних вызовов.
+"""
+
+import argparse
+import asyncio
+import itertools
+import threading
+import time
+
+from logic import ai_helper
+
+# Разные ссылки на одну и ту же компанию должны давать один ключ кэша
+COMPANY_LINKS = {
+    "Кофейня Ромашка": [
+        "https://yandex.ru/maps/org/romashka/1010101/",
+        "https://yandex.ru/maps/org/romashka/1010101/reviews/?ll=37.6,55.7&z=16",
+        "https://yandex.ru/maps/?oid=1010101&utm_source=share",
+    ],
+    "Автосервис Вектор": [
+        "https://www.google.com/maps/place/Автосервис+Вектор/@55.7,37.6,17z",
+        "https://google.com/maps/place/%D0%90%D0%B2%D1%82%D0%BE%D1%81%D0%B5%D1%80%D0%B2%D0%B8%D1%81+%D0%92%D0%B5%D0%BA%D1%82%D0%BE%D1%80/data=!3m1",
+    ],
+    "Пекарня Хлебница": [
+        "https://maps.google.com/?cid=424242",
+        "https://www.google.com/maps?cid=424242&hl=ru",
+    ],
+    "Салон Орхидея": [
+        "https://2gis.ru/moscow/firm/7000000000001",
+        "https://2gis.ru/moscow/firm/7000000000001/tab/reviews",
+    ],
+    "Стоматология Улыбка": [
+        "https://ulybka-dent.ru/",
+        "https://www.ulybka-dent.ru/contacts?utm_source=maps",
+    ],
+}
+
+
+class _MemoryRedis:
+    """Redis в памяти: только get/set, которые использует кэш поиска."""
+    def __init__(self):
+        self._data = {}
+
+    async def get(self, key):
+        return self._data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self._data[key] = value
+
+
+class _SearchStub:
+    """Подмена perform_web_search: считает внешние вызовы и имитирует задержку поиска."""
+    def __init__(self, delay_seconds: float):
+        self.delay_seconds = delay_seconds
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, query: str) -> str:
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay_seconds)
+        return f"Результаты поиска: {query}"
+
+
+async def _wave(lookups: list) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(ai_helper.cached_web_search(query, link) for query, link in lookups))
+    return time.perf_counter() - started
+
+
+async def run_benchmark(lookups_count: int, search_ms: int):
+    stub = _SearchStub(search_ms / 1000)
+    ai_helper.perform_web_search = stub
+    memory_redis = _MemoryRedis()
+    ai_helper.get_redis = lambda: memory_redis
+
+    pairs = [(f"{name} отзывы и особенности", link) for name, links in COMPANY_LINKS.items() for link in links]
+    lookups = list(itertools.islice(itertools.cycle(pairs), lookups_count))
+    companies = len(COMPANY_LINKS)
+
+    try:
+        first_wave = await _wave(lookups)
+        calls_after_first = stub.calls
+        second_wave = await _wave(lookups)
+    finally:
+        await ai_helper.close_ai_client()
+
+    print(f"{lookups_count} одновременных поисков, {companies} компаний, {len(pairs)} разных ссылок")
+    print(f"первая волна: {first_wave * 1000:.0f} мс, внешних вызовов {calls_after_first}")
+    print(f"вторая волна (кэш): {second_wave * 1000:.0f} мс, новых внешних вызовов {stub.calls - calls_after_first}")
+    assert calls_after_first == companies, f"ожидался один внешний вызов на компанию, было {calls_after_first}"
+    assert stub.calls == companies, "повторные поиски не взяты из кэша"
+    print("OK: один внешний вызов на компанию")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Склейка и кэш веб-поиска по компаниям.")
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--search-ms", type=int, default=300, help="имитируемая задержка внешнего поиска")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args.lookups, args.search_ms))
+
+
+if __name__ == "__main__":
+    main()